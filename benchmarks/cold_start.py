@@ -0,0 +1,129 @@
+"""
+Cold start benchmark: boot time, time to first byte and resident memory of an
+app mounting every table of a generated database.
+
+Each mode runs in a fresh interpreter so the measurements don't leak into each
+other:
+
+    python benchmarks/cold_start.py --tables 200
+
+`eager_snapshot` builds every schema upfront like `eager`, but from a schema
+registry snapshot written by a previous worker.
+"""
+
+from typing import Dict
+import argparse
+import json
+import resource
+import subprocess
+import os
+import sys
+import tempfile
+import time
+
+MODES = ["eager", "eager_snapshot", "lazy"]
+SNAPSHOT_PATH = os.path.join(tempfile.gettempdir(), "cold_start_schemas.json")
+
+
+def max_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on linux and in bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":  # pragma: no cover
+        rss = rss / 1024
+    return rss / 1024
+
+
+def build_models(tables: int):
+    from sqlalchemy import Column, Date, ForeignKey, Integer, String, Text
+    from sqlalchemy.orm import DeclarativeBase, relationship
+
+    class Base(DeclarativeBase):
+        ...
+
+    # The declarative registry only holds weak references to the classes
+    Base.models = []
+    previous = None
+    for number in range(tables):
+        attrs = {
+            "__tablename__": f"table_{number}",
+            "id": Column(Integer, primary_key=True),
+            "name": Column(String(100), nullable=False),
+            "description": Column(Text),
+            "created": Column(Date),
+        }
+        if previous is not None:
+            attrs["parent_id"] = Column(ForeignKey(f"{previous.__tablename__}.id"))
+            attrs["parent"] = relationship(previous)
+        previous = type(f"Table{number}", (Base,), attrs)
+        Base.models.append(previous)
+        # Make the models importable so the schema snapshot can be loaded
+        globals()[previous.__name__] = previous
+    return Base
+
+
+def run(mode: str, tables: int) -> Dict:
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from sqlalchemy import create_engine
+    from sqlalchemy.pool import StaticPool
+    from sqlalchemy_api.adapters.fastapi_crud import APICrud, APICrudAutomount
+    from sqlalchemy_api.automount import get_models
+    from sqlalchemy_api.pydantic_utils import schema_registry
+
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base = build_models(tables)
+    Base.metadata.create_all(engine)
+    baseline_rss = max_rss_mb()
+
+    start = time.perf_counter()
+    if mode == "eager_snapshot":
+        schema_registry.load(SNAPSHOT_PATH)
+    app = FastAPI()
+    if mode in ["eager", "eager_snapshot"]:
+        for name, model in get_models(Base).items():
+            app.include_router(APICrud(model, engine), prefix=f"/{name}")
+    else:
+        app.include_router(APICrudAutomount(Base, engine))
+    boot = time.perf_counter() - start
+    if mode == "eager":
+        schema_registry.dump(SNAPSHOT_PATH)
+
+    with TestClient(app) as client:
+        start = time.perf_counter()
+        response = client.get(f"/table_{tables - 1}")
+        first_byte = time.perf_counter() - start
+        assert response.status_code == 200, response.text
+
+    return {
+        "mode": mode,
+        "tables": tables,
+        "boot_ms": round(boot * 1000, 2),
+        "first_request_ms": round(first_byte * 1000, 2),
+        "time_to_first_byte_ms": round((boot + first_byte) * 1000, 2),
+        "rss_mb": round(max_rss_mb() - baseline_rss, 2),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tables", type=int, default=100)
+    parser.add_argument("--mode", choices=MODES)
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(run(args.mode, args.tables)))
+        return
+
+    for mode in MODES:
+        output = subprocess.check_output(
+            [sys.executable, __file__, "--mode", mode, "--tables", str(args.tables)]
+        )
+        print(output.decode().strip())
+
+
+if __name__ == "__main__":
+    main()
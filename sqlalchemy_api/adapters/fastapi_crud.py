@@ -1,12 +1,24 @@
-from fastapi import Request, Path, Depends, Query, Response
+from fastapi import Body, Request, Path, Depends, Query, Response
 from fastapi.types import IncEx
 from fastapi.routing import APIRouter, BaseRoute, APIRoute
 from sqlalchemy_api.crud import CRUDHandler, GenericResponse
+from sqlalchemy_api.automount import get_models
+from sqlalchemy_api.batch import BatchExecutor, BatchRequest, BatchResponse
+from sqlalchemy_api.metrics import CONTENT_TYPE, REGISTRY, MetricsRegistry
+from sqlalchemy_api.slow_queries import SlowQueryLog
+from sqlalchemy_api.replicas import client
 from sqlalchemy_api._types import ENGINE_TYPE
-from sqlalchemy_api.pydantic_utils import PageSchema
+from sqlalchemy_api.pydantic_utils import (
+    AggregateSchema,
+    PageSchema,
+    SearchSchema,
+    TreeSchema,
+)
 from sqlalchemy_api.actions import Actions, ALL_ACTIONS
-from sqlalchemy_api.filtering import Filter
+from sqlalchemy_api.filtering import Filter, query_params_dict
+from sqlalchemy_api.json_filters import JSON_TYPE_OPERATORS
 from inspect import Parameter, Signature
+from contextlib import nullcontext
 from fastapi import params
 from typing import (
     List,
@@ -19,8 +31,13 @@ from typing import (
     Optional,
     Union,
     Type,
+    Container,
+    ContextManager,
 )
 from enum import Enum
+from sqlalchemy import MetaData
+from sqlalchemy.orm import DeclarativeBase
+import re
 
 
 class FastAPIEndpointConfig(TypedDict):
@@ -52,8 +69,13 @@ class FastAPIConfig(TypedDict):
     all: Optional[FastAPIEndpointConfig]
     get: Optional[FastAPIEndpointConfig]
     get_many: Optional[FastAPIEndpointConfig]
+    search: Optional[FastAPIEndpointConfig]
+    aggregate: Optional[FastAPIEndpointConfig]
+    descendants: Optional[FastAPIEndpointConfig]
+    ancestors: Optional[FastAPIEndpointConfig]
     post: Optional[FastAPIEndpointConfig]
     put: Optional[FastAPIEndpointConfig]
+    patch: Optional[FastAPIEndpointConfig]
     delete: Optional[FastAPIEndpointConfig]
 
 
@@ -66,11 +88,18 @@ class APICrud(APIRouter):
     - `page_size_max`: max page size
     - `debug`: if True, return stacktrace on error
     - `actions`: list of actions to enable, default is all
+    - `lazy`: if True, register the routes without request and response models so
+        the handler schemas are only built on the first request; these routes are
+        documented without schemas in OpenAPI
+    - `expose_metrics`: if True, add a `GET /_metrics` endpoint rendering the
+        `metrics` registry, see `metrics_endpoint` to expose it elsewhere
+    - `**crud_options`: extra `CRUDHandler` options, e.g. `metrics`
     """
 
     crud_handler: CRUDHandler
     actions: List[Actions]
     fastapi_config: Union[Dict, FastAPIConfig]
+    lazy: bool
 
     def __init__(
         self,
@@ -82,8 +111,13 @@ class APICrud(APIRouter):
         debug: bool = False,
         actions: List[Actions] = ALL_ACTIONS,
         fastapi_config: Optional[Union[Dict, FastAPIConfig]] = None,
+        lazy: bool = False,
+        expose_metrics: bool = False,
+        **crud_options: Any,
     ):
         self.fastapi_config = fastapi_config or {}
+        self.lazy = lazy
+        self.expose_metrics = expose_metrics
         """
         - `model`: SQLAlchemy model
         - `engine`: SQLAlchemy engine
@@ -91,8 +125,11 @@ class APICrud(APIRouter):
         - `page_size_default`: default page size
         - `page_size_max`: max page size
         - `actions`: list of actions to enable, default is all
+        - `lazy`: if True, build the handler schemas on the first request
+        - `expose_metrics`: if True, add a `GET /_metrics` endpoint
         """
-
+        if expose_metrics and crud_options.get("metrics") is None:
+            raise ValueError("`expose_metrics` needs a `metrics` registry")
         self.crud_handler = CRUDHandler(
             model=model,
             engine=engine,
@@ -100,6 +137,7 @@ class APICrud(APIRouter):
             page_size_default=page_size_default,
             page_size_max=page_size_max,
             debug=debug,
+            **crud_options,
         )
         self.actions = actions
         routes = self.init_routes()
@@ -112,33 +150,123 @@ class APICrud(APIRouter):
         async def get(
             request: Request, row_id: row_id_type = Path(...)  # type: ignore
         ):
-            res = await self.crud_handler.get(row_id=row_id)
+            with self.client(request):
+                res = await self.crud_handler.get(row_id=row_id)
             return self.generic_to_fastapi_response(res)
 
         async def get_many(
             request: Request,
             page: PageSchema = Depends(self.get_page_dependency()),
             filters=Depends(self.get_filters_dependency()),
+            facets: Optional[str] = Query(
+                None,
+                description=(
+                    "Comma separated columns to count the values of among the"
+                    " filtered records, the enum and bool columns by default"
+                ),
+            ),
         ):
-            res = await self.crud_handler.get_many(
-                query_params=dict(request.query_params)
-            )
+            with self.client(request):
+                res = await self.crud_handler.get_many(
+                    query_params=query_params_dict(
+                        request.query_params.multi_items(),
+                        self.crud_handler.column_names,
+                    )
+                )
+            return self.generic_to_fastapi_response(res)
+
+        async def search(request: Request, schema: SearchSchema):
+            payload = await request.json()
+            with self.client(request):
+                res = await self.crud_handler.search(payload=payload)
+            return self.generic_to_fastapi_response(res)
+
+        async def aggregate(
+            request: Request,
+            group_by: Optional[str] = Query(
+                None,
+                description=(
+                    "Comma separated columns to group by, a date or datetime column"
+                    " can be truncated to a `year`, `month`, `day` or `hour`"
+                    " bucket, e.g. `status,created_at:month`"
+                ),
+            ),
+            aggregate: Optional[str] = Query(
+                None,
+                description=(
+                    "Comma separated `count`, `count:<column>`, `sum:<column>`,"
+                    " `avg:<column>`, `min:<column>` or `max:<column>`,"
+                    " `count` by default"
+                ),
+            ),
+            filters=Depends(self.get_filters_dependency()),
+        ):
+            with self.client(request):
+                res = await self.crud_handler.aggregate(
+                    query_params=query_params_dict(
+                        request.query_params.multi_items(),
+                        self.crud_handler.column_names,
+                    )
+                )
+            return self.generic_to_fastapi_response(res)
+
+        max_depth = self.crud_handler.max_tree_depth
+
+        def tree_dependency(
+            depth: int = Query(
+                max_depth,
+                ge=0,
+                le=max_depth,
+                description=f"Levels of the tree to read, max {max_depth}",
+            ),
+            nested: bool = Query(
+                False,
+                description=(
+                    "Nest the records in the `children` of their parent instead"
+                    " of a flat list ordered by depth"
+                ),
+            ),
+        ):
+            return None
+
+        async def descendants(
+            request: Request,
+            row_id: row_id_type = Path(...),  # type: ignore
+            tree=Depends(tree_dependency),
+        ):
+            with self.client(request):
+                res = await self.crud_handler.descendants(
+                    row_id=row_id, query_params=dict(request.query_params)
+                )
+            return self.generic_to_fastapi_response(res)
+
+        async def ancestors(
+            request: Request,
+            row_id: row_id_type = Path(...),  # type: ignore
+            tree=Depends(tree_dependency),
+        ):
+            with self.client(request):
+                res = await self.crud_handler.ancestors(
+                    row_id=row_id, query_params=dict(request.query_params)
+                )
             return self.generic_to_fastapi_response(res)
 
-        postSchema = self.crud_handler.schema_post
+        postSchema = self.body_schema("schema_post")
 
         async def post(request: Request, schema: postSchema):  # type: ignore
             payload = await request.json()
-            res = await self.crud_handler.post(payload=payload)
+            with self.client(request):
+                res = await self.crud_handler.post(payload=payload)
             return self.generic_to_fastapi_response(res)
 
         async def delete(
             request: Request, row_id: row_id_type = Path(...)  # type: ignore
         ):
-            res = await self.crud_handler.delete(row_id=row_id)
+            with self.client(request):
+                res = await self.crud_handler.delete(row_id=row_id)
             return self.generic_to_fastapi_response(res)
 
-        PutSchema = self.crud_handler.schema_put
+        PutSchema = self.body_schema("schema_put")
 
         async def put(
             request: Request,
@@ -146,34 +274,89 @@ class APICrud(APIRouter):
             row_id: row_id_type = Path(...),  # type: ignore
         ):
             payload = await request.json()
-            res = await self.crud_handler.put(row_id=row_id, payload=payload)
+            with self.client(request):
+                res = await self.crud_handler.put(row_id=row_id, payload=payload)
             return self.generic_to_fastapi_response(res)
 
+        async def patch(
+            request: Request,
+            schema: Dict[str, Any] = Body(
+                ...,
+                description=(
+                    'Values of the columns, or `{"$inc": n}` / `{"$dec": n}` '
+                    "to increment or decrement a numeric column in the database"
+                ),
+                examples=[{"views": {"$inc": 1}}],
+            ),
+            row_id: row_id_type = Path(...),  # type: ignore
+        ):
+            payload = await request.json()
+            with self.client(request):
+                res = await self.crud_handler.patch(row_id=row_id, payload=payload)
+            return self.generic_to_fastapi_response(res)
+
+        if self.expose_metrics:
+            assert self.crud_handler.metrics is not None
+            router.add_api_route(
+                "/_metrics",
+                metrics_endpoint(self.crud_handler.metrics.registry),
+                methods=["GET"],
+                include_in_schema=False,
+            )
         if Actions.GET_MANY in self.actions:
             router.add_api_route(
                 path="",
                 endpoint=get_many,
                 methods=["GET"],
-                response_model=self.crud_handler.schema_paginated,
+                response_model=self.response_model("schema_paginated"),
                 **self.fastapi_config.get("all", {}),  # type: ignore
                 **self.fastapi_config.get("get_many", {}),  # type: ignore
             )
+            router.add_api_route(
+                path="/_search",
+                endpoint=search,
+                methods=["POST"],
+                response_model=self.response_model("schema_paginated"),
+                **self.fastapi_config.get("all", {}),  # type: ignore
+                **self.fastapi_config.get("search", {}),  # type: ignore
+            )
+            router.add_api_route(
+                path="/_aggregate",
+                endpoint=aggregate,
+                methods=["GET"],
+                response_model=AggregateSchema,
+                **self.fastapi_config.get("all", {}),  # type: ignore
+                **self.fastapi_config.get("aggregate", {}),  # type: ignore
+            )
         if Actions.GET in self.actions:
             router.add_api_route(
                 path="/{row_id}",
                 endpoint=get,
                 methods=["GET"],
-                response_model=self.crud_handler.schema_relations,
+                response_model=self.response_model("schema_relations"),
                 **self.fastapi_config.get("all", {}),  # type: ignore
                 **self.fastapi_config.get("get", {}),  # type: ignore
             )
+            if self.crud_handler.parent_column is not None:
+                for path, endpoint in [
+                    ("descendants", descendants),
+                    ("ancestors", ancestors),
+                ]:
+                    router.add_api_route(
+                        path=f"/{{row_id}}/{path}",
+                        endpoint=endpoint,
+                        methods=["GET"],
+                        response_model=TreeSchema,
+                        **self.fastapi_config.get("all", {}),  # type: ignore
+                        **self.fastapi_config.get(path, {}),  # type: ignore
+                    )
 
         if Actions.CREATE in self.actions:
             router.add_api_route(
                 path="",
                 endpoint=post,
                 methods=["POST"],
-                response_model=self.crud_handler.schema_base,
+                response_model=self.response_model("schema_base"),
                 **self.fastapi_config.get("all", {}),  # type: ignore
                 **self.fastapi_config.get("post", {}),  # type: ignore
             )
@@ -196,11 +379,45 @@ class APICrud(APIRouter):
                 **self.fastapi_config.get("put", {}),  # type: ignore
                 # response_model=self.crud_handler.pydantic_model
             )
+            router.add_api_route(
+                path="/{row_id}",
+                endpoint=patch,
+                methods=["PATCH"],
+                response_model=self.response_model("schema_base"),
+                **self.fastapi_config.get("all", {}),  # type: ignore
+                **self.fastapi_config.get("patch", {}),  # type: ignore
+            )
         return router.routes
 
+    def client(self, request: Request) -> ContextManager:
+        """
+        Attribute the request to the client of its token, for the read-your-writes
+        stickiness of the replicas.
+        """
+        replicas = self.crud_handler.replicas
+        if replicas is None:
+            return nullcontext()
+        return client(replicas.client_token(request.headers, request.cookies))
+
+    def response_model(self, schema_name: str) -> Any:
+        if self.lazy:
+            return None
+        return getattr(self.crud_handler, schema_name)
+
+    def body_schema(self, schema_name: str) -> Any:
+        if self.lazy:
+            # Any JSON object is accepted, the handler validates it on request
+            return Dict[str, Any]
+        return getattr(self.crud_handler, schema_name)
+
     def get_page_dependency(self) -> Callable:
         default_size = self.crud_handler.page_size_default
         max_size = self.crud_handler.page_size_max
+        columns = [
+            *self.crud_handler.column_names,
+            *self.crud_handler.computed_fields,
+        ]
+        sort_column = "-?(" + "|".join(re.escape(column) for column in columns) + ")"
 
         def page_dependency(
             page_size: int = Query(
@@ -210,12 +427,40 @@ class APICrud(APIRouter):
                 description=f"Number of records per page, max {max_size}",
             ),
             page: int = Query(1, ge=1, description="Page number"),
+            cursor: Optional[str] = Query(
+                None,
+                description=(
+                    "Cursor pagination in the `sort` order, empty for the first"
+                    " page and then the `next_cursor` of the previous page"
+                ),
+            ),
+            sort: Optional[str] = Query(
+                None,
+                description=(
+                    "Comma separated columns to sort by, `-` sorts descending,"
+                    " the primary key is the last tiebreaker. Columns: "
+                    + ", ".join(f"`{column}`" for column in columns)
+                ),
+                pattern=f"^{sort_column}(,{sort_column})*$",
+            ),
+            rank: bool = Query(
+                False,
+                description=(
+                    "Order by the relevance of the `search` filter first,"
+                    " with offset pagination"
+                ),
+            ),
         ):
-            return PageSchema(size=page_size, number=page)
+            return PageSchema(size=page_size, number=page, cursor=cursor, sort=sort)
 
         return page_dependency
 
     def get_filters_dependency(self):
+        if self.lazy:
+            # Filters are still read from the query params by the handler, they
+            # are just not declared, declaring them is most of the route cost
+            return lambda: None
+
         filters: List[Filter] = self.crud_handler.get_filters()
         formatted_filters = {}
         for filter in filters:
@@ -226,11 +471,14 @@ class APICrud(APIRouter):
 
         parameters = []
         for filter in filters:
+            # JSON and ARRAY values are parsed by their operators
+            type_ = str if filter.type in JSON_TYPE_OPERATORS else filter.type
             parameters.append(
                 Parameter(
                     name=filter.name,
                     kind=Parameter.POSITIONAL_OR_KEYWORD,
-                    annotation=filter.type,
+                    # Repeated or comma separated for the list operators
+                    annotation=List[Union[type_, str]],  # type: ignore
                     default=Query(None, description=filter.description),
                 )
             )
@@ -250,6 +498,20 @@ class APICrud(APIRouter):
                     )
                 )
 
+        parameters.append(
+            Parameter(
+                name="filter",
+                kind=Parameter.POSITIONAL_OR_KEYWORD,
+                annotation=Optional[str],
+                default=Query(
+                    None,
+                    description=(
+                        "Filter expression, e.g."
+                        " `or(age.lt.18,and(status.equal.active,name.in.(a,b)))`"
+                    ),
+                ),
+            )
+        )
         filters_dependency.__signature__ = Signature(parameters=parameters)
         return filters_dependency
 
@@ -259,4 +521,137 @@ class APICrud(APIRouter):
             content=generic_response.content,
             status_code=generic_response.status_code,
             media_type=generic_response.media_type,
+            headers=generic_response.headers,
+        )
+
+
+class APICrudAutomount(APIRouter):
+    """
+    Router that includes an `APICrud` for every table of a database under
+    `/<table name>`, tagged with the table name.
+
+    - `source`: `DeclarativeBase` subclass or `MetaData` with the models to mount
+    - `engine`: SQLAlchemy engine
+    - `reflect`: if True, reflect the tables from the database instead
+    - `include`: if given, only mount these table names
+    - `exclude`: table names to leave out
+    - `async_engine`: if True, use async engine
+    - `page_size_default`: default page size
+    - `page_size_max`: max page size
+    - `debug`: if True, return stacktrace on error
+    - `actions`: list of actions to enable, default is all
+    - `lazy`: if True (default), the routes are registered without schemas and
+        each handler builds them on its first request, see `APICrud`
+    - `batch`: if True, add a `POST /_batch` endpoint running several operations
+        in a single transaction, see `BatchExecutor`
+    - `**crud_options`: extra `CRUDHandler` options, when `metrics` is given they
+        are exposed in `/metrics`, when `slow_query_log` is given it is exposed in
+        `/_slow_queries`
+
+    The tables keep their paths, `/metrics`, `/_slow_queries` and `/_batch` are
+    left out when a table has the same name.
+    """
+
+    cruds: Dict[str, APICrud]
+
+    def __init__(
+        self,
+        source: Optional[Union[Type[DeclarativeBase], MetaData]],
+        engine: ENGINE_TYPE,
+        reflect: bool = False,
+        include: Optional[Container[str]] = None,
+        exclude: Optional[Container[str]] = None,
+        async_engine: bool = False,
+        page_size_default: int = 100,
+        page_size_max: int = 1000,
+        debug: bool = False,
+        actions: List[Actions] = ALL_ACTIONS,
+        lazy: bool = True,
+        batch: bool = False,
+        **crud_options: Any,
+    ):
+        super().__init__()
+        models = get_models(
+            source, engine=engine, reflect=reflect, include=include, exclude=exclude
         )
+        if crud_options.get("metrics") is not None and "metrics" not in models:
+            self.add_api_route(
+                "/metrics",
+                metrics_endpoint(crud_options["metrics"]),
+                methods=["GET"],
+                include_in_schema=False,
+            )
+        if (
+            crud_options.get("slow_query_log") is not None
+            and "_slow_queries" not in models
+        ):
+            self.add_api_route(
+                "/_slow_queries",
+                slow_queries_endpoint(crud_options["slow_query_log"]),
+                methods=["GET"],
+                include_in_schema=False,
+            )
+        self.cruds = {}
+        for name, model in models.items():
+            crud = APICrud(
+                model=model,
+                engine=engine,
+                async_engine=async_engine,
+                page_size_default=page_size_default,
+                page_size_max=page_size_max,
+                debug=debug,
+                actions=actions,
+                lazy=lazy,
+                **crud_options,
+            )
+            self.cruds[name] = crud
+            self.include_router(crud, prefix=f"/{name}", tags=[name])
+        if batch and "_batch" not in models:
+            executor = BatchExecutor(
+                {name: crud.crud_handler for name, crud in self.cruds.items()},
+                engine=engine,
+                actions=actions,
+            )
+            self.add_api_route(
+                "/_batch",
+                batch_endpoint(executor),
+                methods=["POST"],
+                response_model=BatchResponse,
+                tags=["batch"],
+            )
+
+
+def metrics_endpoint(registry: MetricsRegistry = REGISTRY) -> Callable:
+    """
+    FastAPI endpoint exposing the metrics of a registry in the Prometheus text
+    format, e.g. `app.add_api_route("/metrics", metrics_endpoint())`.
+    """
+
+    async def metrics() -> Response:
+        return Response(content=registry.render(), media_type=CONTENT_TYPE)
+
+    return metrics
+
+
+def batch_endpoint(executor: BatchExecutor) -> Callable:
+    """
+    FastAPI endpoint running the batch of operations of the request body.
+    """
+
+    async def batch(body: BatchRequest) -> Response:
+        response = await executor.execute(body)
+        return APICrud.generic_to_fastapi_response(response)
+
+    return batch
+
+
+def slow_queries_endpoint(log: SlowQueryLog) -> Callable:
+    """
+    FastAPI endpoint listing the entries of a slow query log, grouped by query
+    shape too, the `model` query param filters the entries of one model.
+    """
+
+    async def slow_queries(model: Optional[str] = None) -> Dict[str, Any]:
+        return log.to_dict(model=model)
+
+    return slow_queries
@@ -1,11 +1,31 @@
-from starlette.routing import BaseRoute, Route
+from starlette.routing import BaseRoute, Mount, Route
 from starlette.applications import Starlette
-from starlette.responses import Response
+from starlette.responses import JSONResponse, Response
 from starlette.requests import Request
+from sqlalchemy import MetaData
+from sqlalchemy.orm import DeclarativeBase
 from sqlalchemy_api._types import ENGINE_TYPE
 from sqlalchemy_api.actions import Actions, ALL_ACTIONS
+from sqlalchemy_api.automount import get_models
+from sqlalchemy_api.batch import BatchExecutor
 from sqlalchemy_api.crud import CRUDHandler, GenericResponse
-from typing import ClassVar, List
+from sqlalchemy_api.filtering import query_params_dict
+from sqlalchemy_api.metrics import CONTENT_TYPE, REGISTRY, MetricsRegistry
+from sqlalchemy_api.slow_queries import SlowQueryLog
+from sqlalchemy_api.replicas import client
+from contextlib import nullcontext
+from typing import (
+    Any,
+    Callable,
+    ClassVar,
+    Container,
+    ContextManager,
+    Dict,
+    List,
+    Optional,
+    Type,
+    Union,
+)
 
 
 class APICrud(Starlette):
@@ -22,6 +42,9 @@ class APICrud(Starlette):
     - `page_size_max`: max page size
     - `debug`: if True, return stacktrace on error
     - `actions`: list of actions to enable, default is all
+    - `expose_metrics`: if True, add a `GET /_metrics` endpoint rendering the
+        `metrics` registry, see `metrics_endpoint` to expose it elsewhere
+    - `**crud_options`: extra `CRUDHandler` options, e.g. `metrics`
     """
 
     engine: ClassVar[ENGINE_TYPE]
@@ -37,6 +60,8 @@ class APICrud(Starlette):
         page_size_max: int = 1000,
         debug: bool = False,
         actions: List[Actions] = ALL_ACTIONS,
+        expose_metrics: bool = False,
+        **crud_options: Any,
     ):
         """
         - `model`: SQLAlchemy model
@@ -46,8 +71,12 @@ class APICrud(Starlette):
         - `page_size_default`: default page size
         - `page_size_max`: max page size
         - `actions`: list of actions to enable, default is all
+        - `expose_metrics`: if True, add a `GET /_metrics` endpoint
         """
+        if expose_metrics and crud_options.get("metrics") is None:
+            raise ValueError("`expose_metrics` needs a `metrics` registry")
         self.actions = actions
+        self.expose_metrics = expose_metrics
         self.crud_handler = CRUDHandler(
             model=model,
             engine=engine,
@@ -55,6 +84,7 @@ class APICrud(Starlette):
             page_size_default=page_size_default,
             page_size_max=page_size_max,
             debug=debug,
+            **crud_options,
         )
         routes = self.init_routes()
         super().__init__(
@@ -65,59 +95,249 @@ class APICrud(Starlette):
         routes: List[BaseRoute] = []
 
         async def get_many(request: Request) -> Response:
-            return self.generic_to_starlette_response(
-                await self.crud_handler.get_many(
-                    query_params=dict(request.query_params)
+            with self.client(request):
+                response = await self.crud_handler.get_many(
+                    query_params=query_params_dict(
+                        request.query_params.multi_items(),
+                        self.crud_handler.column_names,
+                    )
                 )
-            )
+            return self.generic_to_starlette_response(response)
+
+        async def search(request: Request) -> Response:
+            payload = await request.json()
+            with self.client(request):
+                response = await self.crud_handler.search(payload=payload)
+            return self.generic_to_starlette_response(response)
+
+        async def aggregate(request: Request) -> Response:
+            with self.client(request):
+                response = await self.crud_handler.aggregate(
+                    query_params=query_params_dict(
+                        request.query_params.multi_items(),
+                        self.crud_handler.column_names,
+                    )
+                )
+            return self.generic_to_starlette_response(response)
 
         async def get(request: Request) -> Response:
-            return self.generic_to_starlette_response(
-                await self.crud_handler.get(
+            with self.client(request):
+                response = await self.crud_handler.get(
                     row_id=request.path_params["row_id"],
                 )
-            )
+            return self.generic_to_starlette_response(response)
+
+        async def descendants(request: Request) -> Response:
+            with self.client(request):
+                response = await self.crud_handler.descendants(
+                    row_id=request.path_params["row_id"],
+                    query_params=dict(request.query_params),
+                )
+            return self.generic_to_starlette_response(response)
+
+        async def ancestors(request: Request) -> Response:
+            with self.client(request):
+                response = await self.crud_handler.ancestors(
+                    row_id=request.path_params["row_id"],
+                    query_params=dict(request.query_params),
+                )
+            return self.generic_to_starlette_response(response)
 
         async def post(request: Request) -> Response:
             payload = await request.json()
-            return self.generic_to_starlette_response(
-                await self.crud_handler.post(
+            with self.client(request):
+                response = await self.crud_handler.post(
                     payload=payload,
                 )
-            )
+            return self.generic_to_starlette_response(response)
 
         async def delete(request: Request) -> Response:
-            return self.generic_to_starlette_response(
-                await self.crud_handler.delete(
+            with self.client(request):
+                response = await self.crud_handler.delete(
                     row_id=request.path_params["row_id"],
                 )
-            )
+            return self.generic_to_starlette_response(response)
 
         async def put(request: Request) -> Response:
             payload = await request.json()
-            return self.generic_to_starlette_response(
-                await self.crud_handler.put(
+            with self.client(request):
+                response = await self.crud_handler.put(
                     row_id=request.path_params["row_id"],
                     payload=payload,
                 )
-            )
+            return self.generic_to_starlette_response(response)
 
+        async def patch(request: Request) -> Response:
+            payload = await request.json()
+            with self.client(request):
+                response = await self.crud_handler.patch(
+                    row_id=request.path_params["row_id"],
+                    payload=payload,
+                )
+            return self.generic_to_starlette_response(response)
+
+        if self.expose_metrics:
+            assert self.crud_handler.metrics is not None
+            routes.append(
+                Route("/_metrics", metrics_endpoint(self.crud_handler.metrics.registry))
+            )
         if Actions.GET_MANY in self.actions:
             routes.append(Route("/", get_many, methods=["GET"]))
+            routes.append(Route("/_search", search, methods=["POST"]))
+            routes.append(Route("/_aggregate", aggregate, methods=["GET"]))
         if Actions.GET in self.actions:
             routes.append(Route("/{row_id}", get, methods=["GET"]))
+            if self.crud_handler.parent_column is not None:
+                routes.append(
+                    Route("/{row_id}/descendants", descendants, methods=["GET"])
+                )
+                routes.append(Route("/{row_id}/ancestors", ancestors, methods=["GET"]))
         if Actions.CREATE in self.actions:
             routes.append(Route("/", post, methods=["POST"]))
         if Actions.DELETE in self.actions:
             routes.append(Route("/{row_id}", delete, methods=["DELETE"]))
         if Actions.UPDATE in self.actions:
             routes.append(Route("/{row_id}", put, methods=["PUT"]))
+            routes.append(Route("/{row_id}", patch, methods=["PATCH"]))
         return routes
 
+    def client(self, request: Request) -> ContextManager:
+        """
+        Attribute the request to the client of its token, for the read-your-writes
+        stickiness of the replicas.
+        """
+        replicas = self.crud_handler.replicas
+        if replicas is None:
+            return nullcontext()
+        return client(replicas.client_token(request.headers, request.cookies))
+
     @staticmethod
     def generic_to_starlette_response(generic_response: GenericResponse) -> Response:
         return Response(
             content=generic_response.content,
             status_code=generic_response.status_code,
             media_type=generic_response.media_type,
+            headers=generic_response.headers,
+        )
+
+
+class APICrudAutomount(Starlette):
+    """
+    Starlette application that mounts an `APICrud` for every table of a database
+    under `/<table name>`.
+
+    Handlers build their schemas on the first request they receive, so mounting
+    a whole database is cheap regardless of the number of tables.
+
+    Params:
+    - `source`: `DeclarativeBase` subclass or `MetaData` with the models to mount
+    - `engine`: SQLAlchemy engine
+    - `reflect`: if True, reflect the tables from the database instead
+    - `include`: if given, only mount these table names
+    - `exclude`: table names to leave out
+    - `async_engine`: if True, use async engine
+    - `page_size_default`: default page size
+    - `page_size_max`: max page size
+    - `debug`: if True, return stacktrace on error
+    - `actions`: list of actions to enable, default is all
+    - `batch`: if True, add a `POST /_batch` endpoint running several operations
+        in a single transaction, see `BatchExecutor`
+    - `**crud_options`: extra `CRUDHandler` options, when `metrics` is given they
+        are exposed in `/metrics`, when `slow_query_log` is given it is exposed in
+        `/_slow_queries`
+
+    The tables keep their paths, `/metrics`, `/_slow_queries` and `/_batch` are
+    left out when a table has the same name.
+    """
+
+    cruds: Dict[str, APICrud]
+
+    def __init__(
+        self,
+        source: Optional[Union[Type[DeclarativeBase], MetaData]],
+        engine: ENGINE_TYPE,
+        reflect: bool = False,
+        include: Optional[Container[str]] = None,
+        exclude: Optional[Container[str]] = None,
+        async_engine: bool = False,
+        page_size_default: int = 100,
+        page_size_max: int = 1000,
+        debug: bool = False,
+        actions: List[Actions] = ALL_ACTIONS,
+        batch: bool = False,
+        **crud_options: Any,
+    ):
+        models = get_models(
+            source, engine=engine, reflect=reflect, include=include, exclude=exclude
         )
+        self.cruds = {
+            name: APICrud(
+                model=model,
+                engine=engine,
+                async_engine=async_engine,
+                page_size_default=page_size_default,
+                page_size_max=page_size_max,
+                debug=debug,
+                actions=actions,
+                **crud_options,
+            )
+            for name, model in models.items()
+        }
+        routes: List[BaseRoute] = []
+        if crud_options.get("metrics") is not None and "metrics" not in self.cruds:
+            routes.append(Route("/metrics", metrics_endpoint(crud_options["metrics"])))
+        if (
+            crud_options.get("slow_query_log") is not None
+            and "_slow_queries" not in self.cruds
+        ):
+            routes.append(
+                Route(
+                    "/_slow_queries",
+                    slow_queries_endpoint(crud_options["slow_query_log"]),
+                )
+            )
+        if batch and "_batch" not in self.cruds:
+            executor = BatchExecutor(
+                {name: crud.crud_handler for name, crud in self.cruds.items()},
+                engine=engine,
+                actions=actions,
+            )
+            routes.append(Route("/_batch", batch_endpoint(executor), methods=["POST"]))
+        routes.extend(Mount(f"/{name}", app=crud) for name, crud in self.cruds.items())
+        super().__init__(routes=routes)
+
+
+def metrics_endpoint(registry: MetricsRegistry = REGISTRY) -> Callable:
+    """
+    Starlette endpoint exposing the metrics of a registry in the Prometheus text
+    format, e.g. `Route("/metrics", metrics_endpoint())`.
+    """
+
+    async def metrics(request: Request) -> Response:
+        return Response(content=registry.render(), media_type=CONTENT_TYPE)
+
+    return metrics
+
+
+def batch_endpoint(executor: BatchExecutor) -> Callable:
+    """
+    Starlette endpoint running the batch of operations of the request body.
+    """
+
+    async def batch(request: Request) -> Response:
+        response = await executor.execute(await request.json())
+        return APICrud.generic_to_starlette_response(response)
+
+    return batch
+
+
+def slow_queries_endpoint(log: SlowQueryLog) -> Callable:
+    """
+    Starlette endpoint listing the entries of a slow query log, grouped by query
+    shape too, the `model` query param filters the entries of one model.
+    """
+
+    async def slow_queries(request: Request) -> Response:
+        return JSONResponse(log.to_dict(model=request.query_params.get("model")))
+
+    return slow_queries
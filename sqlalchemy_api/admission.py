@@ -0,0 +1,139 @@
+from collections import deque
+from sqlalchemy_api.exceptions import Overloaded
+from typing import Deque, Dict, Optional
+import anyio
+import math
+
+READ = "read"
+WRITE = "write"
+READ_ACTIONS = ["get", "get_many", "search", "aggregate", "descendants", "ancestors"]
+
+
+def action_kind(action: str) -> str:
+    return READ if action in READ_ACTIONS else WRITE
+
+
+class ConcurrencyLimiter:
+    """
+    Limits the requests running at the same time, the rest wait in a bounded
+    queue (first in, first out) until a slot is released.
+
+    Requests are shed with `Overloaded` when the queue is full or when they
+    waited more than `queue_timeout` seconds.
+
+    The limiter is meant to be used from a single event loop.
+    """
+
+    waiters: Deque[anyio.Event]
+
+    def __init__(
+        self,
+        limit: int,
+        queue_size: int,
+        queue_timeout: float,
+        retry_after: Optional[int] = None,
+    ) -> None:
+        self.limit = limit
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after or math.ceil(queue_timeout)
+        self.active = 0
+        self.waiters = deque()
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self.waiters)
+
+    async def acquire(self) -> None:
+        if self.active < self.limit and not self.waiters:
+            self.active += 1
+            return
+        if len(self.waiters) >= self.queue_size:
+            raise Overloaded("queue_full", self.retry_after)
+        event = anyio.Event()
+        self.waiters.append(event)
+        try:
+            with anyio.move_on_after(self.queue_timeout):
+                await event.wait()
+        except BaseException:
+            self.abandon(event)
+            raise
+        if not event.is_set():
+            self.waiters.remove(event)
+            raise Overloaded("queue_timeout", self.retry_after)
+
+    def abandon(self, event: anyio.Event) -> None:
+        if event.is_set():
+            # The slot was already handed over to this waiter
+            self.release()
+        else:
+            self.waiters.remove(event)
+
+    def release(self) -> None:
+        if self.waiters:
+            # Hand over the slot to the oldest waiter, `active` doesn't change
+            self.waiters.popleft().set()
+        else:
+            self.active -= 1
+
+
+class AdmissionControl:
+    """
+    Concurrency budgets for the reads (`get`, `get_many`) and the writes of the
+    `CRUDHandler`s, so a slow database sheds requests instead of piling them up
+    in the worker threads and the connection pool queue.
+
+    An instance passed to several handlers shares the budgets between them,
+    with `per_model=True` each model gets its own budgets.
+
+    Params:
+    - `read_limit`: max concurrent reads
+    - `write_limit`: max concurrent writes
+    - `queue_size`: max requests waiting for a slot, per budget
+    - `queue_timeout`: max seconds waiting for a slot
+    - `retry_after`: seconds sent in the `Retry-After` header of the shed
+        requests, `queue_timeout` rounded up by default
+    - `per_model`: if True, the budgets are per model instead of shared
+    """
+
+    limiters: Dict[Optional[str], Dict[str, ConcurrencyLimiter]]
+
+    def __init__(
+        self,
+        read_limit: int = 50,
+        write_limit: int = 10,
+        queue_size: int = 100,
+        queue_timeout: float = 5.0,
+        retry_after: Optional[int] = None,
+        per_model: bool = False,
+    ) -> None:
+        self.read_limit = read_limit
+        self.write_limit = write_limit
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self.per_model = per_model
+        self.limiters = {}
+
+    def limiter(self, model: str, kind: str) -> ConcurrencyLimiter:
+        """
+        Limiter of the `read` or `write` budget of a model.
+        """
+        scope = model if self.per_model else None
+        limiters = self.limiters.get(scope)
+        if limiters is None:
+            limiters = self.limiters[scope] = {
+                READ: ConcurrencyLimiter(
+                    self.read_limit,
+                    self.queue_size,
+                    self.queue_timeout,
+                    self.retry_after,
+                ),
+                WRITE: ConcurrencyLimiter(
+                    self.write_limit,
+                    self.queue_size,
+                    self.queue_timeout,
+                    self.retry_after,
+                ),
+            }
+        return limiters[kind]
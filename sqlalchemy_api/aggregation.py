@@ -0,0 +1,224 @@
+from sqlalchemy import func, literal_column
+from sqlalchemy.sql.elements import ColumnElement
+from sqlalchemy_api.exceptions import InvalidAggregate
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+COUNT = "count"
+SUM = "sum"
+AVG = "avg"
+MIN = "min"
+MAX = "max"
+AGGREGATE_FUNCTIONS = [COUNT, SUM, AVG, MIN, MAX]
+
+# Python types of the columns each function applies to, `count` applies to all
+SUMMABLE_TYPES = [int, float, Decimal]
+ORDERED_TYPES = [*SUMMABLE_TYPES, str, date, datetime]
+FUNCTION_TYPES = {
+    SUM: SUMMABLE_TYPES,
+    AVG: SUMMABLE_TYPES,
+    MIN: ORDERED_TYPES,
+    MAX: ORDERED_TYPES,
+}
+
+BUCKETS = ["year", "month", "day", "hour"]
+# ISO 8601 like the `date_trunc` timestamps once serialized
+SQLITE_BUCKET_FORMATS = {
+    "year": "%Y-01-01T00:00:00",
+    "month": "%Y-%m-01T00:00:00",
+    "day": "%Y-%m-%dT00:00:00",
+    "hour": "%Y-%m-%dT%H:00:00",
+}
+BUCKET_DIALECTS = ["postgresql", "sqlite"]
+
+
+class GroupBy:
+    """
+    Column of a `group_by`, truncated to a time bucket (`created_at:month`).
+    """
+
+    def __init__(self, column: str, bucket: Optional[str] = None) -> None:
+        self.column = column
+        self.bucket = bucket
+
+    @property
+    def label(self) -> str:
+        return self.column if self.bucket is None else f"{self.column}__{self.bucket}"
+
+
+class Aggregate:
+    """
+    Aggregate function of a column, `count` without column counts the rows.
+    """
+
+    def __init__(self, function: str, column: Optional[str] = None) -> None:
+        self.function = function
+        self.column = column
+
+    @property
+    def label(self) -> str:
+        return (
+            self.function if self.column is None else f"{self.function}__{self.column}"
+        )
+
+
+def _items(value: Optional[str]) -> List[str]:
+    return [item.strip() for item in (value or "").split(",") if item.strip()]
+
+
+def parse_group_by(value: Optional[str], types: Dict[str, type]) -> List[GroupBy]:
+    """
+    Columns of a comma separated `group_by`, raise `InvalidAggregate` on an
+    unknown column or bucket.
+
+    - `types`: python type of the columns
+    """
+    groups = []
+    for item in _items(value):
+        column, _, bucket = item.partition(":")
+        if column not in types:
+            raise InvalidAggregate("group_by", item, f"Unknown column '{column}'")
+        if bucket and (bucket not in BUCKETS or types[column] not in [date, datetime]):
+            raise InvalidAggregate(
+                "group_by",
+                item,
+                f"Time buckets are {', '.join(BUCKETS)}, on date and datetime"
+                " columns",
+            )
+        groups.append(GroupBy(column, bucket or None))
+    if len({group.label for group in groups}) != len(groups):
+        raise InvalidAggregate("group_by", value, "Repeated column")
+    return groups
+
+
+def parse_aggregates(value: Optional[str], types: Dict[str, type]) -> List[Aggregate]:
+    """
+    Functions of a comma separated `aggregate`, e.g. `count,avg:age`, `count`
+    without `aggregate`. Raise `InvalidAggregate` on an unknown function or
+    column, or a function that doesn't apply to the type of the column.
+    """
+    aggregates = []
+    for item in _items(value) or [COUNT]:
+        function, _, column = item.partition(":")
+        if function not in AGGREGATE_FUNCTIONS:
+            raise InvalidAggregate(
+                "aggregate",
+                item,
+                f"Unknown function '{function}', expected one of"
+                f" {', '.join(AGGREGATE_FUNCTIONS)}",
+            )
+        if not column:
+            if function != COUNT:
+                raise InvalidAggregate(
+                    "aggregate", item, f"'{function}' needs a column, '{function}:x'"
+                )
+            aggregates.append(Aggregate(COUNT))
+            continue
+        if column not in types:
+            raise InvalidAggregate("aggregate", item, f"Unknown column '{column}'")
+        if function in FUNCTION_TYPES and types[column] not in FUNCTION_TYPES[function]:
+            raise InvalidAggregate(
+                "aggregate",
+                item,
+                f"'{function}' doesn't apply to '{column}' ({types[column].__name__})",
+            )
+        aggregates.append(Aggregate(function, column))
+    if len({aggregate.label for aggregate in aggregates}) != len(aggregates):
+        raise InvalidAggregate("aggregate", value, "Repeated function")
+    return aggregates
+
+
+def group_expression(dialect: str, group: GroupBy, column: Any) -> ColumnElement:
+    """
+    Expression of a `group_by` column, truncated to its time bucket with
+    `date_trunc` on PostgreSQL and `strftime` on SQLite.
+    """
+    if group.bucket is None:
+        expression = column
+    elif dialect not in BUCKET_DIALECTS:
+        raise InvalidAggregate(
+            "group_by", group.label, f"Time buckets are not supported on {dialect}"
+        )
+    elif dialect == "sqlite":
+        # Inlined, the `GROUP BY` expression must be the one of the select
+        bucket_format = SQLITE_BUCKET_FORMATS[group.bucket]
+        expression = func.strftime(literal_column(f"'{bucket_format}'"), column)
+    else:
+        expression = func.date_trunc(literal_column(f"'{group.bucket}'"), column)
+    return expression.label(group.label)
+
+
+def aggregate_expression(aggregate: Aggregate, column: Any) -> ColumnElement:
+    if aggregate.column is None:
+        expression = func.count()
+    else:
+        expression = getattr(func, aggregate.function)(column)
+    return expression.label(aggregate.label)
+
+
+def partial_aggregates(aggregates: Sequence[Aggregate]) -> List[Aggregate]:
+    """
+    Aggregates to query on each shard to merge `aggregates`: an average is
+    merged from the sums and the counts of the column.
+    """
+    partials: Dict[str, Aggregate] = {}
+    for aggregate in aggregates:
+        if aggregate.function == AVG:
+            for function in [SUM, COUNT]:
+                partial = Aggregate(function, aggregate.column)
+                partials.setdefault(partial.label, partial)
+        else:
+            partials.setdefault(aggregate.label, aggregate)
+    return [*partials.values()]
+
+
+def row_values(values: Iterable[Any]) -> List[Any]:
+    """
+    Values of an aggregate row, with the `Decimal`s (PostgreSQL `AVG`, and `SUM`
+    of numeric columns) as floats so they are serialized as JSON numbers.
+    """
+    return [float(value) if isinstance(value, Decimal) else value for value in values]
+
+
+def _merge(function: str, first: Any, second: Any) -> Any:
+    if first is None or second is None:
+        return second if first is None else first
+    if function in [SUM, COUNT]:
+        return first + second
+    return min(first, second) if function == MIN else max(first, second)
+
+
+def merge_rows(
+    groups: Sequence[GroupBy],
+    aggregates: Sequence[Aggregate],
+    rows: Iterable[Dict[str, Any]],
+) -> List[List[Any]]:
+    """
+    Rows of `aggregates` per group merged from the rows of the
+    `partial_aggregates` of each shard, sorted by group with NULLs last.
+    """
+    partials = partial_aggregates(aggregates)
+    merged: Dict[Tuple[Any, ...], Dict[str, Any]] = {}
+    for row in rows:
+        key = tuple(row[group.label] for group in groups)
+        values = merged.setdefault(key, {})
+        for partial in partials:
+            values[partial.label] = _merge(
+                partial.function, values.get(partial.label), row[partial.label]
+            )
+    result: List[List[Any]] = []
+    for key in sorted(
+        merged, key=lambda key: tuple((value is None, value) for value in key)
+    ):
+        values = merged[key]
+        aggregated = []
+        for aggregate in aggregates:
+            if aggregate.function == AVG:
+                total = values[Aggregate(SUM, aggregate.column).label]
+                count = values[Aggregate(COUNT, aggregate.column).label]
+                aggregated.append(total / count if count else None)
+            else:
+                aggregated.append(values[aggregate.label])
+        result.append(row_values([*key, *aggregated]))
+    return result
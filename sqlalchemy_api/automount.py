@@ -0,0 +1,52 @@
+from typing import Container, Dict, Optional, Type, Union
+from sqlalchemy import MetaData
+from sqlalchemy.ext.automap import automap_base
+from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy_api._types import ENGINE_TYPE
+
+
+def get_models(
+    source: Optional[Union[Type[DeclarativeBase], MetaData]] = None,
+    engine: Optional[ENGINE_TYPE] = None,
+    reflect: bool = False,
+    include: Optional[Container[str]] = None,
+    exclude: Optional[Container[str]] = None,
+) -> Dict[str, Type]:
+    """
+    Collect the mapped models of a whole database, keyed by table name.
+
+    Params:
+    - `source`: a `DeclarativeBase` subclass whose mapped models are used as
+        they are, or a `MetaData` whose tables are mapped with automap.
+    - `engine`: sync SQLAlchemy engine, required when `reflect` is True.
+    - `reflect`: if True, reflect the tables from the database (into `source`
+        when it is a `MetaData`) and map them with automap.
+    - `include`: if given, only these table names are returned.
+    - `exclude`: table names to leave out.
+
+    Tables without a primary key can't be mapped and are skipped.
+    """
+    if exclude is None:
+        exclude = []
+
+    models: Dict[str, Type] = {}
+    if isinstance(source, type) and hasattr(source, "registry") and not reflect:
+        for mapper in source.registry.mappers:
+            table = getattr(mapper.class_, "__table__", None)
+            if table is not None:
+                models[table.name] = mapper.class_
+    else:
+        metadata = source if isinstance(source, MetaData) else MetaData()
+        if reflect:
+            assert engine is not None, "An engine is required to reflect tables"
+            metadata.reflect(bind=engine)  # type: ignore
+        AutomapBase = automap_base(metadata=metadata)
+        AutomapBase.prepare()
+        for model in AutomapBase.classes:
+            models[model.__table__.name] = model
+
+    return {
+        name: model
+        for name, model in sorted(models.items())
+        if (include is None or name in include) and name not in exclude
+    }
@@ -0,0 +1,224 @@
+from contextvars import ContextVar
+from pydantic import BaseModel, Field, ValidationError
+from sqlalchemy.orm import Session
+from sqlalchemy_api._types import ENGINE_TYPE
+from sqlalchemy_api.actions import ALL_ACTIONS, Actions
+from sqlalchemy_api.exception_handlers import (
+    get_exception_handler,
+    validation_error_handler,
+)
+from sqlalchemy_api.responses import GenericResponse, error_response
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+from typing_extensions import Literal
+import json
+
+if TYPE_CHECKING:  # pragma: no cover
+    from sqlalchemy_api.crud import CRUDHandler
+
+current_transaction: ContextVar[Optional[Session]] = ContextVar(
+    "sqlalchemy_api_current_transaction", default=None
+)
+
+READ_OPERATIONS = ["get", "get_many"]
+OPERATION_ACTIONS = {
+    "get": Actions.GET,
+    "get_many": Actions.GET_MANY,
+    "create": Actions.CREATE,
+    "update": Actions.UPDATE,
+    "patch": Actions.UPDATE,
+    "delete": Actions.DELETE,
+}
+NOT_EXECUTED = 424
+
+
+class BatchOperation(BaseModel):
+    model: str
+    action: Literal["get", "get_many", "create", "update", "patch", "delete"]
+    row_id: Any = None
+    payload: Dict[str, Any] = Field(default_factory=dict)
+    query: Dict[str, Any] = Field(default_factory=dict)
+
+
+class BatchRequest(BaseModel):
+    operations: List[BatchOperation] = Field(min_length=1)
+    atomic: bool = True
+
+
+class BatchResult(BaseModel):
+    status_code: int
+    body: Any = None
+
+
+class BatchResponse(BaseModel):
+    committed: bool
+    results: List[BatchResult]
+
+
+class BatchExecutor:
+    """
+    Runs a list of CRUD operations across the handlers of a mount with a single
+    session and a single commit. The operations run in order in the batch
+    transaction, so they see the writes of the previous ones.
+
+    With `atomic` (the default) the first failed operation rolls back the whole
+    batch and the rest are not executed. Otherwise each write runs in its own
+    savepoint, a failed one is rolled back and the rest are committed.
+
+    Params:
+    - `handlers`: handlers by model name
+    - `engine`: engine of the batch transaction, the one of the first handler
+        by default. Only the handlers on this engine and without shards can
+        join the transaction, the operations of the others get a 422
+    - `actions`: actions enabled in the mount
+    - `max_operations`: max operations per batch
+    """
+
+    def __init__(
+        self,
+        handlers: Dict[str, "CRUDHandler"],
+        engine: Optional[ENGINE_TYPE] = None,
+        actions: List[Actions] = ALL_ACTIONS,
+        max_operations: int = 50,
+    ) -> None:
+        self.handlers = handlers
+        if engine is None and handlers:
+            engine = next(iter(handlers.values())).engine
+        self.engine = engine
+        self.actions = actions
+        self.max_operations = max_operations
+
+    async def execute(self, payload: Any) -> GenericResponse:
+        """
+        Validate and run a batch, the status code is the one of the failed
+        operation if an atomic batch is rolled back, 200 otherwise.
+        """
+        try:
+            batch = BatchRequest.model_validate(payload)
+        except ValidationError as exc:
+            return validation_error_handler(exc)
+        errors = self.check(batch)
+        if errors:
+            return error_response(detail=errors, status_code=422)
+        try:
+            response = await self.run(batch)
+        except Exception as exc:
+            exception_handler = get_exception_handler(exc)
+            return exception_handler(exc, False)
+        status_code = 200
+        if not response.committed:
+            status_code = next(
+                result.status_code
+                for result in response.results
+                if result.status_code >= 400
+            )
+        return GenericResponse(
+            content=response.model_dump_json(),
+            status_code=status_code,
+            media_type="application/json",
+        )
+
+    def check(self, batch: BatchRequest) -> List[Dict[str, Any]]:
+        errors = []
+        if len(batch.operations) > self.max_operations:
+            errors.append(
+                {
+                    "loc": ["body", "operations"],
+                    "msg": f"A batch accepts up to {self.max_operations} operations",
+                    "input": len(batch.operations),
+                }
+            )
+        for index, operation in enumerate(batch.operations):
+            if operation.model not in self.handlers:
+                errors.append(
+                    {
+                        "loc": ["body", "operations", index, "model"],
+                        "msg": f"Unknown model '{operation.model}'",
+                        "input": operation.model,
+                    }
+                )
+            elif not self.joins_transaction(self.handlers[operation.model]):
+                errors.append(
+                    {
+                        "loc": ["body", "operations", index, "model"],
+                        "msg": f"'{operation.model}' can't join the batch"
+                        " transaction, it's sharded or on another engine",
+                        "input": operation.model,
+                    }
+                )
+            elif OPERATION_ACTIONS[operation.action] not in self.actions:
+                errors.append(
+                    {
+                        "loc": ["body", "operations", index, "action"],
+                        "msg": f"Action '{operation.action}' is not enabled",
+                        "input": operation.action,
+                    }
+                )
+        return errors
+
+    def joins_transaction(self, handler: "CRUDHandler") -> bool:
+        # Otherwise the handler would write in its own session and commit, and a
+        # later failure couldn't roll it back
+        return handler.routing.can_join(self.engine)
+
+    async def run(self, batch: BatchRequest) -> BatchResponse:
+        operations = batch.operations
+        results: List[BatchResult] = [
+            BatchResult(
+                status_code=NOT_EXECUTED,
+                body={"message": "Not executed, a previous operation failed"},
+            )
+            for _ in operations
+        ]
+        handler = self.handlers[operations[0].model]
+        failed = False
+        with handler.sessionmaker() as session:
+            token = current_transaction.set(session)
+            try:
+                for index, operation in enumerate(operations):
+                    guard = self.handlers[operation.model].guard
+                    savepoint = None
+                    if not batch.atomic and operation.action not in READ_OPERATIONS:
+                        with guard():
+                            savepoint = session.begin_nested()
+                    await self.run_operation(operation, results, index)
+                    if results[index].status_code >= 400:
+                        if savepoint is not None and savepoint.is_active:
+                            with guard():
+                                savepoint.rollback()
+                        if batch.atomic:
+                            failed = True
+                            break
+                    elif savepoint is not None:
+                        with guard():
+                            savepoint.commit()
+            finally:
+                current_transaction.reset(token)
+            if failed:
+                with handler.guard():
+                    session.rollback()
+                return BatchResponse(committed=False, results=results)
+            handler.commit(session)
+        return BatchResponse(committed=True, results=results)
+
+    async def run_operation(
+        self, operation: BatchOperation, results: List[BatchResult], index: int
+    ) -> None:
+        handler = self.handlers[operation.model]
+        if operation.action == "get":
+            response = await handler.get(row_id=operation.row_id)
+        elif operation.action == "get_many":
+            response = await handler.get_many(query_params=operation.query)
+        elif operation.action == "create":
+            response = await handler.post(payload=operation.payload)
+        elif operation.action == "update":
+            response = await handler.put(
+                row_id=operation.row_id, payload=operation.payload
+            )
+        elif operation.action == "patch":
+            response = await handler.patch(
+                row_id=operation.row_id, payload=operation.payload
+            )
+        else:
+            response = await handler.delete(row_id=operation.row_id)
+        body = json.loads(response.content) if response.content else None
+        results[index] = BatchResult(status_code=response.status_code, body=body)
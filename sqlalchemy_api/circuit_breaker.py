@@ -0,0 +1,200 @@
+from asyncio import CancelledError
+from collections import deque
+from contextlib import contextmanager
+from sqlalchemy.exc import (
+    DBAPIError,
+    InterfaceError,
+    OperationalError,
+    TimeoutError as PoolTimeoutError,
+)
+from sqlalchemy_api.exceptions import CircuitOpen
+from sqlalchemy_api.metrics import MetricsRegistry
+from sqlalchemy_api.timeouts import is_statement_timeout
+from threading import Lock
+from typing import Callable, Deque, Iterator, List, Optional, Tuple
+import math
+import time
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+StateListener = Callable[["CircuitBreaker", str, str], None]
+
+
+def is_connection_error(exc: BaseException) -> bool:
+    """
+    Whether an error means the database can't be reached: pool checkout timeouts,
+    invalidated connections and the driver operational and interface errors,
+    except statement timeouts.
+    """
+    if isinstance(exc, PoolTimeoutError):
+        return True
+    if not isinstance(exc, DBAPIError):
+        return False
+    if exc.connection_invalidated:
+        return True
+    return isinstance(exc, (OperationalError, InterfaceError)) and not (
+        is_statement_timeout(exc)
+    )
+
+
+class CircuitBreaker:
+    """
+    Fails fast with `CircuitOpen` while the database is failing, instead of
+    waiting for a pool checkout or connect timeout on every request.
+
+    The circuit opens after `failure_threshold` consecutive failures, or when
+    the failure rate of the calls of the last `window` seconds reaches
+    `failure_rate` (with at least `min_calls` calls). After `reset_timeout`
+    seconds it becomes half open and lets `half_open_calls` trial calls through,
+    it closes if they succeed and opens again if one fails.
+
+    Params:
+    - `name`: name of the breaker in the metrics
+    - `failure_threshold`: consecutive failures that open the circuit
+    - `failure_rate`: if given, failure rate (0 to 1) that opens the circuit
+    - `window`: seconds of calls considered for the failure rate
+    - `min_calls`: min calls in the window to apply the failure rate
+    - `reset_timeout`: seconds the circuit stays open before the trial calls
+    - `half_open_calls`: concurrent trial calls while half open
+    - `is_failure`: tells the errors that count as failures, connection errors by
+        default, the rest of the errors count as successful calls
+    - `metrics`: if given, the state, transitions and rejected calls are recorded
+    """
+
+    calls: Deque[Tuple[float, bool]]
+    listeners: List[StateListener]
+
+    def __init__(
+        self,
+        name: str = "database",
+        failure_threshold: int = 5,
+        failure_rate: Optional[float] = None,
+        window: float = 60,
+        min_calls: int = 20,
+        reset_timeout: float = 30,
+        half_open_calls: int = 1,
+        is_failure: Callable[[BaseException], bool] = is_connection_error,
+        metrics: Optional[MetricsRegistry] = None,
+    ) -> None:
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.failure_rate = failure_rate
+        self.window = window
+        self.min_calls = min_calls
+        self.reset_timeout = reset_timeout
+        self.half_open_calls = half_open_calls
+        self.is_failure = is_failure
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.consecutive_failures = 0
+        self.trials = 0
+        self.calls = deque()
+        self.listeners = []
+        self.lock = Lock()
+        self.metrics = metrics
+        if metrics is not None:
+            self.state_gauge = metrics.gauge(
+                "sqlalchemy_api_circuit_state",
+                "State of the circuit breakers: 0 closed, 1 half open, 2 open",
+                ["name"],
+            )
+            self.transitions = metrics.counter(
+                "sqlalchemy_api_circuit_transitions_total",
+                "State changes of the circuit breakers",
+                ["name", "state"],
+            )
+            self.rejected = metrics.counter(
+                "sqlalchemy_api_circuit_rejected_total",
+                "Calls rejected while the circuit is open",
+                ["name"],
+            )
+            self.state_gauge.set(STATE_VALUES[CLOSED], name=name)
+
+    def add_listener(self, listener: StateListener) -> None:
+        """
+        Call `listener(breaker, old_state, new_state)` on every state change.
+        """
+        self.listeners.append(listener)
+
+    @property
+    def retry_after(self) -> float:
+        """
+        Seconds until the circuit lets trial calls through.
+        """
+        return max(self.opened_at + self.reset_timeout - time.monotonic(), 0)
+
+    def transition(self, state: str) -> None:
+        old_state, self.state = self.state, state
+        if state == OPEN:
+            self.opened_at = time.monotonic()
+        if state != HALF_OPEN:
+            self.trials = 0
+        if state == CLOSED:
+            self.consecutive_failures = 0
+            self.calls.clear()
+        if self.metrics is not None:
+            self.state_gauge.set(STATE_VALUES[state], name=self.name)
+            self.transitions.inc(name=self.name, state=state)
+        for listener in self.listeners:
+            listener(self, old_state, state)
+
+    def before_call(self) -> None:
+        with self.lock:
+            if self.state == OPEN and self.retry_after == 0:
+                self.transition(HALF_OPEN)
+            if self.state == HALF_OPEN and self.trials < self.half_open_calls:
+                self.trials += 1
+                return
+            if self.state == CLOSED:
+                return
+            if self.metrics is not None:
+                self.rejected.inc(name=self.name)
+            # Half open, the cooldown is over but the trial calls are running
+            raise CircuitOpen(self.name, max(math.ceil(self.retry_after), 1))
+
+    def release(self) -> None:
+        """
+        Give back the trial call slot of a call that neither failed nor succeeded.
+        """
+        with self.lock:
+            if self.state == HALF_OPEN and self.trials > 0:
+                self.trials -= 1
+
+    def record(self, failure: bool) -> None:
+        with self.lock:
+            now = time.monotonic()
+            if self.state == HALF_OPEN:
+                self.transition(OPEN if failure else CLOSED)
+                return
+            if self.state == OPEN:
+                return
+            self.calls.append((now, failure))
+            while self.calls and self.calls[0][0] < now - self.window:
+                self.calls.popleft()
+            self.consecutive_failures = self.consecutive_failures + 1 if failure else 0
+            if self.consecutive_failures >= self.failure_threshold:
+                self.transition(OPEN)
+            elif self.failure_rate is not None and len(self.calls) >= self.min_calls:
+                failures = sum(failed for _, failed in self.calls)
+                if failures / len(self.calls) >= self.failure_rate:
+                    self.transition(OPEN)
+
+    @contextmanager
+    def call(self) -> Iterator[None]:
+        """
+        Guard a database call, raise `CircuitOpen` without running it while the
+        circuit is open. A cancelled call isn't recorded.
+        """
+        self.before_call()
+        try:
+            yield
+        except BaseException as exc:
+            if isinstance(exc, Exception) and not isinstance(exc, CancelledError):
+                self.record(self.is_failure(exc))
+            else:
+                self.release()
+            raise
+        self.record(False)
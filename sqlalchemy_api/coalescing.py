@@ -0,0 +1,113 @@
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
+import anyio
+import contextvars
+
+
+class PendingWrite:
+    """
+    A row waiting in a batch, `result` or `error` is set when the batch is
+    flushed.
+    """
+
+    def __init__(self, values: Dict[str, Any]) -> None:
+        self.values = values
+        self.result: Any = None
+        self.error: Optional[Exception] = None
+        self.done = anyio.Event()
+
+
+class WriteBatch:
+    def __init__(self) -> None:
+        self.writes: List[PendingWrite] = []
+        self.full = anyio.Event()
+
+
+Flush = Callable[[List[PendingWrite]], Awaitable[None]]
+
+
+class WriteCoalescer:
+    """
+    Group commit for the `post` of the `CRUDHandler`s: the rows posted within
+    `window` seconds are inserted together, in a single transaction, and each
+    caller gets its own row or its own error.
+
+    The first write of a batch waits for the window (or until the batch has
+    `max_batch` rows) and flushes it, the rest of the writes wait for the
+    flush. An instance passed to several handlers keeps a batch per model.
+
+    The flush runs in a clean context, apart from the context variables of the
+    request of the write that triggered it, e.g. its statements aren't
+    attributed to that request and its span isn't their parent.
+
+    The coalescer is meant to be used from a single event loop.
+
+    Params:
+    - `window`: seconds a batch collects writes
+    - `max_batch`: max rows per batch, a full batch is flushed right away
+    """
+
+    batches: Dict[Hashable, WriteBatch]
+
+    def __init__(self, window: float = 0.002, max_batch: int = 100) -> None:
+        if max_batch < 1:
+            raise ValueError("`max_batch` must be at least 1")
+        self.window = window
+        self.max_batch = max_batch
+        self.batches = {}
+
+    async def submit(self, key: Hashable, values: Dict[str, Any], flush: Flush) -> Any:
+        """
+        Add a row to the batch of `key` and wait for it to be flushed, return the
+        result set by `flush` or raise its error.
+
+        - `key`: batches are per key, e.g. per model and database
+        - `values`: values of the row
+        - `flush`: inserts the rows of a batch, setting the `result` or the
+            `error` of each one
+        """
+        write = PendingWrite(values)
+        batch = self.batches.get(key)
+        if batch is None:
+            batch = self.batches[key] = WriteBatch()
+            batch.writes.append(write)
+            if len(batch.writes) >= self.max_batch:
+                self.close(key, batch)
+            # Shielded, the other writes of the batch depend on this flush
+            with anyio.CancelScope(shield=True):
+                with anyio.move_on_after(self.window):
+                    await batch.full.wait()
+                self.close(key, batch)
+                await self.flush(batch, flush)
+        else:
+            batch.writes.append(write)
+            if len(batch.writes) >= self.max_batch:
+                self.close(key, batch)
+            await write.done.wait()
+        if write.error is not None:
+            raise write.error
+        return write.result
+
+    def close(self, key: Hashable, batch: WriteBatch) -> None:
+        """
+        Stop adding writes to the batch, the next write starts a new one.
+        """
+        if self.batches.get(key) is batch:
+            del self.batches[key]
+        batch.full.set()
+
+    @staticmethod
+    async def flush(batch: WriteBatch, flush: Flush) -> None:
+        async def run() -> None:
+            try:
+                await flush(batch.writes)
+            except Exception as exc:
+                for write in batch.writes:
+                    if write.result is None and write.error is None:
+                        write.error = exc
+            finally:
+                for write in batch.writes:
+                    write.done.set()
+
+        async with anyio.create_task_group() as task_group:
+            # The task copies the context it is started from, an empty one
+            contextvars.Context().run(task_group.start_soon, run)
@@ -0,0 +1,119 @@
+from sqlalchemy import and_, func, select
+from sqlalchemy.inspection import inspect
+from sqlalchemy.orm import RelationshipDirection
+from sqlalchemy.sql.elements import ColumnElement
+from sqlalchemy_api.aggregation import AGGREGATE_FUNCTIONS, AVG, COUNT, FUNCTION_TYPES
+from sqlalchemy_api.utils import get_column_python_type
+from typing import Any, Optional
+
+
+class RelationAggregate:
+    """
+    Computed field of a handler: an aggregate of the related rows of a one to
+    many or many to many relationship, e.g. the number of posts of a user or
+    the date of its latest comment. It's computed by the database, the related
+    rows are never loaded.
+
+    Params:
+    - `relation`: name of the relationship of the model
+    - `function`: `count`, `sum`, `avg`, `min` or `max`
+    - `column`: column of the related model, `count` without it counts the
+        related rows
+    """
+
+    def __init__(
+        self, relation: str, function: str = COUNT, column: Optional[str] = None
+    ) -> None:
+        if function not in AGGREGATE_FUNCTIONS:
+            raise ValueError(
+                f"Unknown function '{function}', expected one of"
+                f" {', '.join(AGGREGATE_FUNCTIONS)}"
+            )
+        if column is None and function != COUNT:
+            raise ValueError(f"'{function}' of '{relation}' needs a column")
+        self.relation = relation
+        self.function = function
+        self.column = column
+
+    def relationship(self, model: Any) -> Any:
+        relationship = inspect(model).relationships.get(self.relation)
+        if relationship is None or relationship.direction not in [
+            RelationshipDirection.ONETOMANY,
+            RelationshipDirection.MANYTOMANY,
+        ]:
+            raise ValueError(
+                f"'{self.relation}' isn't a one to many or many to many relationship"
+                f" of {model.__name__}"
+            )
+        return relationship
+
+    def python_type(self, model: Any) -> type:
+        """
+        Python type of the field, raise `ValueError` if the function doesn't
+        apply to the column.
+        """
+        if self.column is None:
+            return int
+        target = self.relationship(model).entity.local_table
+        if self.column not in target.columns:
+            raise ValueError(f"Unknown column '{self.column}' of '{self.relation}'")
+        python_type = get_column_python_type(target.columns[self.column], True)
+        if self.function == COUNT:
+            return int
+        if python_type not in FUNCTION_TYPES[self.function]:
+            raise ValueError(
+                f"'{self.function}' doesn't apply to '{self.column}'"
+                f" ({python_type.__name__})"
+            )
+        return float if self.function == AVG else python_type
+
+    @property
+    def nullable(self) -> bool:
+        # The other functions are NULL without related rows
+        return self.function != COUNT
+
+    def expression(self, model: Any) -> ColumnElement:
+        """
+        Correlated scalar subquery of the aggregate, usable in the select, the
+        `WHERE` and the `ORDER BY` of the statements of the model.
+        """
+        relationship = self.relationship(model)
+        parent = model.__table__
+        # Aliased, so a self referential relationship correlates to the parent
+        target = relationship.entity.local_table.alias()
+        if relationship.secondary is not None:
+            link = relationship.secondary.alias()
+            conditions = [
+                link.corresponding_column(remote) == local
+                for local, remote in relationship.synchronize_pairs
+            ]
+            from_ = link
+            if self.column is not None:
+                pairs = relationship.secondary_synchronize_pairs
+                from_ = link.join(
+                    target,
+                    and_(
+                        *[
+                            link.corresponding_column(remote)
+                            == target.corresponding_column(local)
+                            for local, remote in pairs
+                        ]
+                    ),
+                )
+        else:
+            conditions = [
+                target.corresponding_column(remote) == local
+                for local, remote in relationship.local_remote_pairs
+            ]
+            from_ = target
+        if self.column is None:
+            aggregate = func.count()
+        else:
+            aggregate = getattr(func, self.function)(target.columns[self.column])
+        return (
+            select(aggregate)
+            .select_from(from_)
+            .where(*conditions)
+            .correlate(parent)
+            .scalar_subquery()
+        )
@@ -1,49 +1,197 @@
 from sqlalchemy_api._types import ENGINE_TYPE
 from sqlalchemy_api.pydantic_utils import (
+    AggregateSchema,
     PageSchema,
     SchemaModel,
+    SearchSchema,
+    TreeSchema,
+    paginate_schema,
 )
 from sqlalchemy_api.utils import get_column_python_type
-from sqlalchemy_api.exceptions import InvalidOperator, NotFoundException
-from sqlalchemy_api.exception_handlers import (
-    exception_handlers,
-    unhandled_exception_response,
+from sqlalchemy_api.exceptions import (
+    InvalidCursor,
+    InvalidFilterExpression,
+    InvalidOperator,
+    InvalidUpdateOperator,
+    MissingShardKey,
+    Overloaded,
+    NotFoundException,
+    QueryTooExpensive,
 )
+from sqlalchemy_api.exception_handlers import get_exception_handler
 from sqlalchemy_api.responses import GenericResponse, RowIDResponse, error_response
+from sqlalchemy_api.instrumentation import (
+    RequestContext,
+    current_request,
+    instrument_engine,
+)
+from sqlalchemy_api.metrics import CRUDMetrics, MetricsRegistry
+from sqlalchemy_api.tracing import TracerProtocol
+from sqlalchemy_api.indexes import (
+    IndexPolicy,
+    gin_indexed,
+    indexed_columns,
+    operator_index,
+)
+from sqlalchemy_api.circuit_breaker import CircuitBreaker
+from sqlalchemy_api.replicas import ReplicaRouter
+from sqlalchemy_api.sharding import ShardMap
+from sqlalchemy_api.routing import SessionRouting, session_routing
+from sqlalchemy_api.coalescing import PendingWrite, WriteCoalescer
+from sqlalchemy_api.batch import current_transaction
+from sqlalchemy_api.pagination import decode_cursor, encode_cursor
+from sqlalchemy_api.expressions import (
+    AND,
+    Condition,
+    Group,
+    Node,
+    Not,
+    conjuncts,
+    parse_filter,
+    shape as expression_shape,
+)
+from sqlalchemy_api.json_filters import (
+    ARRAY_OPERATORS,
+    JSON_FILTER_DIALECTS,
+    JSON_OPERATORS,
+    json_condition,
+)
+from sqlalchemy_api.text_search import (
+    ICONTAINS,
+    SEARCH,
+    TEXT_SEARCH_OPERATORS,
+    TextSearch,
+    icontains,
+    search_condition,
+    search_rank,
+)
+from sqlalchemy_api.aggregation import (
+    aggregate_expression,
+    group_expression,
+    merge_rows,
+    parse_aggregates,
+    parse_group_by,
+    partial_aggregates,
+    row_values,
+)
+from sqlalchemy_api.computed import RelationAggregate
+from sqlalchemy_api.trees import (
+    DEFAULT_MAX_DEPTH,
+    nest,
+    parent_column as tree_parent_column,
+    tree_statement,
+)
+from sqlalchemy_api.facets import (
+    default_facet_columns,
+    facet_counts,
+    facet_statement,
+    parse_facets,
+)
+from sqlalchemy_api.sorting import SortKey, after, order_by, parse_sort, sort_key
+from sqlalchemy_api.admission import READ, WRITE, AdmissionControl, action_kind
+from sqlalchemy_api.explain import Explain, estimate, format_plan, full_scans
+from sqlalchemy_api.timeouts import apply_statement_timeout, raise_statement_timeout
+from sqlalchemy_api.slow_queries import (
+    SlowQuery,
+    SlowQueryLog,
+    SlowStatement,
+    filter_shape,
+)
 from sqlalchemy_api.filtering import (
     Filter,
     OPERATOR_ATTR_MAP,
     NULL_OPERATORS,
     IS_NULL,
+    BETWEEN,
+    LIST_OPERATORS,
+    filter_values,
 )
 from sqlalchemy.orm import sessionmaker as sqlsessionmaker, Session, DeclarativeBase
-from sqlalchemy.sql.expression import select, delete, update, Executable, Select
+from sqlalchemy.sql.expression import (
+    select,
+    delete,
+    insert,
+    update,
+    Executable,
+    Select,
+)
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.inspection import inspect
-from sqlalchemy import func
-from pydantic import BaseModel, create_model
-from typing import Any, List, Type, Dict
+from sqlalchemy import JSON, and_, event, func, not_, or_
+from sqlalchemy.sql.elements import ColumnElement
+from sqlalchemy.engine import Connection
+from pydantic import BaseModel, ValidationError, create_model
+from contextlib import asynccontextmanager, contextmanager, nullcontext
+from functools import cached_property, partial
+from typing import (
+    Any,
+    AsyncIterator,
+    ContextManager,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Type,
+    Union,
+)
+from decimal import Decimal
 import anyio
+import heapq
+import json
+import operator
+import time
+
+# `patch` operators of the numeric columns, applied in the database
+UPDATE_OPERATORS = {"$inc": operator.add, "$dec": operator.sub}
+NUMERIC_TYPES = [int, float, Decimal]
 
 
 def crud_route(validate_row_id: bool = False):
     """
     Decorator for CRUD routes
-    Here we handle exceptions and validate row_id
+    Here we handle exceptions, validate row_id, trace the request and record its
+    metrics, the action is the name of the decorated method.
     Params:
     - `validate_row_id`: if True, validate row_id type
     """
 
     def decorator(func):
         async def wrapper(self, *args, **kwargs) -> GenericResponse:
-            try:
-                if validate_row_id:
-                    kwargs["row_id"] = self.validate_row_id(kwargs["row_id"])
-                return await func(self, *args, **kwargs)
-            except Exception as exc:
-                exception_handler = exception_handlers.get(
-                    type(exc), unhandled_exception_response
-                )
-                return exception_handler(exc, self.debug)
+            action = func.__name__
+            request = RequestContext(self.model_name, action, tracer=self.tracer)
+            token = current_request.set(request)
+            attributes = {
+                "sqlalchemy_api.model": self.model_name,
+                "sqlalchemy_api.action": action,
+            }
+            with self.span(f"{self.model_name}.{action}", attributes) as span:
+                try:
+                    if validate_row_id:
+                        with self.phase("validation"):
+                            kwargs["row_id"] = self.validate_row_id(kwargs["row_id"])
+                    async with self.admit(action):
+                        timeout = self.get_statement_timeout()
+                        with raise_statement_timeout(timeout):
+                            response = await func(self, *args, **kwargs)
+                except Exception as exc:
+                    if span is not None:
+                        span.record_exception(exc)
+                    exception_handler = get_exception_handler(exc)
+                    response = exception_handler(exc, self.debug)
+                finally:
+                    current_request.reset(token)
+                if span is not None:
+                    span.set_attribute("http.status_code", response.status_code)
+            self.record_request(request, response)
+            self.log_slow_query(request)
+            if self.server_timing:
+                headers = {**(response.headers or {})}
+                headers["Server-Timing"] = request.server_timing()
+                response = response.model_copy(update={"headers": headers})
+            return response
 
         return wrapper
 
@@ -57,14 +205,30 @@ class CRUDHandler:
     model: Type[DeclarativeBase]
     page_size_default: int
     page_size_max: int
-    schema: Type[BaseModel]
-    schema_relations: Type[BaseModel]
-    schema_paginated: Type[BaseModel]
-    schema_post: Type[BaseModel]
-    schema_put: Type[BaseModel]
-    schema_filters: Type[BaseModel]
     primary_key_type: Any
     debug: bool
+    metrics: Optional[CRUDMetrics]
+    tracer: Optional[TracerProtocol]
+    server_timing: bool
+    slow_query_log: Optional[SlowQueryLog]
+    index_policy: Optional[IndexPolicy]
+    statement_timeout: Union[None, float, Dict[str, float]]
+    max_cost: Optional[float]
+    max_rows: Optional[float]
+    admission_control: Optional[AdmissionControl]
+    circuit_breaker: Optional[CircuitBreaker]
+    replicas: Optional[ReplicaRouter]
+    shards: Optional[ShardMap]
+    routing: SessionRouting
+    write_coalescer: Optional[WriteCoalescer]
+    returning: bool
+    max_filter_depth: int
+    max_filter_conditions: int
+    text_search: Dict[str, TextSearch]
+    facet_columns: Optional[List[str]]
+    computed_fields: Dict[str, RelationAggregate]
+    parent_column: Optional[str]
+    max_tree_depth: int
 
     def __init__(
         self,
@@ -74,154 +238,1366 @@ class CRUDHandler:
         page_size_default: int = 100,
         page_size_max: int = 1000,
         debug: bool = False,
+        metrics: Optional[MetricsRegistry] = None,
+        tracer: Optional[TracerProtocol] = None,
+        server_timing: bool = False,
+        slow_query_log: Optional[SlowQueryLog] = None,
+        index_policy: Optional[IndexPolicy] = None,
+        statement_timeout: Union[None, float, Dict[str, float]] = None,
+        max_cost: Optional[float] = None,
+        max_rows: Optional[float] = None,
+        admission_control: Optional[AdmissionControl] = None,
+        circuit_breaker: Optional[CircuitBreaker] = None,
+        replicas: Optional[ReplicaRouter] = None,
+        shards: Optional[ShardMap] = None,
+        write_coalescer: Optional[WriteCoalescer] = None,
+        returning: bool = True,
+        max_filter_depth: int = 8,
+        max_filter_conditions: int = 32,
+        text_search: Optional[Dict[str, TextSearch]] = None,
+        facet_columns: Optional[List[str]] = None,
+        computed_fields: Optional[Dict[str, RelationAggregate]] = None,
+        parent_column: Optional[str] = None,
+        max_tree_depth: int = DEFAULT_MAX_DEPTH,
     ) -> None:
+        """
+        - `model`: SQLAlchemy model
+        - `engine`: SQLAlchemy engine
+        - `async_engine`: if True, use async engine
+        - `page_size_default`: default page size
+        - `page_size_max`: max page size
+        - `debug`: if True, return stacktrace on error, and `get_many` accepts the
+            `explain` query param to return the query plans instead of the page
+        - `metrics`: if given, record the request metrics in this registry
+        - `tracer`: OpenTelemetry compatible tracer, if given each request is traced
+            with a span per phase and per SQL statement
+        - `server_timing`: if True, add a `Server-Timing` header with the duration
+            of each phase to the responses
+        - `slow_query_log`: if given, the requests whose SQL time exceeds its
+            threshold are logged in it
+        - `index_policy`: if given, `get_many` filters that can't use an index are
+            checked against it and their usage is collected by its advisor
+        - `statement_timeout`: max seconds per statement, for every action or by
+            action name (e.g. `{"get_many": 2}`), a timeout returns a 504
+        - `max_cost`, `max_rows`: if given, `get_many` queries whose planner
+            estimated cost or rows exceed them are rejected, on PostgreSQL
+        - `admission_control`: if given, limits the concurrent reads and writes,
+            the requests over the budgets wait in a bounded queue or get a 503
+        - `circuit_breaker`: if given, guards the statements and commits, the
+            requests fail fast with a 503 while the circuit is open
+        - `replicas`: if given, the reads go to its reader engines, `engine` is
+            the writer
+        - `shards`: if given, the rows are partitioned across its engines by its
+            shard key, `get_many` queries the shards concurrently
+        - `write_coalescer`: if given, the concurrent `post`s are grouped and
+            inserted in a single transaction
+        - `returning`: if True, `post` and `put` write and read back the row with
+            a single `INSERT` or `UPDATE ... RETURNING` on the dialects that
+            support it, instead of a second statement
+        - `max_filter_depth`, `max_filter_conditions`: max nesting and number of
+            conditions of the `filter` expressions, larger ones get a 422
+        - `text_search`: text columns searchable with the `search` and
+            `icontains` operators, and the indexes behind them
+        - `facet_columns`: columns whose value counts the list queries can
+            request with `facets`, the enum and bool columns by default
+        - `computed_fields`: fields of the records computed from their related
+            rows, e.g. `{"post_count": RelationAggregate("posts")}`, they can be
+            filtered and sorted by. With them the list records have the columns
+            and the computed fields, without the relations
+        - `parent_column`: column referencing the parent row of a self
+            referential model, for the `descendants` and `ancestors` of a row.
+            By default the single foreign key of the table to its primary key
+        - `max_tree_depth`: max levels of the `descendants` and `ancestors`
+        """
         self.model = model
+        self.model_name = model.__name__
         self.engine = engine
         self.async_engine = async_engine
         self.page_size_default = page_size_default
         self.page_size_max = page_size_max
         self.debug = debug
-        self.sessionmaker = sqlsessionmaker(
-            bind=self.engine, expire_on_commit=False  # type: ignore
-        )
         self.primary_key = inspect(self.model).primary_key[0]
         self.primary_key_type = get_column_python_type(self.primary_key)
         self.primary_key_names = [
             primary_key.key for primary_key in inspect(self.model).primary_key
         ]
-        schema_model = SchemaModel(model=self.model)
-        self.schema_base = schema_model.base()
-        self.schema_with_relations = schema_model.relations()
-        self.schema_paginated = schema_model.paginated()
-        self.schema_post = schema_model.post()
-        self.schema_put = schema_model.put()
-        self.schema_relations = schema_model.relations()
-        self.schema_filters = self.get_schema_filters()
-
-    async def execute_stmt(self, stmt: Executable, session: Session) -> Any:
-        if self.async_engine:
-            result = await session.execute(stmt)  # type: ignore
-        else:
-            result = await anyio.to_thread.run_sync(session.execute, stmt)
+        self.metrics = CRUDMetrics(metrics) if metrics is not None else None
+        self.tracer = tracer
+        self.server_timing = server_timing
+        self.slow_query_log = slow_query_log
+        self.index_policy = index_policy
+        self.statement_timeout = statement_timeout
+        self.max_cost = max_cost
+        self.max_rows = max_rows
+        self.admission_control = admission_control
+        self.circuit_breaker = circuit_breaker
+        if self.metrics is not None and admission_control is not None:
+            self.metrics.registry.add_collector(self.collect_admission_queue)
+        self.replicas = replicas
+        self.shards = shards
+        self.routing = session_routing(
+            self.engine,
+            self.make_sessionmaker,
+            replicas=replicas,
+            shards=shards,
+            primary_key=self.primary_key.name,
+        )
+        self.sessionmaker = self.routing.sessionmaker
+        self.write_coalescer = write_coalescer
+        self.returning = returning
+        self.max_filter_depth = max_filter_depth
+        self.max_filter_conditions = max_filter_conditions
+        self.text_search = text_search or {}
+        for name, search in self.text_search.items():
+            if name not in self.model.__table__.columns:
+                raise ValueError(f"Unknown text search column '{name}'")
+            search.check(name, self.engine.dialect.name)
+        self.facet_columns = facet_columns
+        for name in facet_columns or []:
+            if name not in self.model.__table__.columns:
+                raise ValueError(f"Unknown facet column '{name}'")
+        self.computed_fields = computed_fields or {}
+        for name in self.computed_fields:
+            # The values are set on the records, they can't shadow an attribute
+            if hasattr(self.model, name):
+                raise ValueError(
+                    f"Computed field '{name}' is an attribute of the model"
+                )
+        if parent_column is None:
+            parent_column = tree_parent_column(self.model.__table__)
+        elif parent_column not in self.model.__table__.columns:
+            raise ValueError(f"Unknown parent column '{parent_column}'")
+        self.parent_column = parent_column
+        self.max_tree_depth = max_tree_depth
+
+    def make_sessionmaker(self, engine: ENGINE_TYPE) -> sqlsessionmaker[Session]:
+        sessionmaker = sqlsessionmaker(
+            bind=engine, expire_on_commit=False  # type: ignore
+        )
+        if self.statement_timeout is not None:
+            event.listen(sessionmaker, "after_begin", self.on_begin)
+        if self.instrumented:
+            instrument_engine(engine)
+        return sessionmaker
+
+    @contextmanager
+    def read_session(self) -> Iterator[Session]:
+        """
+        Session for the reads, on a reader engine if there are replicas, unless
+        the current client wrote within the stickiness window.
+        """
+        batch_session = self.batch_session()
+        if batch_session is not None:
+            yield batch_session
+            return
+        with self.routing.read_session() as session:
+            yield session
+
+    def batch_session(self) -> Optional[Session]:
+        """
+        Session of the batch transaction the current request runs in, if the
+        handler can join it (same engine, no shards).
+        """
+        session = current_transaction.get()
+        if session is None or not self.routing.can_join(session.get_bind()):
+            return None
+        return session
+
+    def write_session(self, shard: Optional[str] = None) -> ContextManager[Session]:
+        """
+        Session for the writes, on the database of `shard` with shards.
+        """
+        batch_session = self.batch_session()
+        if batch_session is not None:
+            return nullcontext(batch_session)
+        return self.routing.write_sessionmaker(shard)()
+
+    def row_sessions(
+        self, row_id: Any, read: bool = False
+    ) -> Iterator[ContextManager[Session]]:
+        """
+        Sessions of the databases that may hold the row, with shards the one of
+        `row_id` if the primary key is the shard key and every shard otherwise.
+        """
+        batch_session = self.batch_session()
+        if batch_session is not None:
+            yield nullcontext(batch_session)
+            return
+        yield from self.routing.row_sessions(row_id, read)
+
+    def payload_shard(self, payload: Dict, formatted_payload: Dict) -> str:
+        """
+        Shard of a new row, the shard key is required in the payload.
+        """
+        assert self.shards is not None
+        key = self.shards.key
+        if formatted_payload.get(key) is not None:
+            return self.shards.shard_for(formatted_payload[key])
+        if key == self.primary_key.name and payload.get(key) is not None:
+            # The primary key is not part of the post schema
+            formatted_payload[key] = self.validate_row_id(payload[key])
+            return self.shards.shard_for(formatted_payload[key])
+        raise MissingShardKey(key)
+
+    def query_shards(self, query_params: Dict) -> List[str]:
+        """
+        Shards a `get_many` query must read, a single one if it has an equality
+        filter on the shard key.
+        """
+        assert self.shards is not None
+        key = self.shards.key
+        operator = query_params.get(f"{key}__op", "equal")
+        if query_params.get(key) is None or operator != "equal":
+            return self.shards.names
+        value = self.schema_filters(**{key: query_params[key]}).model_dump()[key]
+        return [self.shards.shard_for(value)]
+
+    def record_write(self) -> None:
+        self.routing.record_write()
+
+    # Pydantic schemas are built on first access, so instantiating a handler
+    # is cheap and models that never receive a request never pay for them.
+
+    @cached_property
+    def schema_model(self) -> SchemaModel:
+        return SchemaModel(model=self.model)
+
+    @cached_property
+    def schema_base(self) -> Type[BaseModel]:
+        return self.schema_model.base()
+
+    @cached_property
+    def schema_with_relations(self) -> Type[BaseModel]:
+        return self.computed_schema(self.schema_model.relations())
+
+    @property
+    def schema_relations(self) -> Type[BaseModel]:
+        return self.schema_with_relations
+
+    @cached_property
+    def schema_paginated(self) -> Type[BaseModel]:
+        if self.computed_fields:
+            # The computed fields replace the relations, which load the children
+            return paginate_schema(self.computed_schema(self.schema_base))
+        return self.schema_model.paginated()
+
+    def computed_schema(self, schema: Type[BaseModel]) -> Type[BaseModel]:
+        """
+        `schema` with the computed fields, the schemas of the registry are
+        shared by the handlers of the model so they're extended per handler.
+        """
+        if not self.computed_fields:
+            return schema
+        fields = {
+            name: (Optional[python_type], None)
+            for name, python_type in self.computed_types.items()
+        }
+        return create_model(
+            f"{schema.__name__}Computed", __base__=schema, **fields  # type: ignore
+        )
+
+    @cached_property
+    def computed_types(self) -> Dict[str, type]:
+        return {
+            name: field.python_type(self.model)
+            for name, field in self.computed_fields.items()
+        }
+
+    @cached_property
+    def computed_expressions(self) -> Dict[str, ColumnElement]:
+        return {
+            name: field.expression(self.model)
+            for name, field in self.computed_fields.items()
+        }
+
+    @cached_property
+    def sort_columns(self) -> Dict[str, Any]:
+        """
+        Expressions of the columns and computed fields, by name.
+        """
+        return {
+            **{column.name: column for column in self.model.__table__.columns},
+            **self.computed_expressions,
+        }
+
+    def select_records(self, stmt: Select) -> Select:
+        """
+        `stmt` selecting the computed fields along with the records.
+        """
+        return stmt.add_columns(
+            *[
+                expression.label(name)
+                for name, expression in self.computed_expressions.items()
+            ]
+        )
+
+    def records(self, result: Any) -> List[Any]:
+        """
+        Records of a `select_records` statement result, with their computed
+        fields set as attributes.
+        """
+        if not self.computed_fields:
+            return result.scalars().unique().all()
+        records = []
+        for record, *values in result.unique().all():
+            for name, value in zip(self.computed_fields, values):
+                setattr(record, name, value)
+            records.append(record)
+        return records
+
+    @cached_property
+    def schema_post(self) -> Type[BaseModel]:
+        return self.schema_model.post()
+
+    @cached_property
+    def schema_put(self) -> Type[BaseModel]:
+        return self.schema_model.put()
+
+    @cached_property
+    def schema_filters(self) -> Type[BaseModel]:
+        return self.get_schema_filters()
+
+    @cached_property
+    def schema_filters_in(self) -> Type[BaseModel]:
+        return self.get_schema_filter_values()
+
+    @cached_property
+    def schema_filters_between(self) -> Type[BaseModel]:
+        return self.get_schema_filter_values(between=True)
+
+    @cached_property
+    def filters_by_name(self) -> Dict[str, Filter]:
+        return {filter.name: filter for filter in self.get_filters()}
+
+    @cached_property
+    def column_names(self) -> List[str]:
+        return [column.name for column in self.model.__table__.columns]
+
+    @cached_property
+    def numeric_columns(self) -> Dict[str, Type]:
+        """
+        Python type of the numeric columns, the ones `patch` operators apply to.
+        """
+        columns = {}
+        for column in self.model.__table__.columns:
+            python_type = get_column_python_type(column, only_type=True)
+            if (
+                python_type in NUMERIC_TYPES
+                and column.name not in self.primary_key_names
+            ):
+                columns[column.name] = python_type
+        return columns
+
+    @cached_property
+    def json_columns(self) -> Set[str]:
+        """
+        Names of the JSON columns, their `$` keys are values, not `patch` operators.
+        """
+        return {
+            column.name
+            for column in self.model.__table__.columns
+            if isinstance(column.type, JSON)
+        }
+
+    @cached_property
+    def schema_operands(self) -> Type[BaseModel]:
+        # Not optional, a null operand is invalid, the unset ones are excluded
+        fields = {
+            name: (python_type, None)
+            for name, python_type in self.numeric_columns.items()
+        }
+        return create_model("OperandsSchema", **fields)  # type: ignore
+
+    @cached_property
+    def indexed_columns(self) -> Set[str]:
+        indexed = indexed_columns(self.model.__table__)  # type: ignore
+        for name, search in self.text_search.items():
+            indexed.update(
+                operator_index(name, operator)
+                for operator in search.indexed_operators(self.engine.dialect.name)
+            )
+        if self.engine.dialect.name == "postgresql":
+            indexed.update(gin_indexed(self.model.__table__))  # type: ignore
+        return indexed
+
+    @property
+    def instrumented(self) -> bool:
+        return (
+            self.metrics is not None
+            or self.tracer is not None
+            or self.slow_query_log is not None
+            or self.server_timing
+        )
+
+    def span(self, name: str, attributes: Optional[Dict] = None) -> ContextManager:
+        if self.tracer is None:
+            return nullcontext()
+        return self.tracer.start_as_current_span(name, attributes=attributes)
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """
+        Time (and trace) a phase of the current request (`validation`, `sql`, ...).
+        """
+        start = time.perf_counter()
+        try:
+            with self.span(name):
+                yield
+        finally:
+            request = current_request.get()
+            if request is not None:
+                request.add_timing(name, time.perf_counter() - start)
+
+    def record_request(
+        self, request: RequestContext, response: GenericResponse
+    ) -> None:
+        if self.metrics is None:
+            return
+        labels = {"model": self.model_name, "action": request.action}
+        self.metrics.requests.inc(status=str(response.status_code), **labels)
+        self.metrics.request_duration.observe(request.elapsed, **labels)
+        for phase, duration in request.timings.items():
+            if phase == "pool_checkout":
+                self.metrics.pool_checkout.observe(duration, **labels)
+            else:
+                self.metrics.phase_duration.observe(duration, phase=phase, **labels)
+        if request.rows is not None:
+            self.metrics.rows_returned.observe(request.rows, **labels)
+        if isinstance(response.content, (str, bytes)):
+            self.metrics.response_bytes.observe(len(response.content), **labels)
+        for result, count in request.statement_cache.items():
+            if count:
+                self.metrics.statement_cache.inc(
+                    count, model=self.model_name, result=result
+                )
+
+    def log_slow_query(self, request: RequestContext) -> None:
+        if self.slow_query_log is None:
+            return
+        if not self.slow_query_log.is_slow(request.sql_time):
+            return
+        self.slow_query_log.record(
+            SlowQuery(
+                model=self.model_name,
+                action=request.action,
+                filters=request.filters,
+                page_size=request.page_size,
+                sort=request.sort,
+                statements=[
+                    SlowStatement(sql=statement, duration=duration)
+                    for statement, duration in request.statements
+                ],
+                sql_time=request.sql_time,
+                total_time=request.elapsed,
+                timings=request.timings,
+            )
+        )
+
+    @asynccontextmanager
+    async def admit(self, action: str) -> AsyncIterator[None]:
+        """
+        Wait for a slot of the admission control budget of the action.
+        """
+        if self.admission_control is None:
+            yield
+            return
+        kind = action_kind(action)
+        limiter = self.admission_control.limiter(self.model_name, kind)
+        try:
+            await limiter.acquire()
+        except Overloaded as exc:
+            if self.metrics is not None:
+                self.metrics.shed_requests.inc(
+                    model=self.model_name, kind=kind, reason=exc.reason
+                )
+            raise
+        try:
+            yield
+        finally:
+            limiter.release()
+
+    def collect_admission_queue(self) -> None:
+        if self.metrics is None or self.admission_control is None:
+            return
+        for kind in [READ, WRITE]:
+            limiter = self.admission_control.limiter(self.model_name, kind)
+            self.metrics.admission_queue.set(
+                limiter.queue_depth, model=self.model_name, kind=kind
+            )
+
+    def get_statement_timeout(self) -> Optional[float]:
+        """
+        Statement timeout of the action of the current request.
+        """
+        if not isinstance(self.statement_timeout, dict):
+            return self.statement_timeout
+        request = current_request.get()
+        if request is None:
+            return None
+        return self.statement_timeout.get(request.action)
+
+    def on_begin(
+        self, session: Session, transaction: Any, connection: Connection
+    ) -> None:
+        timeout = self.get_statement_timeout()
+        if timeout is not None:
+            apply_statement_timeout(connection, timeout)
+
+    def guard(self) -> ContextManager:
+        if self.circuit_breaker is None:
+            return nullcontext()
+        return self.circuit_breaker.call()
+
+    async def execute_stmt(
+        self,
+        stmt: Executable,
+        session: Session,
+        phase: str = "sql",
+        params: Optional[List[Dict[str, Any]]] = None,
+    ) -> Any:
+        with self.guard():
+            if self.instrumented and not session.in_transaction():
+                # Checkout the connection apart to time the wait for the pool
+                with self.phase("pool_checkout"):
+                    if self.async_engine:
+                        await session.connection()  # type: ignore
+                    else:
+                        await anyio.to_thread.run_sync(session.connection)
+            with self.phase(phase):
+                if self.async_engine:
+                    result = await session.execute(stmt, params)  # type: ignore
+                else:
+                    result = await anyio.to_thread.run_sync(
+                        session.execute, stmt, params
+                    )
         return result
 
+    def use_returning(self, session: Session, statement: str) -> bool:
+        """
+        Whether to write with a single `INSERT` or `UPDATE ... RETURNING`
+        (`statement`), if enabled and supported by the dialect.
+        """
+        if not self.returning:
+            return False
+        return getattr(session.get_bind().dialect, f"{statement}_returning")
+
+    def commit(self, session: Session) -> None:
+        if session is current_transaction.get():
+            # The batch commits its transaction, the writes are only flushed
+            with self.guard(), self.phase("sql"):
+                session.flush()
+            return
+        with self.guard(), self.phase("commit"):
+            session.commit()
+        self.record_write()
+
+    async def check_cost(self, stmt: Select, session: Session) -> None:
+        """
+        Raise `QueryTooExpensive` if the planner estimates of `stmt` exceed
+        `max_cost` or `max_rows`, dialects without estimates are not checked.
+        """
+        dialect = self.engine.dialect.name
+        rows = (
+            await self.execute_stmt(Explain(stmt, analyze=False), session, "cost")
+        ).all()
+        estimates = estimate(dialect, format_plan(dialect, rows))
+        if estimates is None:
+            return
+        cost, estimated_rows = estimates
+        if self.max_cost is not None and cost > self.max_cost:
+            raise QueryTooExpensive("cost", cost, self.max_cost)
+        if self.max_rows is not None and estimated_rows > self.max_rows:
+            raise QueryTooExpensive("rows", estimated_rows, self.max_rows)
+
+    def sort_keys(self, page: PageSchema) -> List[SortKey]:
+        """
+        Sort keys of a page, with the primary key as the last tiebreaker.
+        """
+        return parse_sort(page.sort, list(self.sort_columns), self.primary_key.name)
+
+    def cursor_values(self, page: PageSchema, keys: List[SortKey]) -> Optional[List]:
+        """
+        Sort key values of the row after which the page starts, None for the
+        first page.
+        """
+        if not page.cursor:
+            return None
+        values = decode_cursor(page.cursor)
+        if len(values) != len(keys):
+            raise InvalidCursor(page.cursor)
+        names = [name for name, _ in keys]
+        present = {
+            name: value for name, value in zip(names, values) if value is not None
+        }
+        try:
+            validated = self.schema_filters(**present).model_dump()
+        except ValidationError:
+            raise InvalidCursor(page.cursor)
+        return [validated[name] if name in present else None for name in names]
+
+    def page_statements(
+        self, page: PageSchema, stmt: Select, merge: bool = False
+    ) -> Tuple[Select, Select]:
+        """
+        Statements of a page of `stmt` and of the count of all its rows.
+
+        The rows are ordered by the sort keys of the page. With a cursor the
+        page starts after the row of the cursor and one row more than the page
+        size is read, to know if there is a next page. With `merge` the
+        statement reads all the rows up to the page, to merge them with the ones
+        of the other shards.
+        """
+        total_stmt = select(func.count()).select_from(stmt.subquery())
+        keys = self.sort_keys(page)
+        columns = self.model.__table__.columns
+        if page.rank is not None:
+            name, words = page.rank
+            stmt = stmt.order_by(
+                search_rank(
+                    self.engine.dialect.name,
+                    self.text_search[name],
+                    columns[name],
+                    self.primary_key,
+                    words,
+                )
+            )
+        stmt = self.select_records(stmt).order_by(*order_by(keys, self.sort_columns))
+        if page.cursor is not None:
+            values = self.cursor_values(page, keys)
+            if values is not None:
+                stmt = stmt.where(after(keys, self.sort_columns, values))
+            stmt = stmt.limit(page.size + 1)
+        elif merge:
+            stmt = stmt.limit(page.number * page.size)
+        else:
+            stmt = stmt.limit(page.size).offset((page.number - 1) * page.size)
+        return stmt, total_stmt
+
+    def page_response(
+        self, page: PageSchema, records: Sequence[Any], total: int
+    ) -> BaseModel:
+        next_cursor = None
+        if page.cursor is not None and len(records) > page.size:
+            records = records[: page.size]
+            next_cursor = encode_cursor(
+                [getattr(records[-1], name) for name, _ in self.sort_keys(page)]
+            )
+        self.set_rows(len(records))
+        with self.phase("serialization"):
+            return self.schema_paginated(
+                total=total,
+                records=records,
+                page=page.number,
+                next_cursor=next_cursor,
+            )
+
     async def paginate(
         self, page: PageSchema, stmt: Select, session: Session
     ) -> BaseModel:
-        total_stmt = select(func.count()).select_from(stmt.subquery())
-        stmt = stmt.limit(page.size).offset((page.number - 1) * page.size)
-        records = (await self.execute_stmt(stmt, session)).scalars().unique().all()
-        total = (await self.execute_stmt(total_stmt, session)).scalar()
-        return self.schema_paginated(
-            total=total,
-            records=records,
-            page=page.number,
+        stmt, total_stmt = self.page_statements(page, stmt)
+        records = self.records(await self.execute_stmt(stmt, session, phase="sql_page"))
+        total = (
+            await self.execute_stmt(total_stmt, session, phase="sql_count")
+        ).scalar()
+        return self.page_response(page, records, total)
+
+    async def paginate_shards(
+        self, page: PageSchema, stmt: Select, shards: List[str]
+    ) -> BaseModel:
+        """
+        Read the page from the shards concurrently and merge their rows by
+        sort keys, the total is the sum of the shard totals.
+        """
+        stmt, total_stmt = self.page_statements(page, stmt, merge=True)
+        results: Dict[str, Tuple[Sequence[Any], int]] = {}
+        errors: List[Exception] = []
+
+        async def read_shard(name: str, scope: anyio.CancelScope) -> None:
+            try:
+                with self.routing.shard_session(name) as session:
+                    records = self.records(
+                        await self.execute_stmt(stmt, session, phase="sql_page")
+                    )
+                    total = (
+                        await self.execute_stmt(total_stmt, session, phase="sql_count")
+                    ).scalar()
+                results[name] = (records, total)
+            except Exception as exc:
+                # Raised after the task group, so the handlers see the error
+                # itself instead of an exception group
+                errors.append(exc)
+                scope.cancel()
+
+        async with anyio.create_task_group() as task_group:
+            for name in shards:
+                task_group.start_soon(read_shard, name, task_group.cancel_scope)
+        if errors:
+            raise errors[0]
+        records = list(
+            heapq.merge(
+                *(records for records, _ in results.values()),
+                key=sort_key(self.sort_keys(page)),
+            )
         )
+        if page.cursor is None:
+            records = records[(page.number - 1) * page.size : page.number * page.size]
+        total = sum(total for _, total in results.values())
+        return self.page_response(page, records, total)
+
+    @staticmethod
+    def describe_query(
+        shape: List[Tuple[str, str]], page: PageSchema, query_params: Dict
+    ) -> None:
+        """
+        Store the shape of a `get_many` query in the current request.
+        """
+        request = current_request.get()
+        if request is not None:
+            request.filters = shape
+            request.page_size = page.size
+            request.sort = query_params.get("sort")
+
+    async def explain(
+        self, page: PageSchema, stmt: Select, session: Session
+    ) -> Dict[str, Any]:
+        """
+        Plans of the page and count statements of a `get_many` query.
+        """
+        dialect = self.engine.dialect
+        content: Dict[str, Any] = {"dialect": dialect.name}
+        page_stmt, total_stmt = self.page_statements(page, stmt)
+        for name, statement in [("page", page_stmt), ("count", total_stmt)]:
+            rows = (
+                await self.execute_stmt(Explain(statement), session, f"explain_{name}")
+            ).all()
+            plan = format_plan(dialect.name, rows)
+            content[name] = {
+                "sql": str(statement.compile(dialect=dialect)),
+                "plan": plan,
+                "full_scans": full_scans(dialect.name, plan),
+            }
+        request = current_request.get()
+        if request is not None:
+            content["timings"] = dict(request.timings)
+        return content
+
+    @staticmethod
+    def set_rows(rows: int) -> None:
+        request = current_request.get()
+        if request is not None:
+            request.rows = rows
 
     @crud_route(validate_row_id=True)
     async def get(self, row_id: Any) -> GenericResponse:
-        with self.sessionmaker() as session:
-            stmt = select(self.model).where(self.primary_key == row_id)
-            res = await self.execute_stmt(stmt, session)
-            obj = res.scalar_one_or_none()
-            if not obj:
-                raise NotFoundException
-            response_content = self.schema_with_relations.model_validate(
-                obj
-            ).model_dump_json()
+        for row_session in self.row_sessions(row_id, read=True):
+            with row_session as session:
+                stmt = self.select_records(select(self.model)).where(
+                    self.primary_key == row_id
+                )
+                res = await self.execute_stmt(stmt, session)
+                records = self.records(res)
+                if not records:
+                    continue
+                obj = records[0]
+                self.set_rows(1)
+                with self.phase("serialization"):
+                    response_content = self.schema_with_relations.model_validate(
+                        obj
+                    ).model_dump_json()
 
-            return GenericResponse(
-                content=response_content,
-                status_code=200,
-                media_type="application/json",
-            )
+                return GenericResponse(
+                    content=response_content,
+                    status_code=200,
+                    media_type="application/json",
+                )
+        raise NotFoundException
 
     @crud_route()
     async def get_many(self, query_params: Dict) -> GenericResponse:
-        with self.sessionmaker() as session:
-            stmt = select(self.model)
+        return await self.read_many(query_params)
+
+    @crud_route()
+    async def search(self, payload: Any) -> GenericResponse:
+        """
+        `get_many` with the filter expression, sort and pagination in a JSON
+        body, for the expressions too long for a query string.
+        """
+        with self.phase("validation"):
+            search = SearchSchema.model_validate(payload)
+            if search.page_size is not None and search.page_size > self.page_size_max:
+                return error_response(
+                    detail=[
+                        {
+                            "loc": ["body", "page_size"],
+                            "msg": f"Max page size is {self.page_size_max}",
+                            "input": search.page_size,
+                        }
+                    ],
+                    status_code=422,
+                )
+            query_params = search.model_dump(exclude_none=True)
+        try:
+            return await self.read_many(query_params)
+        except InvalidFilterExpression as exc:
+            exc.location = exc.loc[0] = "body"
+            raise
+
+    @crud_route()
+    async def aggregate(self, query_params: Dict) -> GenericResponse:
+        """
+        Aggregates of the rows matching the `get_many` filters, per group of the
+        `group_by` columns, in a single `GROUP BY` query. At most
+        `page_size_max` groups are returned, the rest are `truncated`.
+        """
+        dialect = self.engine.dialect.name
+        columns = self.model.__table__.columns
+        with self.phase("validation"):
+            groups = parse_group_by(query_params.get("group_by"), self.column_types)
+            aggregates = parse_aggregates(
+                query_params.get("aggregate"), self.column_types
+            )
+            queried = (
+                partial_aggregates(aggregates) if self.routing.sharded else aggregates
+            )
+            group_columns = [
+                group_expression(dialect, group, columns[group.column])
+                for group in groups
+            ]
+            stmt = select(
+                *group_columns,
+                *[
+                    aggregate_expression(
+                        aggregate,
+                        columns[aggregate.column] if aggregate.column else None,
+                    )
+                    for aggregate in queried
+                ],
+            ).select_from(self.model)
             try:
                 stmt = self.apply_filters(stmt, query_params)
             except InvalidOperator as e:
                 return error_response(detail=e.errors(), status_code=422)
-            page = PageSchema(
-                size=int(query_params.get("page_size", self.page_size_default)),
-                number=int(query_params.get("page", 1)),
+            self.check_query(self.get_page({}), query_params)
+            stmt = stmt.group_by(*group_columns)
+        if not self.routing.sharded:
+            stmt = stmt.order_by(
+                *[column.asc().nulls_last() for column in group_columns]
+            ).limit(self.page_size_max + 1)
+            with self.read_session() as session:
+                result = await self.execute_stmt(stmt, session)
+                rows = [row_values(row) for row in result.all()]
+        else:
+            rows = merge_rows(
+                groups,
+                aggregates,
+                await self.shard_rows(stmt, self.query_shards(query_params)),
             )
+        self.set_rows(len(rows))
+        with self.phase("serialization"):
+            content = AggregateSchema(
+                columns=[
+                    *[group.label for group in groups],
+                    *[aggregate.label for aggregate in aggregates],
+                ],
+                rows=rows[: self.page_size_max],
+                truncated=len(rows) > self.page_size_max,
+            ).model_dump_json()
+        return GenericResponse(
+            content=content,
+            status_code=200,
+            media_type="application/json",
+        )
+
+    @crud_route(validate_row_id=True)
+    async def descendants(self, row_id: Any, query_params: Dict) -> GenericResponse:
+        """
+        The row and its descendants up to `depth` levels, see `tree`.
+        """
+        return await self.tree(row_id, query_params)
+
+    @crud_route(validate_row_id=True)
+    async def ancestors(self, row_id: Any, query_params: Dict) -> GenericResponse:
+        """
+        The row and its ancestors up to `depth` levels, see `tree`.
+        """
+        return await self.tree(row_id, query_params, ancestors=True)
+
+    async def tree(
+        self, row_id: Any, query_params: Dict, ancestors: bool = False
+    ) -> GenericResponse:
+        """
+        Records of a subtree read with a single recursive CTE, flat with their
+        `depth` ordered by depth, or nested in the `children` of their parent
+        with `nested`. At most `page_size_max` records are returned, the deeper
+        ones are `truncated`. With shards, the tree of the shard of the row.
+        """
+        parent = self.parent_column
+        if parent is None:
+            raise NotFoundException
+        with self.phase("validation"):
+            depth = query_params.get("depth", self.max_tree_depth)
+            try:
+                depth = int(depth)
+            except (TypeError, ValueError):
+                depth = -1
+            if not 0 <= depth <= self.max_tree_depth:
+                return error_response(
+                    detail=[
+                        {
+                            "loc": ["query", "depth"],
+                            "msg": f"Depth is from 0 to {self.max_tree_depth}",
+                            "input": query_params.get("depth"),
+                        }
+                    ],
+                    status_code=422,
+                )
+            nested = query_params.get("nested") not in [None, "", "false", "0", False]
+            columns = self.model.__table__.columns
+            stmt = tree_statement(
+                self.model,
+                self.primary_key,
+                columns[parent],
+                row_id,
+                depth,
+                ancestors=ancestors,
+            ).limit(self.page_size_max + 1)
+        for row_session in self.row_sessions(row_id, read=True):
+            with row_session as session:
+                rows = (await self.execute_stmt(stmt, session)).all()
+            if rows:
+                break
+        else:
+            raise NotFoundException
+        with self.phase("serialization"):
+            nodes: Dict[Any, Dict[str, Any]] = {}
+            for record, record_depth in rows[: self.page_size_max]:
+                key = getattr(record, self.primary_key.name)
+                # A cycle in the data repeats rows, the first is the closest one
+                if key in nodes:
+                    continue
+                node = self.schema_base.model_validate(record).model_dump(mode="json")
+                node["depth"] = record_depth
+                nodes[key] = node
+            records = [*nodes.values()]
+            self.set_rows(len(records))
+            if nested:
+                records = nest(records, self.primary_key.name, parent, ancestors)
+            content = TreeSchema(
+                records=records, truncated=len(rows) > self.page_size_max
+            ).model_dump_json()
+        return GenericResponse(
+            content=content,
+            status_code=200,
+            media_type="application/json",
+        )
+
+    async def shard_rows(self, stmt: Any, shards: List[str]) -> List[Dict[str, Any]]:
+        """
+        Rows of `stmt` on each shard, queried concurrently.
+        """
+        rows: List[Dict[str, Any]] = []
+        errors: List[Exception] = []
+
+        async def read_shard(name: str, scope: anyio.CancelScope) -> None:
+            try:
+                with self.routing.shard_session(name) as session:
+                    result = await self.execute_stmt(stmt, session)
+                    rows.extend(dict(row) for row in result.mappings().all())
+            except Exception as exc:
+                errors.append(exc)
+                scope.cancel()
+
+        async with anyio.create_task_group() as task_group:
+            for name in shards:
+                task_group.start_soon(read_shard, name, task_group.cancel_scope)
+        if errors:
+            raise errors[0]
+        return rows
+
+    @cached_property
+    def allowed_facets(self) -> List[str]:
+        if self.facet_columns is not None:
+            return self.facet_columns
+        return default_facet_columns(self.column_types)
+
+    def facet_statement(self, facets: List[str], stmt: Select) -> Any:
+        """
+        Statement counting the values of the `facets` columns among the rows of
+        the filtered `stmt`.
+        """
+        columns = self.model.__table__.columns
+        return facet_statement(
+            self.engine.dialect.name,
+            self.model.__table__,
+            [columns[facet] for facet in facets],
+            stmt.whereclause,
+        )
+
+    @cached_property
+    def column_types(self) -> Dict[str, type]:
+        """
+        Python type of the columns, the ones of their filters.
+        """
+        return {
+            filter.name: filter.type
+            for filter in self.get_filters()
+            if filter.name not in self.computed_fields
+        }
+
+    async def read_many(self, query_params: Dict) -> GenericResponse:
+        if self.routing.sharded:
+            return await self.get_many_shards(query_params)
+        with self.read_session() as session:
+            stmt = select(self.model)
+            with self.phase("validation"):
+                try:
+                    stmt = self.apply_filters(stmt, query_params)
+                except InvalidOperator as e:
+                    return error_response(detail=e.errors(), status_code=422)
+                page = self.get_page(query_params)
+                self.check_query(page, query_params)
+                rank_error = self.rank_error(page)
+                if rank_error is not None:
+                    return rank_error
+                facets = parse_facets(query_params.get("facets"), self.allowed_facets)
+            if self.max_cost is not None or self.max_rows is not None:
+                await self.check_cost(stmt, session)
+            if self.debug and query_params.get("explain") not in [None, "", "false"]:
+                return GenericResponse(
+                    content=json.dumps(await self.explain(page, stmt, session)),
+                    status_code=200,
+                    media_type="application/json",
+                )
             response_content = await self.paginate(
                 page=page,
                 stmt=stmt,
                 session=session,
             )
+            if facets:
+                result = await self.execute_stmt(
+                    self.facet_statement(facets, stmt), session, phase="sql_facets"
+                )
+                response_content.facets = facet_counts(  # type: ignore
+                    facets, result.mappings().all()
+                )
+            with self.phase("serialization"):
+                content = response_content.model_dump_json()
             return GenericResponse(
-                content=response_content.model_dump_json(),
+                content=content,
                 status_code=200,
                 media_type="application/json",
             )
 
+    def get_page(self, query_params: Dict) -> PageSchema:
+        return PageSchema(
+            size=int(query_params.get("page_size", self.page_size_default)),
+            number=int(query_params.get("page", 1)),
+            cursor=query_params.get("cursor"),
+            sort=query_params.get("sort"),
+            rank=self.search_rank(query_params),
+        )
+
+    def check_query(self, page: PageSchema, query_params: Dict) -> None:
+        """
+        Check the filters and the sort of a `get_many` query against the index
+        policy and store its shape in the current request.
+        """
+        shape = filter_shape(self.get_filters(), query_params)
+        groups: List[List[Tuple[str, str]]] = []
+        expression = self.filter_expression(query_params)
+        if expression is not None:
+            pairs, groups = expression_shape(expression)
+            shape.extend(pairs)
+        keys = self.sort_keys(page)
+        if self.index_policy is not None:
+            self.index_policy.check(
+                self.model.__table__.name,  # type: ignore
+                shape,
+                self.indexed_columns,
+                groups,
+            )
+            self.index_policy.check_sort(
+                [name for name, _ in keys if name != self.primary_key.name],
+                self.indexed_columns,
+            )
+        self.describe_query(
+            [*shape, *(pair for group in groups for pair in group)],
+            page,
+            query_params,
+        )
+
+    async def get_many_shards(self, query_params: Dict) -> GenericResponse:
+        stmt = select(self.model)
+        with self.phase("validation"):
+            try:
+                stmt = self.apply_filters(stmt, query_params)
+            except InvalidOperator as e:
+                return error_response(detail=e.errors(), status_code=422)
+            page = self.get_page(query_params)
+            self.check_query(page, query_params)
+            rank_error = self.rank_error(page)
+            if rank_error is not None:
+                return rank_error
+            facets = parse_facets(query_params.get("facets"), self.allowed_facets)
+            shards = self.query_shards(query_params)
+        explain = self.debug and query_params.get("explain") not in [None, "", "false"]
+        if explain or self.max_cost is not None or self.max_rows is not None:
+            # Checked on the first shard, the shards share the schema
+            with self.routing.shard_session(shards[0]) as session:
+                if self.max_cost is not None or self.max_rows is not None:
+                    await self.check_cost(stmt, session)
+                if explain:
+                    return GenericResponse(
+                        content=json.dumps(await self.explain(page, stmt, session)),
+                        status_code=200,
+                        media_type="application/json",
+                    )
+        response_content = await self.paginate_shards(page, stmt, shards)
+        if facets:
+            rows = await self.shard_rows(self.facet_statement(facets, stmt), shards)
+            response_content.facets = facet_counts(facets, rows)  # type: ignore
+        with self.phase("serialization"):
+            content = response_content.model_dump_json()
+        return GenericResponse(
+            content=content,
+            status_code=200,
+            media_type="application/json",
+        )
+
     @crud_route(validate_row_id=True)
     async def delete(self, row_id: Any) -> GenericResponse:
-        with self.sessionmaker() as session:
-            stmt = delete(self.model).where(self.primary_key == row_id)
-            res = await self.execute_stmt(stmt, session)
-            session.commit()
-            if res.rowcount == 0:
-                raise NotFoundException
-            return GenericResponse(
-                content=RowIDResponse(row_id=row_id).model_dump_json(),
-                status_code=200,
-                media_type="application/json",
-            )
+        for row_session in self.row_sessions(row_id):
+            with row_session as session:
+                stmt = delete(self.model).where(self.primary_key == row_id)
+                res = await self.execute_stmt(stmt, session)
+                self.commit(session)
+                if res.rowcount == 0:
+                    continue
+                return GenericResponse(
+                    content=RowIDResponse(row_id=row_id).model_dump_json(),
+                    status_code=200,
+                    media_type="application/json",
+                )
+        raise NotFoundException
 
     @crud_route()
     async def post(self, payload: Dict) -> GenericResponse:
-        with self.sessionmaker() as session:
-            pydantic_model = self.schema_base
-            formatted_payload = self.schema_post(**payload).model_dump()
-            new_object = self.model(**formatted_payload)
-            session.add(new_object)
-            session.commit()
-            session.refresh(new_object)
-            response_content = pydantic_model.model_validate(
+        shard = None
+        with self.phase("validation"):
+            # The omitted fields are left out, so their column defaults apply
+            formatted_payload = self.schema_post(**payload).model_dump(
+                exclude_unset=True
+            )
+            if self.routing.sharded:
+                shard = self.payload_shard(payload, formatted_payload)
+        if self.write_coalescer is not None and self.batch_session() is None:
+            sessionmaker = self.routing.write_sessionmaker(shard)
+            with self.phase("group_commit"):
+                new_object = await self.write_coalescer.submit(
+                    (self.model_name, sessionmaker),
+                    formatted_payload,
+                    partial(self.insert_batch, sessionmaker),
+                )
+            # The batch commits outside of the request, apart from its client
+            self.record_write()
+        else:
+            with self.write_session(shard) as session:
+                if self.use_returning(session, "insert"):
+                    insert_stmt = (
+                        insert(self.model)
+                        .values(**formatted_payload)
+                        .returning(self.model)
+                    )
+                    new_object = (
+                        await self.execute_stmt(insert_stmt, session)
+                    ).scalar_one()
+                    self.commit(session)
+                else:
+                    new_object = self.model(**formatted_payload)
+                    session.add(new_object)
+                    self.commit(session)
+                    with self.guard(), self.phase("sql"):
+                        session.refresh(new_object)
+        self.set_rows(1)
+        with self.phase("serialization"):
+            response_content = self.schema_base.model_validate(
                 new_object
             ).model_dump_json()
-            return GenericResponse(
-                content=response_content,
-                status_code=201,
-                media_type="application/json",
-            )
+        return GenericResponse(
+            content=response_content,
+            status_code=201,
+            media_type="application/json",
+        )
+
+    async def insert_batch(
+        self, sessionmaker: sqlsessionmaker[Session], writes: List[PendingWrite]
+    ) -> None:
+        """
+        Insert the rows of a group commit batch in a single transaction, with a
+        multi-row `INSERT ... RETURNING` where the dialect supports it. If the
+        batch violates a constraint each row is inserted in its own savepoint,
+        so only the failing rows get the error.
+
+        The batch is a request of its own, `write_batch`, traced in its own span
+        and timed in the `write_batch_duration` metric.
+        """
+        request = RequestContext(self.model_name, "write_batch", tracer=self.tracer)
+        token = current_request.set(request)
+        attributes = {
+            "sqlalchemy_api.model": self.model_name,
+            "sqlalchemy_api.action": "write_batch",
+            "sqlalchemy_api.batch_size": len(writes),
+        }
+        try:
+            with self.span(f"{self.model_name}.write_batch", attributes):
+                await self.insert_rows(sessionmaker, writes)
+        finally:
+            current_request.reset(token)
+            if self.metrics is not None:
+                labels = {"model": self.model_name}
+                self.metrics.write_batch_size.observe(len(writes), **labels)
+                self.metrics.write_batch_duration.observe(request.elapsed, **labels)
+            self.log_slow_query(request)
+
+    async def insert_rows(
+        self, sessionmaker: sqlsessionmaker[Session], writes: List[PendingWrite]
+    ) -> None:
+        with sessionmaker() as session:
+            dialect = session.get_bind().dialect
+            if dialect.insert_executemany_returning_sort_by_parameter_order:
+                stmt = insert(self.model).returning(
+                    self.model, sort_by_parameter_order=True
+                )
+                try:
+                    result = await self.execute_stmt(
+                        stmt, session, params=[write.values for write in writes]
+                    )
+                    objects = result.scalars().all()
+                    self.commit(session)
+                except IntegrityError:
+                    session.rollback()
+                else:
+                    for write, new_object in zip(writes, objects):
+                        write.result = new_object
+                    return
+            for write in writes:
+                new_object = self.model(**write.values)
+                try:
+                    with self.guard(), self.phase("sql"), session.begin_nested():
+                        session.add(new_object)
+                        session.flush()
+                except IntegrityError as exc:
+                    write.error = exc
+                else:
+                    write.result = new_object
+            self.commit(session)
+            with self.guard(), self.phase("sql"):
+                for write in writes:
+                    if write.result is not None:
+                        session.refresh(write.result)
 
     @crud_route(validate_row_id=True)
     async def put(self, row_id: Any, payload: Dict) -> GenericResponse:
-        with self.sessionmaker() as session:
+        with self.phase("validation"):
             formatted_payload = self.schema_put(**payload).model_dump(
                 exclude_unset=True
             )
-            update_stmt = (
-                update(self.model)
-                .where(self.primary_key == row_id)
-                .values(**formatted_payload)
+        return await self.update_row(row_id, formatted_payload)
+
+    @crud_route(validate_row_id=True)
+    async def patch(self, row_id: Any, payload: Dict) -> GenericResponse:
+        """
+        Update a row with values and with operators applied in the database,
+        e.g. `{"views": {"$inc": 1}, "stock": {"$dec": 3}}`, in a single
+        `UPDATE` statement.
+        """
+        with self.phase("validation"):
+            values = self.patch_values(payload)
+        return await self.update_row(row_id, values)
+
+    def patch_values(self, payload: Dict) -> Dict[str, Any]:
+        """
+        Validated values of a `patch` payload, the operators become SQL
+        expressions on their column, a NULL column counts as 0.
+        """
+        operations = {}
+        plain_values = {}
+        for name, value in payload.items():
+            if (
+                not isinstance(value, dict)
+                or name in self.json_columns
+                or not all(key.startswith("$") for key in value)
+            ):
+                plain_values[name] = value
+                continue
+            valid_operators = (
+                list(UPDATE_OPERATORS) if name in self.numeric_columns else []
             )
-            res = await self.execute_stmt(update_stmt, session)
-            session.commit()
-            if res.rowcount == 0:
-                raise NotFoundException
+            if len(value) != 1:
+                raise InvalidUpdateOperator(", ".join(value), name, valid_operators)
+            [(update_operator, operand)] = value.items()
+            if update_operator not in valid_operators:
+                raise InvalidUpdateOperator(update_operator, name, valid_operators)
+            operations[name] = (update_operator, operand)
+        values = self.schema_put(**plain_values).model_dump(exclude_unset=True)
+        operands = self.schema_operands(
+            **{name: operand for name, (_, operand) in operations.items()}
+        ).model_dump(exclude_unset=True)
+        for name, (update_operator, _) in operations.items():
+            column = self.model.__table__.columns[name]  # type: ignore
+            values[name] = UPDATE_OPERATORS[update_operator](
+                func.coalesce(column, 0), operands[name]
+            )
+        return values
 
-            updated_object = (
-                await self.execute_stmt(
-                    select(self.model).where(self.primary_key == row_id), session
+    async def update_row(self, row_id: Any, values: Dict[str, Any]) -> GenericResponse:
+        if self.shards is not None and self.shards.key in values:
+            # Moving the row to another shard is not supported
+            return error_response(
+                message=f"The shard key '{self.shards.key}' can't be updated",
+                status_code=422,
+            )
+        for row_session in self.row_sessions(row_id):
+            with row_session as session:
+                update_stmt = (
+                    update(self.model)
+                    .where(self.primary_key == row_id)
+                    .values(**values)
                 )
-            ).scalar_one()
+                if self.use_returning(session, "update"):
+                    updated_object = (
+                        await self.execute_stmt(
+                            update_stmt.returning(self.model), session
+                        )
+                    ).scalar_one_or_none()
+                    self.commit(session)
+                    if updated_object is None:
+                        continue
+                else:
+                    res = await self.execute_stmt(update_stmt, session)
+                    self.commit(session)
+                    if res.rowcount == 0:
+                        continue
 
-            response_content = self.schema_base.model_validate(
-                updated_object
-            ).model_dump_json()
+                    updated_object = (
+                        await self.execute_stmt(
+                            select(self.model).where(self.primary_key == row_id),
+                            session,
+                        )
+                    ).scalar_one()
+                self.set_rows(1)
 
-            return GenericResponse(
-                content=response_content,
-                status_code=200,
-                media_type="application/json",
-            )
+                with self.phase("serialization"):
+                    response_content = self.schema_base.model_validate(
+                        updated_object
+                    ).model_dump_json()
+
+                return GenericResponse(
+                    content=response_content,
+                    status_code=200,
+                    media_type="application/json",
+                )
+        raise NotFoundException
 
     def get_schema_filters(self) -> Type[BaseModel]:
         filters = self.get_filters()
@@ -233,6 +1609,18 @@ class CRUDHandler:
         )
         return FiltersSchema
 
+    def get_schema_filter_values(self, between: bool = False) -> Type[BaseModel]:
+        """
+        Schema of the values of the list operators: a list of values for `in`
+        and `not_in`, the two bounds for `between`.
+        """
+        fields: Dict[str, Any] = {}
+        for filter in self.get_filters():
+            type_ = filter.type
+            values = Tuple[type_, type_] if between else List[type_]  # type: ignore
+            fields[filter.name] = (Optional[values], None)  # type: ignore
+        return create_model("FilterValuesSchema", **fields)  # type: ignore
+
     def get_filters(self) -> List[Filter]:
         filters: List[Filter] = []
         for column in self.model.__table__.columns:
@@ -242,6 +1630,9 @@ class CRUDHandler:
             nullable = column.nullable
             description = column.comment
             column = column
+            indexed = name in self.indexed_columns
+            text_search = name in self.text_search
+            json_filters = self.engine.dialect.name in JSON_FILTER_DIALECTS
             filters.append(
                 Filter(
                     name=name,
@@ -250,6 +1641,18 @@ class CRUDHandler:
                     nullable=nullable,
                     description=description,
                     column=column,
+                    indexed=indexed,
+                    text_search=text_search,
+                    json_filters=json_filters,
+                )
+            )
+        for name, field in self.computed_fields.items():
+            filters.append(
+                Filter(
+                    name=name,
+                    type_=self.computed_types[name],
+                    nullable=field.nullable,
+                    column=self.computed_expressions[name],  # type: ignore
                 )
             )
         return filters
@@ -266,15 +1669,42 @@ class CRUDHandler:
     def apply_filters(self, stmt: Select, query_params: Dict) -> Select:
         filters = self.get_filters()
         filters_dict = {}
+        lists_dict = {}
+        ranges_dict = {}
+        # JSON operator values are validated by the operators themselves
+        json_dict = {}
         FiltersSchema = self.schema_filters
         for filter in filters:
             if filter.name in query_params:
-                filters_dict[filter.name] = query_params[filter.name]
+                value = query_params[filter.name]
+                list_operator = query_params.get(filter.operator_name, "equal")
+                if list_operator in JSON_OPERATORS:
+                    json_dict[filter.name] = (
+                        value[-1]
+                        if isinstance(value, list)
+                        and list_operator not in ARRAY_OPERATORS
+                        else value
+                    )
+                elif list_operator == BETWEEN:
+                    ranges_dict[filter.name] = filter_values(value)
+                elif list_operator in LIST_OPERATORS:
+                    lists_dict[filter.name] = filter_values(value)
+                else:
+                    # A repeated param of a single value operator keeps the last
+                    filters_dict[filter.name] = (
+                        value[-1] if isinstance(value, list) else value
+                    )
 
         # format and validate filters dict, with the help of pydantic schemas
         formatted_filters = FiltersSchema(**filters_dict).model_dump(
             exclude_unset=True, exclude_none=True
         )
+        formatted_filters.update(
+            self.schema_filters_in(**lists_dict).model_dump(exclude_none=True)
+        )
+        formatted_filters.update(
+            self.schema_filters_between(**ranges_dict).model_dump(exclude_none=True)
+        )
 
         for filter in filters:
             query_operator: str = query_params.get(filter.operator_name, "equal")
@@ -290,8 +1720,151 @@ class CRUDHandler:
                     query_operator, filter.type, filter.name, filter.operators
                 )
 
+            if filter.name in json_dict and query_operator in JSON_OPERATORS:
+                stmt = stmt.filter(
+                    self.json_condition(filter, query_operator, json_dict[filter.name])
+                )
+                continue
+
+            if filter.name in formatted_filters and (
+                query_operator in TEXT_SEARCH_OPERATORS
+            ):
+                stmt = stmt.filter(
+                    self.text_condition(
+                        filter, query_operator, formatted_filters[filter.name]
+                    )
+                )
+                continue
+
             operator = OPERATOR_ATTR_MAP[query_operator]
             if filter.name in formatted_filters:
                 operator_applier = getattr(filter.column, operator)
-                stmt = stmt.filter(operator_applier(formatted_filters[filter.name]))
+                value = formatted_filters[filter.name]
+                if query_operator == BETWEEN:
+                    stmt = stmt.filter(operator_applier(*value))
+                else:
+                    # A list renders an expanding bind parameter, the statement
+                    # is the same whatever the number of values
+                    stmt = stmt.filter(operator_applier(value))
+
+        expression = self.filter_expression(query_params)
+        if expression is not None:
+            stmt = stmt.filter(self.compile_filter(expression))
         return stmt
+
+    def text_condition(self, filter: Filter, operator: str, value: str) -> Any:
+        if operator == ICONTAINS:
+            return icontains(filter.column, value)
+        return search_condition(
+            self.engine.dialect.name,
+            self.text_search[filter.name],
+            filter.column,
+            self.primary_key,
+            value,
+        )
+
+    def json_condition(self, filter: Filter, operator: str, value: Any) -> Any:
+        return json_condition(self.engine.dialect.name, filter.column, operator, value)
+
+    def search_rank(self, query_params: Dict) -> Optional[Tuple[str, str]]:
+        """
+        Column and words of the `search` filter, or `search` condition of the
+        top level `and` of the filter expression, whose relevance orders the
+        page, if the `rank` query param is set.
+        """
+        if query_params.get("rank") in [None, "", "false", "0", False]:
+            return None
+        for name in self.text_search:
+            if (
+                query_params.get(f"{name}__op") == SEARCH
+                and query_params.get(name) is not None
+            ):
+                value = query_params[name]
+                return name, value[-1] if isinstance(value, list) else value
+        expression = self.filter_expression(query_params)
+        for node in conjuncts(expression) if expression is not None else []:
+            if (
+                isinstance(node, Condition)
+                and node.operator == SEARCH
+                and node.column in self.text_search
+                and isinstance(node.value, str)
+            ):
+                return node.column, node.value
+        return None
+
+    def rank_error(self, page: PageSchema) -> Optional[GenericResponse]:
+        """
+        The relevance isn't a column, so ranked pages can't continue after a
+        cursor or be merged across shards.
+        """
+        if page.rank is None or (page.cursor is None and not self.routing.sharded):
+            return None
+        return error_response(
+            detail=[
+                {
+                    "loc": ["query", "rank"],
+                    "msg": "Relevance order needs offset pagination on a single"
+                    " database",
+                    "input": True,
+                }
+            ],
+            status_code=422,
+        )
+
+    def filter_expression(self, query_params: Dict) -> Optional[Node]:
+        """
+        Parsed `filter` expression of a `get_many` query, if any.
+        """
+        expression = query_params.get("filter")
+        if expression is None or expression == "":
+            return None
+        return parse_filter(
+            expression, self.max_filter_depth, self.max_filter_conditions
+        )
+
+    def compile_filter(self, node: Node) -> ColumnElement:
+        """
+        `WHERE` clause of a filter expression, its conditions are validated
+        like the column filters.
+        """
+        if isinstance(node, Group):
+            clauses = [self.compile_filter(operand) for operand in node.operands]
+            return and_(*clauses) if node.kind == AND else or_(*clauses)
+        if isinstance(node, Not):
+            return not_(self.compile_filter(node.operand))
+        filter = self.filters_by_name.get(node.column)
+        if filter is None:
+            raise InvalidFilterExpression(
+                f"Unknown column '{node.column}'", node.column
+            )
+        if node.operator not in filter.operators:
+            raise InvalidOperator(
+                node.operator, filter.type, filter.name, filter.operators
+            )
+        if node.operator in NULL_OPERATORS:
+            if node.operator == IS_NULL:
+                return filter.column.is_(None)
+            return filter.column.is_not(None)
+        if node.value is None:
+            raise InvalidFilterExpression(
+                f"Operator '{node.operator}' on '{node.column}' needs a value",
+                node.column,
+            )
+        if node.operator in JSON_OPERATORS:
+            return self.json_condition(filter, node.operator, node.value)
+        if node.operator in TEXT_SEARCH_OPERATORS:
+            value = self.schema_filters(**{filter.name: node.value}).model_dump()
+            return self.text_condition(filter, node.operator, value[filter.name])
+        operator_applier = getattr(filter.column, OPERATOR_ATTR_MAP[node.operator])
+        if node.operator == BETWEEN:
+            values = self.schema_filters_between(
+                **{filter.name: filter_values(node.value)}
+            ).model_dump()[filter.name]
+            return operator_applier(*values)
+        if node.operator in LIST_OPERATORS:
+            values = self.schema_filters_in(
+                **{filter.name: filter_values(node.value)}
+            ).model_dump()[filter.name]
+            return operator_applier(values)
+        value = self.schema_filters(**{filter.name: node.value}).model_dump()
+        return operator_applier(value[filter.name])
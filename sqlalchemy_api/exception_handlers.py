@@ -1,7 +1,13 @@
 from typing import Callable, Dict, Any
-from sqlalchemy.exc import IntegrityError
+from sqlalchemy.exc import IntegrityError, TimeoutError as PoolTimeoutError
 from sqlalchemy_api.responses import GenericResponse, error_response
-from sqlalchemy_api.exceptions import NotFoundException
+from sqlalchemy_api.exceptions import (
+    CircuitOpen,
+    NotFoundException,
+    Overloaded,
+    QueryValidationException,
+    StatementTimeout,
+)
 from pydantic_core import ValidationError
 import json
 import traceback
@@ -44,6 +50,32 @@ def validation_error_handler(exc: ValidationError, *args) -> GenericResponse:
     )
 
 
+def query_validation_handler(exc: QueryValidationException, *args) -> GenericResponse:
+    return error_response(detail=exc.errors(), status_code=422)
+
+
+def handle_statement_timeout(exc: StatementTimeout, *args) -> GenericResponse:
+    return error_response(message=str(exc), status_code=504)
+
+
+def handle_pool_timeout(*args) -> GenericResponse:
+    return error_response(
+        message="Timeout waiting for a database connection", status_code=503
+    )
+
+
+def handle_overloaded(exc: Overloaded, *args) -> GenericResponse:
+    response = error_response(message=str(exc), status_code=503)
+    response.headers = {"Retry-After": str(exc.retry_after)}
+    return response
+
+
+def handle_circuit_open(exc: CircuitOpen, *args) -> GenericResponse:
+    response = error_response(message=str(exc), status_code=503)
+    response.headers = {"Retry-After": str(exc.retry_after)}
+    return response
+
+
 exception_handlers: Dict[
     Any,
     Callable[[Any, bool], GenericResponse],
@@ -51,4 +83,20 @@ exception_handlers: Dict[
     IntegrityError: handle_integrity_error,
     NotFoundException: handle_not_found_error,
     ValidationError: validation_error_handler,
+    QueryValidationException: query_validation_handler,
+    StatementTimeout: handle_statement_timeout,
+    PoolTimeoutError: handle_pool_timeout,
+    Overloaded: handle_overloaded,
+    CircuitOpen: handle_circuit_open,
 }
+
+
+def get_exception_handler(exc: Exception) -> Callable[[Any, bool], GenericResponse]:
+    """
+    Handler of the exception or of its closest base class, the unhandled
+    exception response if none is registered.
+    """
+    for exc_type in type(exc).__mro__:
+        if exc_type in exception_handlers:
+            return exception_handlers[exc_type]
+    return unhandled_exception_response
@@ -1,7 +1,32 @@
-from typing import List
+from typing import Any, Dict, Iterator, List, Tuple
 
 
-class InvalidOperator(ValueError):
+class QueryValidationException(ValueError):
+    """
+    Invalid query or payload of a request, answered with a 422 listing its
+    `errors()` at `loc`, with `details` added to every error.
+    """
+
+    def __init__(self, message: str, loc: List[Any], **details: Any) -> None:
+        self.loc = loc
+        self.details = details
+        super().__init__(message)
+
+    def locations(self) -> Iterator[Tuple[List[Any], Dict[str, Any]]]:
+        """
+        Location and details of every error, subclasses reporting several
+        errors override it.
+        """
+        yield self.loc, self.details
+
+    def errors(self) -> List[Dict[str, Any]]:
+        return [
+            {"loc": loc, "msg": self.__str__(), **details}
+            for loc, details in self.locations()
+        ]
+
+
+class InvalidOperator(QueryValidationException):
     def __init__(
         self, operator: str, type_: type, column: str, valid_operators: List[str]
     ) -> None:
@@ -10,20 +35,158 @@ class InvalidOperator(ValueError):
         self.column = column
         self.valid_operators = valid_operators
         super().__init__(
-            f"Invalid operator '{operator}' for type '{type_}' on column '{column}'. "
+            f"Invalid operator '{operator}' for type '{type_}' on column '{column}'. ",
+            loc=["query", column + "__" + operator],
+            input=operator,
+            type=str(type_),
+            valid_operators=valid_operators,
         )
 
-    def errors(self):
-        return [
-            {
-                "loc": ["query", self.column + "__" + self.operator],
-                "msg": self.__str__(),
-                "input": self.operator,
-                "type": str(self.type_),
-                "valid_operators": self.valid_operators,
-            }
-        ]
-
 
 class NotFoundException(Exception):
     ...
+
+
+class SchemaSnapshotError(ValueError):
+    ...
+
+
+class UnindexedFilter(QueryValidationException):
+    def __init__(
+        self, filters: List[Tuple[str, str]], indexed: List[str], mode: str
+    ) -> None:
+        self.filters = filters
+        self.indexed = indexed
+        self.mode = mode
+        columns = ", ".join(f"'{column}'" for column, _ in filters)
+        message = f"Filters on {columns} can't use an index"
+        if mode == "cofilter":
+            message += ", filter on an indexed column too"
+        super().__init__(message, loc=["query"], indexed_columns=indexed)
+
+    def locations(self) -> Iterator[Tuple[List[Any], Dict[str, Any]]]:
+        for column, operator in self.filters:
+            yield ["query", column], {"input": operator, **self.details}
+
+
+class StatementTimeout(Exception):
+    def __init__(self, timeout: float) -> None:
+        self.timeout = timeout
+        super().__init__(f"Statement canceled after {timeout} seconds")
+
+
+class QueryTooExpensive(QueryValidationException):
+    def __init__(self, estimate: str, value: float, limit: float) -> None:
+        self.estimate = estimate
+        self.value = value
+        self.limit = limit
+        super().__init__(
+            f"Estimated {estimate} of the query ({value}) exceeds the limit ({limit})",
+            loc=["query"],
+            type=f"max_{estimate}",
+            input=value,
+            limit=limit,
+        )
+
+
+class Overloaded(Exception):
+    def __init__(self, reason: str, retry_after: int) -> None:
+        self.reason = reason
+        self.retry_after = retry_after
+        super().__init__(f"Service overloaded ({reason}), retry later")
+
+
+class CircuitOpen(Exception):
+    def __init__(self, name: str, retry_after: int) -> None:
+        self.name = name
+        self.retry_after = retry_after
+        super().__init__(f"Circuit '{name}' is open, the database is unavailable")
+
+
+class InvalidCursor(QueryValidationException):
+    def __init__(self, cursor: str) -> None:
+        self.cursor = cursor
+        super().__init__(
+            "Invalid pagination cursor", loc=["query", "cursor"], input=cursor
+        )
+
+
+class MissingShardKey(QueryValidationException):
+    def __init__(self, key: str) -> None:
+        self.key = key
+        super().__init__(
+            f"The shard key '{key}' is required", loc=["body", key], type="missing"
+        )
+
+
+class InvalidUpdateOperator(QueryValidationException):
+    def __init__(self, operator: str, column: str, valid_operators: List[str]) -> None:
+        self.operator = operator
+        self.column = column
+        self.valid_operators = valid_operators
+        super().__init__(
+            f"Invalid update operator '{operator}' on column '{column}'",
+            loc=["body", column],
+            input=operator,
+            valid_operators=valid_operators,
+        )
+
+
+class InvalidSort(QueryValidationException):
+    def __init__(self, column: str, valid_columns: List[str]) -> None:
+        self.column = column
+        self.valid_columns = valid_columns
+        super().__init__(
+            f"Invalid sort column '{column}'",
+            loc=["query", "sort"],
+            input=column,
+            valid_columns=valid_columns,
+        )
+
+
+class UnindexedSort(QueryValidationException):
+    def __init__(self, columns: List[str], indexed: List[str]) -> None:
+        self.columns = columns
+        self.indexed = indexed
+        names = ", ".join(f"'{column}'" for column in columns)
+        super().__init__(
+            f"Sorting by {names} can't use an index",
+            loc=["query", "sort"],
+            indexed_columns=indexed,
+        )
+
+    def locations(self) -> Iterator[Tuple[List[Any], Dict[str, Any]]]:
+        for column in self.columns:
+            yield self.loc, {"input": column, **self.details}
+
+
+class InvalidFilterExpression(QueryValidationException):
+    def __init__(self, message: str, expression: str, location: str = "query") -> None:
+        self.expression = expression
+        self.location = location
+        super().__init__(message, loc=[location, "filter"], input=expression)
+
+
+class InvalidFilterValue(QueryValidationException):
+    def __init__(self, column: str, operator: str, value: Any, message: str) -> None:
+        self.column = column
+        self.operator = operator
+        self.value = value
+        super().__init__(
+            f"Invalid value for '{operator}' on '{column}': {message}",
+            loc=["query", column],
+            input=value,
+        )
+
+
+class InvalidAggregate(QueryValidationException):
+    def __init__(self, param: str, value: Any, message: str) -> None:
+        self.param = param
+        self.value = value
+        super().__init__(message, loc=["query", param], input=value)
+
+
+class InvalidFacet(QueryValidationException):
+    def __init__(self, facet: str, message: str) -> None:
+        self.facet = facet
+        super().__init__(message, loc=["query", "facets"], input=facet)
@@ -0,0 +1,82 @@
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ClauseElement, Executable, Select
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class Explain(Executable, ClauseElement):
+    """
+    `EXPLAIN` of a select statement, compiled for the dialect of the engine:
+    `EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON)` on PostgreSQL, `EXPLAIN QUERY PLAN`
+    on SQLite and a plain `EXPLAIN` on the rest.
+
+    The statement keeps its bound parameters, so the plan is the one of the
+    query the handler would run. With `analyze=False` PostgreSQL only estimates
+    the plan, without running the statement.
+    """
+
+    inherit_cache = False
+
+    def __init__(self, statement: Select, analyze: bool = True) -> None:
+        self.statement = statement
+        self.analyze = analyze
+
+
+@compiles(Explain)
+def _compile_explain(element: Explain, compiler, **kw) -> str:
+    return "EXPLAIN " + compiler.process(element.statement, **kw)
+
+
+@compiles(Explain, "postgresql")
+def _compile_explain_postgresql(element: Explain, compiler, **kw) -> str:
+    options = "ANALYZE, BUFFERS, FORMAT JSON" if element.analyze else "FORMAT JSON"
+    return f"EXPLAIN ({options}) " + compiler.process(element.statement, **kw)
+
+
+@compiles(Explain, "sqlite")
+def _compile_explain_sqlite(element: Explain, compiler, **kw) -> str:
+    return "EXPLAIN QUERY PLAN " + compiler.process(element.statement, **kw)
+
+
+def format_plan(dialect: str, rows: List[Any]) -> Any:
+    """
+    Plan as returned by the database: the JSON document on PostgreSQL, a list
+    with a dict per row on the rest.
+    """
+    if dialect == "postgresql" and rows:
+        return rows[0][0]
+    return [dict(row._mapping) for row in rows]
+
+
+def full_scans(dialect: str, plan: Any) -> List[str]:
+    """
+    Tables read with a full (sequential) scan in a plan returned by
+    `format_plan`, a scan of an index is not a full scan.
+    """
+    scans: List[str] = []
+    if dialect == "postgresql":
+
+        def walk(node: Dict) -> None:
+            if node.get("Node Type") == "Seq Scan":
+                scans.append(node["Relation Name"])
+            for child in node.get("Plans", []):
+                walk(child)
+
+        for item in plan:
+            walk(item["Plan"])
+    elif dialect == "sqlite":
+        for row in plan:
+            detail = row["detail"]
+            if detail.startswith("SCAN ") and " USING " not in detail:
+                scans.append(detail.split()[1])
+    return scans
+
+
+def estimate(dialect: str, plan: Any) -> Optional[Tuple[float, float]]:
+    """
+    Planner estimated (cost, rows) of a plan returned by `format_plan`, None if
+    the dialect doesn't estimate them.
+    """
+    if dialect != "postgresql":
+        return None
+    root = plan[0]["Plan"]
+    return root["Total Cost"], root["Plan Rows"]
@@ -0,0 +1,259 @@
+from functools import lru_cache
+from sqlalchemy_api.exceptions import InvalidFilterExpression
+from typing import Any, Iterator, List, Tuple, Union
+import json
+import re
+
+AND = "and"
+OR = "or"
+NOT = "not"
+GROUPS = [AND, OR]
+
+# Separators of the text syntax, values containing them must be quoted
+DELIMITERS = ",()"
+_QUOTED = re.compile(r'"((?:[^"\\]|\\.)*)"')
+_SPACES_AROUND_DELIMITERS = re.compile(r"\s*([,()])\s*|(" + _QUOTED.pattern + ")")
+
+
+class Condition:
+    """
+    Filter of a column with one of its operators, the value is a list for the
+    list operators and None for the null operators.
+    """
+
+    def __init__(self, column: str, operator: str, value: Any = None) -> None:
+        self.column = column
+        self.operator = operator
+        self.value = value
+
+
+class Group:
+    """
+    `and` or `or` of its operands.
+    """
+
+    def __init__(self, kind: str, operands: List["Node"]) -> None:
+        self.kind = kind
+        self.operands = operands
+
+
+class Not:
+    def __init__(self, operand: "Node") -> None:
+        self.operand = operand
+
+
+Node = Union[Condition, Group, Not]
+
+
+def conditions(node: Node) -> Iterator[Condition]:
+    if isinstance(node, Condition):
+        yield node
+    elif isinstance(node, Group):
+        for operand in node.operands:
+            yield from conditions(operand)
+    else:
+        yield from conditions(node.operand)
+
+
+def conjuncts(node: Node) -> List[Node]:
+    """
+    Operands of the top level `and` of an expression.
+    """
+    if isinstance(node, Group) and node.kind == AND:
+        return [
+            conjunct for operand in node.operands for conjunct in conjuncts(operand)
+        ]
+    return [node]
+
+
+class Limits:
+    def __init__(self, text: str, max_depth: int, max_conditions: int) -> None:
+        self.text = text
+        self.max_depth = max_depth
+        self.max_conditions = max_conditions
+        self.conditions = 0
+
+    def group(self, depth: int) -> None:
+        if depth > self.max_depth:
+            raise InvalidFilterExpression(
+                f"Filter expression nested deeper than {self.max_depth}", self.text
+            )
+
+    def condition(self) -> None:
+        self.conditions += 1
+        if self.conditions > self.max_conditions:
+            raise InvalidFilterExpression(
+                f"Filter expression with more than {self.max_conditions} conditions",
+                self.text,
+            )
+
+
+class Parser:
+    """
+    Recursive descent parser of the text syntax:
+
+        expression := ("and" | "or") "(" expression ("," expression)* ")"
+                    | "not" "(" expression ")"
+                    | column "." operator ["." value]
+        value      := item | "(" item ("," item)* ")"
+        item       := bare text without `,()` | '"' quoted text '"'
+    """
+
+    def __init__(self, text: str, limits: Limits) -> None:
+        self.text = text
+        self.position = 0
+        self.limits = limits
+
+    def error(self, message: str) -> InvalidFilterExpression:
+        return InvalidFilterExpression(
+            f"{message} at position {self.position}", self.text
+        )
+
+    def peek(self) -> str:
+        return self.text[self.position : self.position + 1]
+
+    def expect(self, char: str) -> None:
+        if self.peek() != char:
+            raise self.error(f"Expected '{char}'")
+        self.position += 1
+
+    def parse(self) -> Node:
+        node = self.expression(0)
+        if self.position != len(self.text):
+            raise self.error("Unexpected text")
+        return node
+
+    def expression(self, depth: int) -> Node:
+        for keyword in [*GROUPS, NOT]:
+            if self.text.startswith(keyword + "(", self.position):
+                self.limits.group(depth + 1)
+                self.position += len(keyword) + 1
+                operands = [self.expression(depth + 1)]
+                while keyword != NOT and self.peek() == ",":
+                    self.position += 1
+                    operands.append(self.expression(depth + 1))
+                self.expect(")")
+                return Not(operands[0]) if keyword == NOT else Group(keyword, operands)
+        return self.condition()
+
+    def condition(self) -> Condition:
+        self.limits.condition()
+        name = self.bare()
+        column, _, operator = name.partition(".")
+        operator, dot, value = operator.partition(".")
+        if not column or not operator:
+            raise self.error("Expected 'column.operator.value'")
+        if not dot:
+            return Condition(column, operator)
+        if value or self.peek() not in ["(", '"']:
+            return Condition(column, operator, value)
+        if self.peek() == '"':
+            return Condition(column, operator, self.quoted())
+        self.position += 1
+        values = [self.item()]
+        while self.peek() == ",":
+            self.position += 1
+            values.append(self.item())
+        self.expect(")")
+        return Condition(column, operator, values)
+
+    def item(self) -> str:
+        return self.quoted() if self.peek() == '"' else self.bare()
+
+    def bare(self) -> str:
+        start = self.position
+        while self.position < len(self.text) and self.peek() not in DELIMITERS + '"':
+            self.position += 1
+        return self.text[start : self.position]
+
+    def quoted(self) -> str:
+        match = _QUOTED.match(self.text, self.position)
+        if match is None:
+            raise self.error("Unterminated quoted value")
+        self.position = match.end()
+        return re.sub(r"\\(.)", r"\1", match.group(1))
+
+
+def normalize(text: str) -> str:
+    """
+    Text of an expression without the spaces around its delimiters, outside of
+    the quoted values.
+    """
+    return _SPACES_AROUND_DELIMITERS.sub(
+        lambda match: match.group(1) or match.group(2), text.strip()
+    )
+
+
+@lru_cache(maxsize=1024)
+def _parse_text(text: str, max_depth: int, max_conditions: int) -> Node:
+    return Parser(text, Limits(text, max_depth, max_conditions)).parse()
+
+
+def _from_json(data: Any, limits: Limits, depth: int) -> Node:
+    if not isinstance(data, dict) or not data:
+        raise InvalidFilterExpression("Expected an object", limits.text)
+    kinds = [kind for kind in [*GROUPS, NOT] if kind in data]
+    if kinds:
+        if len(data) != 1:
+            raise InvalidFilterExpression(
+                f"'{kinds[0]}' must be the only key of its object", limits.text
+            )
+        limits.group(depth + 1)
+        operands = data[kinds[0]]
+        if kinds[0] == NOT:
+            return Not(_from_json(operands, limits, depth + 1))
+        if not isinstance(operands, list) or not operands:
+            raise InvalidFilterExpression(
+                f"'{kinds[0]}' expects a non empty list", limits.text
+            )
+        return Group(
+            kinds[0], [_from_json(operand, limits, depth + 1) for operand in operands]
+        )
+    limits.condition()
+    column, operator = data.get("column"), data.get("op", "equal")
+    if not isinstance(column, str) or not isinstance(operator, str):
+        raise InvalidFilterExpression(
+            "Expected a condition with 'column', 'op' and 'value'", limits.text
+        )
+    return Condition(column, operator, data.get("value"))
+
+
+@lru_cache(maxsize=1024)
+def _parse_json(text: str, max_depth: int, max_conditions: int) -> Node:
+    limits = Limits(text, max_depth, max_conditions)
+    return _from_json(json.loads(text), limits, 0)
+
+
+def parse_filter(expression: Any, max_depth: int, max_conditions: int) -> Node:
+    """
+    Parse a filter expression, in the text syntax or as JSON objects
+    (`{"or": [...]}`, `{"not": {...}}`, `{"column": ..., "op": ..., "value": ...}`),
+    raise `InvalidFilterExpression` if it's malformed or over the limits.
+
+    The trees are cached by their normalized text, they must not be modified.
+    """
+    if isinstance(expression, str):
+        return _parse_text(normalize(expression), max_depth, max_conditions)
+    text = json.dumps(expression, sort_keys=True, separators=(",", ":"))
+    return _parse_json(text, max_depth, max_conditions)
+
+
+def shape(node: Node) -> Tuple[List[Tuple[str, str]], List[List[Tuple[str, str]]]]:
+    """
+    (column, operator) pairs of the conditions of the top level `and` of an
+    expression, and of each of its `or` and `not` operands, which an index can
+    only serve if it serves all of their conditions.
+    """
+    pairs: List[Tuple[str, str]] = []
+    groups: List[List[Tuple[str, str]]] = []
+    for conjunct in conjuncts(node):
+        if isinstance(conjunct, Condition):
+            pairs.append((conjunct.column, conjunct.operator))
+        else:
+            groups.append(
+                [
+                    (condition.column, condition.operator)
+                    for condition in conditions(conjunct)
+                ]
+            )
+    return pairs, groups
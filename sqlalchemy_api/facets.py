@@ -0,0 +1,119 @@
+from sqlalchemy import (
+    CompoundSelect,
+    Select,
+    func,
+    literal,
+    null,
+    select,
+    type_coerce,
+    union_all,
+)
+from sqlalchemy.sql.elements import ColumnElement
+from sqlalchemy_api.exceptions import InvalidFacet
+from sqlalchemy_api.pydantic_utils import FacetCount
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Union
+import enum
+
+# Dialects counting every facet in a single `GROUP BY GROUPING SETS`, the
+# others run a `UNION ALL` of a grouped select per facet
+GROUPING_SETS_DIALECTS = ["postgresql"]
+
+
+def default_facet_columns(types: Dict[str, type]) -> List[str]:
+    """
+    Columns with a few distinct values by type: the enum and bool columns.
+    """
+    return [
+        name
+        for name, type_ in types.items()
+        if type_ is bool or (isinstance(type_, type) and issubclass(type_, enum.Enum))
+    ]
+
+
+def parse_facets(value: Any, allowed: Sequence[str]) -> List[str]:
+    """
+    Columns of a comma separated `facets`, raise `InvalidFacet` on a column
+    not in `allowed`.
+    """
+    items = value if isinstance(value, list) else str(value or "").split(",")
+    facets = [*dict.fromkeys(item.strip() for item in items if item.strip())]
+    for facet in facets:
+        if facet not in allowed:
+            raise InvalidFacet(
+                facet, f"Facets are only counted for {', '.join(allowed) or 'none'}"
+            )
+    return facets
+
+
+def facet_statement(
+    dialect: str,
+    table: Any,
+    columns: Sequence[Any],
+    where: Optional[ColumnElement],
+) -> Union[Select, CompoundSelect]:
+    """
+    Statement counting the rows matching `where` per value of each column, its
+    rows are the index of the facet, the value of each column (NULL for the
+    other facets) and the count.
+    """
+    if dialect in GROUPING_SETS_DIALECTS:
+        stmt = select(
+            *[column.label(f"facet_{index}") for index, column in enumerate(columns)],
+            # 1 for the facets the row isn't grouped by
+            *[
+                func.grouping(column).label(f"grouping_{index}")
+                for index, column in enumerate(columns)
+            ],
+            func.count().label("count"),
+        ).select_from(table)
+        if where is not None:
+            stmt = stmt.where(where)
+        return stmt.group_by(func.grouping_sets(*columns))
+    selects = []
+    for index, column in enumerate(columns):
+        stmt = select(
+            literal(index).label("facet"),
+            *[
+                (column if other is column else type_coerce(null(), other.type)).label(
+                    f"facet_{other_index}"
+                )
+                for other_index, other in enumerate(columns)
+            ],
+            func.count().label("count"),
+        ).select_from(table)
+        if where is not None:
+            stmt = stmt.where(where)
+        selects.append(stmt.group_by(column))
+    if len(selects) == 1:
+        return selects[0]
+    return union_all(*selects)
+
+
+def facet_index(row: Any, size: int) -> int:
+    if "facet" in row:
+        return row["facet"]
+    return next(index for index in range(size) if not row[f"grouping_{index}"])
+
+
+def facet_counts(
+    facets: Sequence[str], rows: Iterable[Any]
+) -> Dict[str, List[FacetCount]]:
+    """
+    Counts per value of each facet, from the rows of the `facet_statement` of
+    one or several databases, the most frequent first.
+    """
+    counts: List[Dict[Any, int]] = [{} for _ in facets]
+    for row in rows:
+        index = facet_index(row, len(facets))
+        value = row[f"facet_{index}"]
+        counts[index][value] = counts[index].get(value, 0) + row["count"]
+    return {
+        facet: [
+            FacetCount(value=value, count=count)
+            for value, count in sorted(
+                counts[index].items(),
+                key=lambda item: (-item[1], item[0] is None, str(item[0])),
+            )
+        ]
+        for index, facet in enumerate(facets)
+    }
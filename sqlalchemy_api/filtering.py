@@ -1,5 +1,7 @@
-from typing import Optional, Any, List
+from typing import Optional, Any, Container, Dict, Iterable, List, Tuple
 from sqlalchemy.sql.elements import KeyedColumnElement
+from sqlalchemy_api.json_filters import JSON_TYPE_OPERATORS
+from sqlalchemy_api.text_search import TEXT_SEARCH_OPERATORS
 from datetime import date, datetime
 import enum
 
@@ -11,10 +13,16 @@ NULL_OPERATORS = [
     IS_NOT_NULL,
 ]
 
+BETWEEN = "between"
+# Operators taking several values, from repeated or comma separated params
+LIST_OPERATORS = ["in", "not_in", BETWEEN]
+
 BASE_OPERATORS = [
     *NULL_OPERATORS,
     "equal",
     "ne",
+    "in",
+    "not_in",
 ]
 
 NUMERIC_OPERATORS = [
@@ -23,6 +31,7 @@ NUMERIC_OPERATORS = [
     "ge",
     "lt",
     "le",
+    BETWEEN,
 ]
 
 STRING_OPERATORS = [
@@ -53,9 +62,48 @@ OPERATOR_ATTR_MAP = {
     "contains": "contains",
     "startswith": "startswith",
     "endswith": "endswith",
+    "in": "in_",
+    "not_in": "not_in",
+    BETWEEN: "between",
 }
 
 
+def query_params_dict(
+    items: Iterable[Tuple[str, str]], multi: Container[str]
+) -> Dict[str, Any]:
+    """
+    Query params as a dict, the values of a repeated param in `multi` are
+    collected in a list, the last value is kept for the others.
+    """
+    params: Dict[str, Any] = {}
+    for key, value in items:
+        if key in multi and key in params:
+            previous = params[key]
+            params[key] = (
+                [*previous, value]
+                if isinstance(previous, list)
+                else [
+                    previous,
+                    value,
+                ]
+            )
+        else:
+            params[key] = value
+    return params
+
+
+def filter_values(value: Any) -> List[Any]:
+    """
+    Values of a list operator filter: the values of a repeated param, or a
+    single param split on commas.
+    """
+    if isinstance(value, (list, tuple)):
+        return list(value)
+    if isinstance(value, str):
+        return value.split(",")
+    return [value]
+
+
 class Filter:
     def __init__(
         self,
@@ -65,6 +113,9 @@ class Filter:
         column: KeyedColumnElement,
         default: Optional[Any] = None,
         description: Optional[str] = None,
+        indexed: bool = False,
+        text_search: bool = False,
+        json_filters: bool = False,
     ):
         self.name = name
         self.type = type_
@@ -72,6 +123,9 @@ class Filter:
         self.column = column
         self.default = default
         self.description = description
+        self.indexed = indexed
+        self.text_search = text_search
+        self.json_filters = json_filters
 
     @property
     def operator_name(self) -> str:
@@ -81,6 +135,13 @@ class Filter:
     def operators(self) -> List[str]:
         if self.type in TYPE_OPERATORS:
             operations = TYPE_OPERATORS[self.type]
+            if not self.nullable:
+                operations = [op for op in operations if op not in NULL_OPERATORS]
+            if self.text_search:
+                operations = [*operations, *TEXT_SEARCH_OPERATORS]
+            return operations
+        if self.json_filters and self.type in JSON_TYPE_OPERATORS:
+            operations = [*BASE_OPERATORS, *JSON_TYPE_OPERATORS[self.type]]
             if not self.nullable:
                 operations = [op for op in operations if op not in NULL_OPERATORS]
             return operations
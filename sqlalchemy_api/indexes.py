@@ -0,0 +1,241 @@
+from collections import Counter
+from pydantic import BaseModel, Field
+from sqlalchemy import ARRAY, Table, UniqueConstraint
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy_api.exceptions import UnindexedFilter, UnindexedSort
+from sqlalchemy_api.filtering import NULL_OPERATORS
+from sqlalchemy_api.json_filters import GIN_OPERATORS, JSON_OPERATORS
+from sqlalchemy_api.text_search import TEXT_SEARCH_OPERATORS
+from threading import Lock
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+ALLOW = "allow"
+COFILTER = "cofilter"
+REJECT = "reject"
+POLICY_MODES = [ALLOW, COFILTER, REJECT]
+
+# An `IN` list is a set of equality lookups in the index
+EQUALITY_OPERATORS = ["equal", "in", *NULL_OPERATORS]
+# A leading wildcard `LIKE` can't use a B-tree index, the text search and JSON
+# operators need a dedicated index, see `operator_index`
+UNINDEXABLE_OPERATORS = [
+    "contains",
+    "endswith",
+    *TEXT_SEARCH_OPERATORS,
+    *JSON_OPERATORS,
+]
+
+FilterShape = Tuple[Tuple[str, str], ...]
+
+
+def indexed_columns(table: Table) -> Set[str]:
+    """
+    Columns that lead an index, the primary key or a unique constraint of a
+    table, so a filter on them alone can be served by the index.
+    """
+    leading: List = [*table.primary_key.columns][:1]
+    for index in table.indexes:
+        leading.extend([*index.columns][:1])
+    for constraint in table.constraints:
+        if isinstance(constraint, UniqueConstraint):
+            leading.extend([*constraint.columns][:1])
+    return {column.name for column in leading}
+
+
+def operator_index(column: str, operator: str) -> str:
+    """
+    Entry of the indexed columns for a column with an index serving only
+    `operator`, e.g. a full-text index.
+    """
+    return f"{column}__{operator}"
+
+
+def gin_indexed(table: Table) -> Set[str]:
+    """
+    Operator entries of the JSONB and ARRAY columns leading a PostgreSQL GIN
+    index, for the operators of its operator class.
+    """
+    indexed: Set[str] = set()
+    for index in table.indexes:
+        options = index.dialect_options["postgresql"]
+        columns = [*index.columns][:1]
+        if options["using"] != "gin" or not columns:
+            continue
+        column = columns[0]
+        if isinstance(column.type, JSONB):
+            default = "jsonb_ops"
+        elif isinstance(column.type, ARRAY):
+            default = "array_ops"
+        else:
+            continue
+        ops = (options["ops"] or {}).get(column.name, default)
+        indexed.update(
+            operator_index(column.name, operator)
+            for operator in GIN_OPERATORS.get(ops, [])
+        )
+    return indexed
+
+
+def is_indexed(column: str, operator: str, indexed: Set[str]) -> bool:
+    if operator_index(column, operator) in indexed:
+        return True
+    return column in indexed and operator not in UNINDEXABLE_OPERATORS
+
+
+class IndexRecommendation(BaseModel):
+    table: str
+    columns: List[str]
+    count: int
+    statement: str
+    unsupported: List[str] = Field(default_factory=list)
+
+
+class IndexAdvisor:
+    """
+    Counts the filter shapes that no index can serve, so they need a full scan,
+    and turns them into index recommendations.
+    """
+
+    def __init__(self) -> None:
+        self.usage: Counter = Counter()
+        self.lock = Lock()
+
+    def observe(self, table: str, shape: FilterShape, indexed: Set[str]) -> None:
+        if not shape or any(is_indexed(column, op, indexed) for column, op in shape):
+            return
+        with self.lock:
+            self.usage[(table, shape)] += 1
+
+    def clear(self) -> None:
+        with self.lock:
+            self.usage.clear()
+
+    @staticmethod
+    def index_columns(shape: FilterShape) -> Tuple[List[str], List[str]]:
+        """
+        Columns of the index serving a filter shape: the equality filters first
+        and then a single range filter, and the columns no B-tree index can serve.
+        """
+        equality = [column for column, op in shape if op in EQUALITY_OPERATORS]
+        unsupported = [column for column, op in shape if op in UNINDEXABLE_OPERATORS]
+        ranges = [
+            column
+            for column, _ in shape
+            if column not in equality and column not in unsupported
+        ]
+        return [*dict.fromkeys(equality), *ranges[:1]], unsupported
+
+    def recommendations(self, min_count: int = 1) -> List[IndexRecommendation]:
+        """
+        Recommended indexes, the most used first.
+        """
+        with self.lock:
+            usage = list(self.usage.items())
+        recommendations: Dict[Tuple[str, Tuple[str, ...]], IndexRecommendation] = {}
+        for (table, shape), count in usage:
+            columns, unsupported = self.index_columns(shape)
+            key = (table, tuple(columns))
+            recommendation = recommendations.get(key)
+            if recommendation is None:
+                recommendations[key] = IndexRecommendation(
+                    table=table,
+                    columns=columns,
+                    count=count,
+                    statement=(
+                        f"CREATE INDEX ix_{table}_{'_'.join(columns)} "
+                        f"ON {table} ({', '.join(columns)})"
+                    )
+                    if columns
+                    else "",
+                    unsupported=unsupported,
+                )
+                continue
+            recommendation.count += count
+            recommendation.unsupported = [
+                *dict.fromkeys([*recommendation.unsupported, *unsupported])
+            ]
+        return sorted(
+            (
+                recommendation
+                for recommendation in recommendations.values()
+                if recommendation.count >= min_count
+            ),
+            key=lambda recommendation: recommendation.count,
+            reverse=True,
+        )
+
+
+class IndexPolicy:
+    """
+    Checks that the filters of the list queries can be served by an index.
+
+    Params:
+    - `mode`: `allow` only collects usage in the advisor, `cofilter` accepts an
+        unindexed filter along with at least one indexed filter, `reject` rejects
+        any unindexed filter
+    - `advisor`: collects the unindexed filter shapes, one is created if not
+        given
+    """
+
+    def __init__(
+        self, mode: str = COFILTER, advisor: Optional[IndexAdvisor] = None
+    ) -> None:
+        if mode not in POLICY_MODES:
+            raise ValueError(f"Invalid mode '{mode}', valid modes are {POLICY_MODES}")
+        self.mode = mode
+        self.advisor = advisor or IndexAdvisor()
+
+    def check(
+        self,
+        table: str,
+        shape: Sequence[Tuple[str, str]],
+        indexed: Set[str],
+        groups: Sequence[Sequence[Tuple[str, str]]] = (),
+    ) -> None:
+        """
+        Raise `UnindexedFilter` if the filter shape is not allowed by the policy.
+
+        - `table`: name of the filtered table
+        - `shape`: (column, operator) pairs of the filters
+        - `indexed`: columns leading an index, see `indexed_columns`
+        - `groups`: (column, operator) pairs of the `or` and `not` operands of a
+            filter expression, each one counts as a filter that can use an index
+            only if all its conditions can
+        """
+        self.advisor.observe(
+            table, (*shape, *(pair for group in groups for pair in group)), indexed
+        )
+        unindexed = [
+            (column, op) for column, op in shape if not is_indexed(column, op, indexed)
+        ]
+        unindexed_groups = [
+            group
+            for group in groups
+            if not all(is_indexed(column, op, indexed) for column, op in group)
+        ]
+        if (not unindexed and not unindexed_groups) or self.mode == ALLOW:
+            return
+        filters = len(shape) + len(groups)
+        if self.mode == COFILTER and len(unindexed) + len(unindexed_groups) < filters:
+            return
+        for group in unindexed_groups:
+            unindexed.extend(
+                (column, op)
+                for column, op in group
+                if (column, op) not in unindexed and not is_indexed(column, op, indexed)
+            )
+        raise UnindexedFilter(unindexed, sorted(indexed), self.mode)
+
+    def check_sort(self, columns: Sequence[str], indexed: Set[str]) -> None:
+        """
+        Raise `UnindexedSort` if a sort column doesn't lead an index, so the
+        database would sort the whole result instead of reading the first rows
+        of an index. Any sort is allowed in `allow` mode.
+
+        - `columns`: sort columns, without the primary key tiebreaker
+        - `indexed`: columns leading an index, see `indexed_columns`
+        """
+        unindexed = [column for column in columns if column not in indexed]
+        if not unindexed or self.mode == ALLOW:
+            return
+        raise UnindexedSort(unindexed, sorted(indexed))
@@ -0,0 +1,126 @@
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.engine.default import CACHE_HIT, CACHE_MISS
+from sqlalchemy_api._types import ENGINE_TYPE
+from sqlalchemy_api.tracing import TracerProtocol
+import time
+
+
+class RequestContext:
+    """
+    State of the CRUD request being handled.
+
+    It is stored in a context variable, so the SQLAlchemy engine events, which
+    run in the worker thread executing the statement, can attribute each
+    statement to the request that issued it.
+
+    - `model_name`: name of the model of the handler
+    - `action`: name of the action (`get`, `get_many`, ...)
+    - `tracer`: if given, each statement is traced in a `sql` span
+    - `timings`: accumulated seconds per phase
+    - `rows`: number of rows returned, if the action returns rows
+    - `statements`: (statement, seconds) of each statement executed
+    - `statement_cache`: number of compiled cache hits and misses
+    - `filters`, `page_size`, `sort`: shape of the query of `get_many`, without
+        the filter values
+    """
+
+    def __init__(
+        self, model_name: str, action: str, tracer: Optional[TracerProtocol] = None
+    ) -> None:
+        self.model_name = model_name
+        self.action = action
+        self.tracer = tracer
+        self.start = time.perf_counter()
+        self.timings: Dict[str, float] = {}
+        self.rows: Optional[int] = None
+        self.statements: List[Tuple[str, float]] = []
+        self.statement_cache: Dict[str, int] = {"hit": 0, "miss": 0}
+        self.filters: List[Tuple[str, str]] = []
+        self.page_size: Optional[int] = None
+        self.sort: Optional[str] = None
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.start
+
+    @property
+    def sql_time(self) -> float:
+        return sum(duration for _, duration in self.statements)
+
+    def add_timing(self, phase: str, duration: float) -> None:
+        self.timings[phase] = self.timings.get(phase, 0) + duration
+
+    def on_statement(self, statement: str, context: Any, duration: float) -> None:
+        self.statements.append((statement, duration))
+        cache_hit = getattr(context, "cache_hit", None)
+        if cache_hit == CACHE_HIT:
+            self.statement_cache["hit"] += 1
+        elif cache_hit == CACHE_MISS:
+            self.statement_cache["miss"] += 1
+
+    def server_timing(self) -> str:
+        """
+        Value of the `Server-Timing` header: the duration of each phase, of all
+        the statements (`db`) and of the whole request (`total`) in milliseconds.
+        """
+        metrics = [*self.timings.items(), ("db", self.sql_time)]
+        metrics.append(("total", self.elapsed))
+        return ", ".join(
+            f"{name};dur={duration * 1000:.3f}" for name, duration in metrics
+        )
+
+
+current_request: ContextVar[Optional[RequestContext]] = ContextVar(
+    "sqlalchemy_api_current_request", default=None
+)
+
+START_KEY = "sqlalchemy_api_start"
+SPANS_KEY = "sqlalchemy_api_spans"
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, many):
+    conn.info.setdefault(START_KEY, []).append(time.perf_counter())
+    request = current_request.get()
+    if request is not None and request.tracer is not None:
+        span = request.tracer.start_span(
+            "sql",
+            attributes={"db.system": conn.dialect.name, "db.statement": statement},
+        )
+        conn.info.setdefault(SPANS_KEY, []).append(span)
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, many):
+    start = conn.info[START_KEY].pop()
+    request = current_request.get()
+    if request is not None:
+        request.on_statement(statement, context, time.perf_counter() - start)
+        if request.tracer is not None and conn.info.get(SPANS_KEY):
+            conn.info[SPANS_KEY].pop().end()
+
+
+def _handle_error(exception_context):
+    connection = exception_context.connection
+    if connection is None:
+        return
+    if connection.info.get(START_KEY):
+        connection.info[START_KEY].pop()
+    request = current_request.get()
+    if request is not None and connection.info.get(SPANS_KEY):
+        span = connection.info[SPANS_KEY].pop()
+        span.record_exception(exception_context.original_exception)
+        span.end()
+
+
+def instrument_engine(engine: ENGINE_TYPE) -> None:
+    """
+    Listen to the cursor execution events of an engine (once per engine), to
+    attribute each statement to the current request.
+    """
+    sync_engine: Engine = getattr(engine, "sync_engine", engine)  # type: ignore
+    if not event.contains(sync_engine, "after_cursor_execute", _after_cursor_execute):
+        event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(sync_engine, "handle_error", _handle_error)
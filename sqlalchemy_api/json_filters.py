@@ -0,0 +1,201 @@
+from sqlalchemy import ARRAY, and_, cast, exists, func, or_, select, type_coerce
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.sql.elements import ColumnElement
+from sqlalchemy_api.exceptions import InvalidFilterValue
+from pydantic import TypeAdapter, ValidationError
+from typing import Any, List, Tuple
+import json
+
+HAS_KEY = "has_key"
+CONTAINS_JSON = "contains_json"
+PATH_EQUAL = "path_equal"
+ARRAY_OVERLAPS = "array_overlaps"
+ARRAY_CONTAINS = "array_contains"
+ARRAY_OPERATORS = [ARRAY_OVERLAPS, ARRAY_CONTAINS]
+JSON_OPERATORS = [HAS_KEY, CONTAINS_JSON, PATH_EQUAL, *ARRAY_OPERATORS]
+JSON_FILTER_DIALECTS = ["postgresql", "sqlite"]
+
+# Operators of the python types of the JSON and ARRAY columns, a JSON
+# document can be an array too
+JSON_TYPE_OPERATORS = {
+    dict: JSON_OPERATORS,
+    list: ARRAY_OPERATORS,
+}
+# Operators served by a GIN index, `jsonb_path_ops` has no `?` support
+GIN_OPERATORS = {
+    "jsonb_ops": JSON_OPERATORS,
+    "jsonb_path_ops": [CONTAINS_JSON, PATH_EQUAL, *ARRAY_OPERATORS],
+    "array_ops": ARRAY_OPERATORS,
+}
+
+
+def json_value(value: Any) -> Any:
+    """
+    JSON value of a query param, the text itself if it isn't valid JSON, so
+    `a` and `"a"` are the same string.
+    """
+    if not isinstance(value, str):
+        return value
+    try:
+        return json.loads(value)
+    except ValueError:
+        return value
+
+
+def parse_path(column: str, operator: str, value: Any) -> Tuple[List[str], Any]:
+    """
+    Path and value of a `path_equal` filter, `a.b=value`.
+    """
+    path, equal, expected = str(value).partition("=")
+    keys = path.split(".")
+    if not equal or not all(keys):
+        raise InvalidFilterValue(
+            column, operator, value, "Expected 'path.to.key=value'"
+        )
+    expected = json_value(expected)
+    if isinstance(expected, (dict, list)):
+        raise InvalidFilterValue(
+            column, operator, value, "Use `contains_json` to match an object or array"
+        )
+    return keys, expected
+
+
+def parse_items(column: Any, operator: str, value: Any) -> List[Any]:
+    """
+    Items of an array filter: the values of a repeated param, a comma separated
+    param or a JSON array, validated against the item type of an ARRAY column.
+    """
+    if isinstance(value, str):
+        array = json_value(value)
+        items = array if isinstance(array, list) else value.split(",")
+    elif isinstance(value, (list, tuple)):
+        items = list(value)
+    else:
+        items = [value]
+    if not items:
+        raise InvalidFilterValue(column.name, operator, value, "Expected values")
+    if isinstance(column.type, ARRAY):
+        try:
+            return TypeAdapter(List[column.type.item_type.python_type]).validate_python(
+                items
+            )
+        except ValidationError as e:
+            raise InvalidFilterValue(column.name, operator, value, str(e))
+    return [json_value(item) for item in items]
+
+
+def sqlite_path(keys: List[str]) -> str:
+    # Quoted, so the keys can contain dots or brackets. The path is a bound
+    # parameter of `json_extract`, not part of the statement
+    return "$" + "".join(f'."{key}"' for key in keys)
+
+
+def nested(keys: List[str], value: Any) -> Any:
+    """
+    `{"a": {"b": value}}` of the keys `["a", "b"]`.
+    """
+    for key in reversed(keys):
+        value = {key: value}
+    return value
+
+
+def _jsonb(column: Any) -> Any:
+    # `?` and `@>` are JSONB operators, a JSON column is cast and can't use an index
+    return column if isinstance(column.type, JSONB) else cast(column, JSONB)
+
+
+def _postgresql_condition(column: Any, operator: str, value: Any) -> ColumnElement:
+    if isinstance(column.type, ARRAY):
+        # The `@>` and `&&` operators of the PostgreSQL ARRAY type
+        array = type_coerce(column, postgresql.ARRAY(column.type.item_type))
+        if operator == ARRAY_OVERLAPS:
+            return array.overlap(value)
+        return array.contains(value)
+    document = _jsonb(column)
+    if operator == HAS_KEY:
+        return document.has_key(value)
+    if operator == PATH_EQUAL:
+        # Containment instead of `->>`, so a GIN index serves it
+        return document.contains(nested(*value))
+    if operator == ARRAY_OVERLAPS:
+        return or_(*[document.contains([item]) for item in value])
+    return document.contains(value)
+
+
+def _sqlite_equal(column: Any, path: str, value: Any) -> ColumnElement:
+    if value is None:
+        return func.json_type(column, path) == "null"
+    return func.json_extract(column, path) == value
+
+
+def _sqlite_has_item(column: Any, path: str, item: Any) -> ColumnElement:
+    elements = func.json_each(column, path).table_valued("value")
+    return exists(select(elements.c.value).where(elements.c.value == item))
+
+
+def _sqlite_contains(column: Any, path: str, value: Any) -> ColumnElement:
+    """
+    `@>` of a JSON document: the objects contain the keys of `value`, the
+    arrays its items, compared as SQLite values.
+    """
+    if isinstance(value, dict):
+        if not value:
+            return func.json_type(column, path) == "object"
+        return and_(
+            *[
+                _sqlite_contains(column, path + sqlite_path([key])[1:], item)
+                for key, item in value.items()
+            ]
+        )
+    if isinstance(value, list):
+        if any(isinstance(item, (dict, list)) for item in value):
+            raise InvalidFilterValue(
+                str(column.name),
+                CONTAINS_JSON,
+                value,
+                "Arrays of objects or arrays are not supported on SQLite",
+            )
+        conditions = [_sqlite_has_item(column, path, item) for item in value]
+        return and_(func.json_type(column, path) == "array", *conditions)
+    return _sqlite_equal(column, path, value)
+
+
+def _sqlite_condition(column: Any, operator: str, value: Any) -> ColumnElement:
+    if operator == HAS_KEY:
+        return func.json_type(column, sqlite_path([value])).is_not(None)
+    if operator == PATH_EQUAL:
+        return _sqlite_equal(column, sqlite_path(value[0]), value[1])
+    if operator == ARRAY_OVERLAPS:
+        elements = func.json_each(column).table_valued("value")
+        return exists(select(elements.c.value).where(elements.c.value.in_(value)))
+    if operator == ARRAY_CONTAINS:
+        return _sqlite_contains(column, "$", list(value))
+    return _sqlite_contains(column, "$", value)
+
+
+def json_condition(dialect: str, column: Any, operator: str, value: Any) -> Any:
+    """
+    Condition of a JSON or ARRAY operator, raise `InvalidFilterValue` if the
+    value doesn't fit the operator.
+
+    - `has_key`: the document has the top level key
+    - `contains_json`: the document contains the JSON value (`@>`)
+    - `path_equal`: the value at a path, `a.b=value`
+    - `array_overlaps`, `array_contains`: the array has any or all the values
+    """
+    if dialect not in JSON_FILTER_DIALECTS:
+        raise InvalidFilterValue(
+            column.name, operator, value, f"Not supported on {dialect}"
+        )
+    if operator in ARRAY_OPERATORS:
+        value = parse_items(column, operator, value)
+    elif operator == PATH_EQUAL:
+        value = parse_path(column.name, operator, value)
+    elif operator == CONTAINS_JSON:
+        value = json_value(value)
+    elif not isinstance(value, str) or not value:
+        raise InvalidFilterValue(column.name, operator, value, "Expected a key")
+    if dialect == "sqlite":
+        return _sqlite_condition(column, operator, value)
+    return _postgresql_condition(column, operator, value)
@@ -0,0 +1,317 @@
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from threading import Lock
+import math
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+ROWS_BUCKETS = (0, 1, 10, 50, 100, 250, 500, 1000, 5000)
+BYTES_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(str(v))}"' for name, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Metric(ABC):
+    """
+    Base class of the in-process metrics, a metric holds one value (or one set
+    of buckets) per combination of label values.
+    """
+
+    type_: str = "untyped"
+
+    def __init__(self, name: str, description: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(labels)
+        self.lock = Lock()
+
+    def label_values(self, labels: Dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.label_names):
+            raise ValueError(
+                f"Metric {self.name} expects labels {self.label_names}, "
+                f"got {tuple(labels)}"
+            )
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    @abstractmethod
+    def samples(self) -> List[Tuple[str, LabelValues, float]]:
+        """
+        (sample name, label values, value) of each sample to render.
+        """
+
+    def render(self) -> str:
+        lines = [
+            f"# HELP {self.name} {_escape(self.description)}",
+            f"# TYPE {self.name} {self.type_}",
+        ]
+        for name, values, value in self.samples():
+            names = self.label_names
+            if name.endswith("_bucket"):
+                names = (*names, "le")
+            lines.append(
+                f"{name}{_format_labels(names, values)} {_format_value(value)}"
+            )
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    type_ = "counter"
+
+    def __init__(self, name: str, description: str, labels: Sequence[str] = ()):
+        super().__init__(name, description, labels)
+        self.values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self.label_values(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels: str) -> float:
+        return self.values.get(self.label_values(labels), 0)
+
+    def samples(self) -> List[Tuple[str, LabelValues, float]]:
+        with self.lock:
+            return [(self.name, key, value) for key, value in self.values.items()]
+
+
+class Gauge(Counter):
+    type_ = "gauge"
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self.label_values(labels)
+        with self.lock:
+            self.values[key] = value
+
+    def dec(self, amount: float = 1, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    type_ = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, description, labels)
+        self.buckets = tuple(sorted(buckets))
+        self.counts: Dict[LabelValues, List[int]] = {}
+        self.sums: Dict[LabelValues, float] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self.label_values(labels)
+        with self.lock:
+            counts = self.counts.setdefault(key, [0] * (len(self.buckets) + 1))
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            else:
+                counts[-1] += 1
+            self.sums[key] = self.sums.get(key, 0) + value
+
+    def count(self, **labels: str) -> int:
+        return sum(self.counts.get(self.label_values(labels), []))
+
+    def sum(self, **labels: str) -> float:
+        return self.sums.get(self.label_values(labels), 0)
+
+    def samples(self) -> List[Tuple[str, LabelValues, float]]:
+        samples: List[Tuple[str, LabelValues, float]] = []
+        with self.lock:
+            for key, counts in self.counts.items():
+                cumulative = 0
+                for bound, count in zip((*self.buckets, math.inf), counts):
+                    cumulative += count
+                    samples.append(
+                        (
+                            f"{self.name}_bucket",
+                            (*key, _format_value(bound)),
+                            cumulative,
+                        )
+                    )
+                samples.append((f"{self.name}_sum", key, self.sums[key]))
+                samples.append((f"{self.name}_count", key, cumulative))
+        return samples
+
+
+class MetricsRegistry:
+    """
+    In-process metrics registry, rendered with the Prometheus text exposition
+    format, no external service is needed.
+
+    Collectors are called before rendering, to refresh metrics that are read
+    from somewhere else (e.g. the schema registry cache counters).
+    """
+
+    metrics: Dict[str, Metric]
+    collectors: List[Callable[[], None]]
+
+    def __init__(self) -> None:
+        self.metrics = {}
+        self.collectors = []
+        self.lock = Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        with self.lock:
+            existing = self.metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric):
+                    raise ValueError(f"Metric {metric.name} is already registered")
+                return existing
+            self.metrics[metric.name] = metric
+            return metric
+
+    def counter(
+        self, name: str, description: str, labels: Sequence[str] = ()
+    ) -> Counter:
+        return self.register(Counter(name, description, labels))  # type: ignore
+
+    def gauge(self, name: str, description: str, labels: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, description, labels))  # type: ignore
+
+    def histogram(
+        self,
+        name: str,
+        description: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> Histogram:
+        return self.register(
+            Histogram(name, description, labels, buckets)
+        )  # type: ignore
+
+    def get(self, name: str) -> Optional[Metric]:
+        return self.metrics.get(name)
+
+    def add_collector(self, collector: Callable[[], None]) -> None:
+        if collector not in self.collectors:
+            self.collectors.append(collector)
+
+    def render(self) -> str:
+        for collector in self.collectors:
+            collector()
+        return "\n".join(metric.render() for metric in self.metrics.values()) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+
+class CRUDMetrics:
+    """
+    Metrics recorded by the `CRUDHandler`s, labeled by model and action.
+
+    Phases: `validation`, `sql_page` and `sql_count` (`get_many`), `sql` (the
+    statements of the rest of the actions), `commit`, `group_commit` (a `post`
+    waiting for its batch) and `serialization`.
+    """
+
+    def __init__(self, registry: MetricsRegistry = REGISTRY) -> None:
+        self.registry = registry
+        self.requests = registry.counter(
+            "sqlalchemy_api_requests_total",
+            "CRUD requests handled",
+            ["model", "action", "status"],
+        )
+        self.request_duration = registry.histogram(
+            "sqlalchemy_api_request_duration_seconds",
+            "Duration of the CRUD requests",
+            ["model", "action"],
+        )
+        self.phase_duration = registry.histogram(
+            "sqlalchemy_api_phase_duration_seconds",
+            "Duration of each phase of the CRUD requests",
+            ["model", "action", "phase"],
+        )
+        self.rows_returned = registry.histogram(
+            "sqlalchemy_api_rows_returned",
+            "Rows returned per request",
+            ["model", "action"],
+            buckets=ROWS_BUCKETS,
+        )
+        self.response_bytes = registry.histogram(
+            "sqlalchemy_api_response_bytes",
+            "Size of the response bodies",
+            ["model", "action"],
+            buckets=BYTES_BUCKETS,
+        )
+        self.pool_checkout = registry.histogram(
+            "sqlalchemy_api_pool_checkout_seconds",
+            "Time waiting for a connection from the pool",
+            ["model", "action"],
+        )
+        self.statement_cache = registry.counter(
+            "sqlalchemy_api_statement_cache_total",
+            "SQL compilation cache lookups",
+            ["model", "result"],
+        )
+        self.admission_queue = registry.gauge(
+            "sqlalchemy_api_admission_queue_depth",
+            "Requests waiting for an admission control slot",
+            ["model", "kind"],
+        )
+        self.shed_requests = registry.counter(
+            "sqlalchemy_api_shed_requests_total",
+            "Requests rejected by the admission control",
+            ["model", "kind", "reason"],
+        )
+        self.write_batch_size = registry.histogram(
+            "sqlalchemy_api_write_batch_size",
+            "Rows per group commit batch",
+            ["model"],
+            buckets=ROWS_BUCKETS,
+        )
+        self.write_batch_duration = registry.histogram(
+            "sqlalchemy_api_write_batch_duration_seconds",
+            "Duration of the group commit batches",
+            ["model"],
+        )
+        self.schema_cache = registry.gauge(
+            "sqlalchemy_api_schema_cache_lookups",
+            "Schema registry lookups since the process started",
+            ["result"],
+        )
+        registry.add_collector(self.collect_schema_cache)
+
+    def collect_schema_cache(self) -> None:
+        from sqlalchemy_api.pydantic_utils import schema_registry
+
+        self.schema_cache.set(schema_registry.hits, result="hit")
+        self.schema_cache.set(schema_registry.misses, result="miss")
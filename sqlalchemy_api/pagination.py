@@ -0,0 +1,31 @@
+from pydantic_core import to_jsonable_python
+from sqlalchemy_api.exceptions import InvalidCursor
+from typing import Any, List
+import base64
+import binascii
+import json
+
+
+def encode_cursor(values: List[Any]) -> str:
+    """
+    Opaque cursor with the sort key values of the last row of a page.
+    """
+    data = json.dumps(
+        values, default=to_jsonable_python, separators=(",", ":")
+    ).encode()
+    return base64.urlsafe_b64encode(data).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> List[Any]:
+    """
+    Sort key values of a cursor returned by `encode_cursor`, raise
+    `InvalidCursor` if it's malformed.
+    """
+    try:
+        data = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(data)
+    except (binascii.Error, ValueError):
+        raise InvalidCursor(cursor)
+    if not isinstance(values, list):
+        raise InvalidCursor(cursor)
+    return values
@@ -1,23 +1,63 @@
-from typing import Container, Type, List, Optional
-from pydantic import BaseModel, create_model, ConfigDict
+from typing import Container, Dict, Iterable, Tuple, Type, List, Optional, Union
+from pydantic import BaseModel, Field, create_model, ConfigDict
+from sqlalchemy import JSON
 from sqlalchemy.orm.properties import ColumnProperty
 from sqlalchemy.orm import RelationshipDirection, DeclarativeBase
 from sqlalchemy_api.utils import get_column_python_type
-from sqlalchemy.sql.elements import NamedColumn
+from sqlalchemy_api.exceptions import SchemaSnapshotError
+from sqlalchemy.sql.elements import ClauseElement, NamedColumn
 from sqlalchemy.inspection import inspect
 from typing_extensions import TypeAlias
+from weakref import WeakKeyDictionary
 import typing as t
+import hashlib
+import importlib
+import json
 
 
 class PageSchema(BaseModel):
     size: int
     number: int
+    cursor: Optional[str] = None
+    sort: Optional[str] = None
+    # Column and words of the `search` filter ordering the page by relevance
+    rank: Optional[t.Tuple[str, str]] = None
+
+
+class SearchSchema(BaseModel):
+    filter: t.Union[str, t.Dict[str, t.Any], None] = None
+    sort: Optional[str] = None
+    page: Optional[int] = Field(None, ge=1)
+    page_size: Optional[int] = Field(None, ge=1)
+    cursor: Optional[str] = None
+    rank: bool = False
+    facets: t.Union[str, t.List[str], None] = None
+
+
+class AggregateSchema(BaseModel):
+    # Labels of the group columns and the aggregates, the values of each row
+    columns: t.List[str]
+    rows: t.List[t.List[t.Any]]
+    truncated: bool = False
+
+
+class TreeSchema(BaseModel):
+    # Records with their `depth`, and their `children` if nested
+    records: t.List[t.Dict[str, t.Any]]
+    truncated: bool = False
+
+
+class FacetCount(BaseModel):
+    value: t.Any
+    count: int
 
 
 class PaginatedSchema(BaseModel):
     total: int
     page: int
     records: t.List[t.Any]
+    next_cursor: Optional[str] = None
+    facets: Optional[t.Dict[str, t.List[FacetCount]]] = None
 
 
 def paginate_schema(schema: TypeAlias) -> t.Type[BaseModel]:
@@ -29,6 +69,8 @@ def paginate_schema(schema: TypeAlias) -> t.Type[BaseModel]:
         total=(int, ...),
         page=(int, ...),
         records=(t.List[schema], ...),
+        next_cursor=(Optional[str], None),
+        facets=(Optional[t.Dict[str, t.List[FacetCount]]], None),
     )
     return pydantic_model
 
@@ -44,6 +86,7 @@ def sqlalchemy_to_pydantic(
     include_relations=False,
     exclude_relation_models: Optional[List[Type]] = None,
     all_optional=False,
+    registry: Optional["SchemaRegistry"] = None,
 ) -> Type[BaseModel]:
     """
     Convert a SQLAlchemy model to a Pydantic model
@@ -55,6 +98,8 @@ def sqlalchemy_to_pydantic(
     - `include_relations`: if True, include relations
     - `exclude_relation_models`: list of models to exclude from relations
     - `all_optional`: if True, all fields are optional
+    - `registry`: if given, relations reuse the base schema of the related model
+        from the registry instead of generating a new one
     """
     if exclude_relation_models is None:
         exclude_relation_models = []
@@ -72,6 +117,9 @@ def sqlalchemy_to_pydantic(
                     continue
                 column: NamedColumn = attr.columns[0]
                 python_type = get_column_python_type(column)
+                if isinstance(column.type, JSON):
+                    # Any JSON document, not only the objects of `dict`
+                    python_type = t.Any
                 if all_optional:
                     default = None
                 elif column.nullable:
@@ -86,11 +134,14 @@ def sqlalchemy_to_pydantic(
             if rela.entity.entity in exclude_relation_models:  # pragma: no cover
                 continue
 
-            child_model = sqlalchemy_to_pydantic(
-                rela.entity.entity,
-                schema_name=f"{schema_name}{rela.key}",
-                exclude_relation_models=exclude_relation_models,
-            )
+            if registry is not None:
+                child_model = registry.get(rela.entity.entity, "base")
+            else:
+                child_model = sqlalchemy_to_pydantic(
+                    rela.entity.entity,
+                    schema_name=f"{schema_name}{rela.key}",
+                    exclude_relation_models=exclude_relation_models,
+                )
             direction: RelationshipDirection = rela.direction
             if direction == RelationshipDirection.MANYTOONE:
                 fields[rela.key] = (Optional[child_model], None)  # type: ignore
@@ -112,41 +163,274 @@ def sqlalchemy_to_pydantic(
     return pydantic_model
 
 
+SchemaKey = Tuple[Type, str, Tuple[str, ...]]
+# Schemas of a model by (variant, excluded columns)
+ModelSchemas = Dict[Tuple[str, Tuple[str, ...]], Type[BaseModel]]
+
+SNAPSHOT_VERSION = 1
+
+
+def _type_path(type_: Type) -> str:
+    return f"{type_.__module__}:{type_.__qualname__}"
+
+
+def _import_type(path: str) -> Type:
+    module_name, qualname = path.split(":")
+    obj: t.Any = importlib.import_module(module_name)
+    for name in qualname.split("."):
+        obj = getattr(obj, name)
+    return obj
+
+
+def _default_repr(default: t.Any) -> Optional[str]:
+    if default is None:
+        return None
+    arg = getattr(default, "arg", default)
+    if isinstance(arg, ClauseElement):
+        return str(arg)
+    if callable(arg):
+        return f"{arg.__module__}:{arg.__qualname__}"
+    return repr(arg)
+
+
+def _model_fingerprint(key: SchemaKey) -> str:
+    """
+    Hash of what the schema of `key` is generated from: the variant, the
+    excluded columns, and the name, type, nullability, defaults and foreign keys
+    of the columns. Reading the table doesn't configure the mappers.
+    """
+    model, variant, exclude = key
+    columns = [
+        [
+            column.name,
+            repr(column.type),
+            column.nullable,
+            column.primary_key,
+            _default_repr(column.default),
+            _default_repr(column.server_default),
+            sorted(foreign_key.target_fullname for foreign_key in column.foreign_keys),
+        ]
+        for column in model.__table__.columns
+    ]
+    data = json.dumps([variant, list(exclude), columns])
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+class SchemaRegistry:
+    """
+    Cache of the pydantic schemas generated for SQLAlchemy models, keyed by
+    (model, variant, excluded columns).
+
+    Relations reuse the `base` schema of the related model, so a model shared by
+    many handlers is only generated once. The generated definitions can be dumped
+    to a snapshot file, a registry that loads it builds the schemas from the
+    snapshot instead of introspecting the mappers.
+
+    The models are held weakly, so the schemas of models created on the fly
+    (e.g. by automap or reflection) are freed with them.
+
+    Variants:
+    - `base`: columns of the model
+    - `relations`: columns and relations of the model
+    - `post`: columns, without the excluded ones (primary keys)
+    - `put`: columns, all optional, without the excluded ones (primary keys)
+    - `paginated`: paginated `relations` schema
+    """
+
+    schemas: "WeakKeyDictionary[Type, ModelSchemas]"
+    # Key name of each schema, for the schemas referenced by other schemas
+    names: "WeakKeyDictionary[Type[BaseModel], str]"
+    definitions: Dict[str, Dict]
+    hits: int
+    misses: int
+
+    def __init__(self) -> None:
+        self.schemas = WeakKeyDictionary()
+        self.names = WeakKeyDictionary()
+        self.definitions = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(
+        self, model: Type, variant: str, exclude: Optional[Iterable[str]] = None
+    ) -> Type[BaseModel]:
+        excluded = tuple(sorted(exclude or []))
+        key: SchemaKey = (model, variant, excluded)
+        schemas = self.schemas.setdefault(model, {})
+        if (variant, excluded) in schemas:
+            self.hits += 1
+            return schemas[variant, excluded]
+        self.misses += 1
+        name = self.key_name(key)
+        definition = self.definitions.get(name)
+        if definition and definition["fingerprint"] == _model_fingerprint(key):
+            schema = self.build_from_definition(definition)
+        else:
+            schema = self.build(key)
+        schemas[variant, excluded] = schema
+        self.names[schema] = name
+        return schema
+
+    def build(self, key: SchemaKey) -> Type[BaseModel]:
+        model, variant, exclude = key
+        if variant == "base":
+            return sqlalchemy_to_pydantic(model, exclude=exclude)
+        if variant == "relations":
+            return sqlalchemy_to_pydantic(
+                model,
+                exclude=exclude,
+                schema_name=f"{model.__name__}Relations",
+                include_relations=True,
+                registry=self,
+            )
+        if variant == "post":
+            return sqlalchemy_to_pydantic(
+                model, exclude=exclude, schema_name=f"{model.__name__}Create"
+            )
+        if variant == "put":
+            return sqlalchemy_to_pydantic(
+                model,
+                exclude=exclude,
+                schema_name=f"{model.__name__}Update",
+                all_optional=True,
+            )
+        if variant == "paginated":
+            return paginate_schema(self.get(model, "relations", exclude))
+        raise ValueError(f"Unknown schema variant '{variant}'")
+
+    def clear(self) -> None:
+        self.schemas.clear()
+        self.names.clear()
+        self.definitions.clear()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key_name(key: SchemaKey) -> str:
+        model, variant, exclude = key
+        return f"{_type_path(model)}|{variant}|{','.join(exclude)}"
+
+    def dump(self, path: str) -> None:
+        """
+        Write the definitions of the generated schemas to a JSON snapshot.
+        Schemas with types that can't be imported back (e.g. classes defined
+        inside functions) are left out and generated as usual on load.
+        """
+        definitions = {}
+        for model, schemas in list(self.schemas.items()):
+            for (variant, exclude), schema in schemas.items():
+                key = (model, variant, exclude)
+                try:
+                    definitions[self.key_name(key)] = self.definition(key, schema)
+                except SchemaSnapshotError:
+                    continue
+        with open(path, "w") as snapshot:
+            json.dump({"version": SNAPSHOT_VERSION, "schemas": definitions}, snapshot)
+
+    def load(self, path: str) -> None:
+        """
+        Load a snapshot written by `dump`. A definition is only used if the
+        columns of its model (types, nullability, defaults, foreign keys) didn't
+        change since the snapshot was taken.
+        """
+        with open(path) as snapshot:
+            data = json.load(snapshot)
+        if data.get("version") != SNAPSHOT_VERSION:
+            raise SchemaSnapshotError(
+                f"Unsupported schema snapshot version {data.get('version')}"
+            )
+        self.definitions.update(data["schemas"])
+
+    def definition(self, key: SchemaKey, schema: Type[BaseModel]) -> Dict:
+        model, variant, exclude = key
+        if "<locals>" in model.__qualname__:
+            raise SchemaSnapshotError(f"{model} can't be imported")
+        fields = {}
+        for name, field in schema.model_fields.items():
+            fields[name] = {
+                "annotation": self.encode_annotation(field.annotation),
+                "required": field.is_required(),
+            }
+        return {
+            "model": _type_path(model),
+            "variant": variant,
+            "exclude": list(exclude),
+            "name": schema.__name__,
+            "fingerprint": _model_fingerprint(key),
+            "fields": fields,
+        }
+
+    def encode_annotation(self, annotation: t.Any) -> Dict:
+        origin = t.get_origin(annotation)
+        args = t.get_args(annotation)
+        if origin is Union and len(args) == 2 and type(None) in args:
+            inner = args[0] if args[1] is type(None) else args[1]
+            return {"optional": self.encode_annotation(inner)}
+        if origin in (list, List):
+            return {"list": self.encode_annotation(args[0])}
+        if annotation in self.names:
+            return {"schema": self.names[annotation]}
+        if isinstance(annotation, type) and "<locals>" not in annotation.__qualname__:
+            return {"type": _type_path(annotation)}
+        raise SchemaSnapshotError(f"Can't snapshot annotation {annotation}")
+
+    def decode_annotation(self, annotation: Dict) -> t.Any:
+        if "optional" in annotation:
+            return Optional[self.decode_annotation(annotation["optional"])]
+        if "list" in annotation:
+            return List[self.decode_annotation(annotation["list"])]  # type: ignore
+        if "schema" in annotation:
+            model_path, variant, exclude = annotation["schema"].split("|")
+            return self.get(
+                _import_type(model_path),
+                variant,
+                [name for name in exclude.split(",") if name],
+            )
+        return _import_type(annotation["type"])
+
+    def build_from_definition(self, definition: Dict) -> Type[BaseModel]:
+        if definition["variant"] == "paginated":
+            records = definition["fields"]["records"]["annotation"]
+            return paginate_schema(self.decode_annotation(records["list"]))
+        fields = {}
+        for name, field in definition["fields"].items():
+            default = ... if field["required"] else None
+            fields[name] = (self.decode_annotation(field["annotation"]), default)
+        return create_model(
+            definition["name"], __config__=model_config, **fields  # type: ignore
+        )
+
+
+schema_registry = SchemaRegistry()
+
+
 class SchemaModel:
     model: Type[DeclarativeBase]
     primary_key_names: Optional[List[str]]
+    registry: SchemaRegistry
 
-    def __init__(self, model: Type[DeclarativeBase]):
+    def __init__(
+        self,
+        model: Type[DeclarativeBase],
+        registry: SchemaRegistry = schema_registry,
+    ):
         self.model = model
+        self.registry = registry
         self.primary_key_names = [
             primary_key.key for primary_key in inspect(self.model).primary_key
         ]
 
     def base(self) -> Type[BaseModel]:
-        return sqlalchemy_to_pydantic(self.model)
+        return self.registry.get(self.model, "base")
 
     def relations(self) -> Type[BaseModel]:
-        return sqlalchemy_to_pydantic(
-            self.model,
-            schema_name=f"{self.model.__name__}Relations",
-            include_relations=True,
-        )
+        return self.registry.get(self.model, "relations")
 
     def put(self) -> Type[BaseModel]:
-        return sqlalchemy_to_pydantic(
-            self.model,
-            exclude=self.primary_key_names,
-            schema_name=f"{self.model.__name__}Update",
-            all_optional=True,
-        )
+        return self.registry.get(self.model, "put", exclude=self.primary_key_names)
 
     def post(self) -> Type[BaseModel]:
-        return sqlalchemy_to_pydantic(
-            self.model,
-            exclude=self.primary_key_names,
-            schema_name=f"{self.model.__name__}Create",
-        )
+        return self.registry.get(self.model, "post", exclude=self.primary_key_names)
 
     def paginated(self) -> Type[BaseModel]:
-        paginated_model = paginate_schema(self.relations())
-        return paginated_model
+        return self.registry.get(self.model, "paginated")
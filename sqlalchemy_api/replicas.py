@@ -0,0 +1,135 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from sqlalchemy_api._types import ENGINE_TYPE
+from threading import Lock
+from typing import Dict, Iterator, List, Mapping, Optional, Sequence
+import time
+
+ROUND_ROBIN = "round_robin"
+LEAST_BUSY = "least_busy"
+BALANCING = [ROUND_ROBIN, LEAST_BUSY]
+
+current_client: ContextVar[Optional[str]] = ContextVar(
+    "sqlalchemy_api_current_client", default=None
+)
+
+
+@contextmanager
+def client(token: Optional[str]) -> Iterator[None]:
+    """
+    Attribute the requests handled inside the block to a client, used by the
+    read-your-writes stickiness of `ReplicaRouter`.
+    """
+    reset_token = current_client.set(token)
+    try:
+        yield
+    finally:
+        current_client.reset(reset_token)
+
+
+class ReplicaRouter:
+    """
+    Routes the reads of the `CRUDHandler`s (`get`, `get_many` and its count) to
+    reader engines, the writes keep going to the handler `engine`.
+
+    With a `stickiness` window, the reads of a client that wrote less than
+    `stickiness` seconds ago go to the writer, so it reads its own writes
+    despite the replication lag. Clients are identified by the `token_header`
+    header or the `token_cookie` cookie.
+
+    Params:
+    - `readers`: reader engines
+    - `balancing`: `round_robin` or `least_busy` (fewest reads in flight)
+    - `stickiness`: seconds the reads of a client go to the writer after its
+        writes, 0 to disable
+    - `token_header`: header with the client token
+    - `token_cookie`: cookie with the client token
+    """
+
+    readers: List[ENGINE_TYPE]
+    in_flight: List[int]
+    last_writes: Dict[str, float]
+
+    def __init__(
+        self,
+        readers: Sequence[ENGINE_TYPE],
+        balancing: str = ROUND_ROBIN,
+        stickiness: float = 0,
+        token_header: str = "x-client-token",
+        token_cookie: str = "client_token",
+    ) -> None:
+        if not readers:
+            raise ValueError("At least one reader engine is required")
+        if balancing not in BALANCING:
+            raise ValueError(
+                f"Invalid balancing '{balancing}', valid options are {BALANCING}"
+            )
+        self.readers = list(readers)
+        self.balancing = balancing
+        self.stickiness = stickiness
+        self.token_header = token_header
+        self.token_cookie = token_cookie
+        self.in_flight = [0] * len(self.readers)
+        self.next_reader = 0
+        self.last_writes = {}
+        self.lock = Lock()
+
+    def client_token(
+        self, headers: Mapping[str, str], cookies: Mapping[str, str]
+    ) -> Optional[str]:
+        return headers.get(self.token_header) or cookies.get(self.token_cookie)
+
+    def choose(self) -> int:
+        """
+        Index of the reader for the next read.
+        """
+        with self.lock:
+            if self.balancing == LEAST_BUSY:
+                # Ties are broken round robin, starting after the last choice
+                order = [
+                    (self.next_reader + offset) % len(self.readers)
+                    for offset in range(len(self.readers))
+                ]
+                index = min(order, key=lambda reader: self.in_flight[reader])
+            else:
+                index = self.next_reader
+            self.next_reader = (index + 1) % len(self.readers)
+            self.in_flight[index] += 1
+            return index
+
+    @contextmanager
+    def reader(self) -> Iterator[int]:
+        """
+        Choose a reader, counted as busy until the block exits.
+        """
+        index = self.choose()
+        try:
+            yield index
+        finally:
+            with self.lock:
+                self.in_flight[index] -= 1
+
+    def record_write(self) -> None:
+        token = current_client.get()
+        if not self.stickiness or token is None:
+            return
+        now = time.monotonic()
+        with self.lock:
+            self.last_writes[token] = now
+            expired = [
+                client
+                for client, written in self.last_writes.items()
+                if now - written > self.stickiness
+            ]
+            for expired_client in expired:
+                del self.last_writes[expired_client]
+
+    def is_sticky(self) -> bool:
+        """
+        Whether the reads of the current client must go to the writer.
+        """
+        token = current_client.get()
+        if not self.stickiness or token is None:
+            return False
+        written = self.last_writes.get(token)
+        return written is not None and time.monotonic() - written <= self.stickiness
@@ -6,6 +6,7 @@ class GenericResponse(BaseModel):
     content: Union[Dict, List, str, bytes]
     status_code: int
     media_type: str
+    headers: Optional[Dict[str, str]] = None
 
 
 class RowIDResponse(BaseModel):
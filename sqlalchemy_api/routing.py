@@ -0,0 +1,156 @@
+from contextlib import contextmanager
+from sqlalchemy.orm import Session, sessionmaker as sqlsessionmaker
+from sqlalchemy_api._types import ENGINE_TYPE
+from sqlalchemy_api.replicas import ReplicaRouter
+from sqlalchemy_api.sharding import ShardMap
+from typing import Any, Callable, ContextManager, Iterator, List, Optional
+
+SessionmakerFactory = Callable[[ENGINE_TYPE], sqlsessionmaker[Session]]
+
+
+class SessionRouting:
+    """
+    Databases the sessions of a `CRUDHandler` go to, chosen once when the
+    handler is built: a single database, replicas for the reads or shards.
+
+    The base class is the single database, every session is on `engine`.
+
+    Params:
+    - `engine`: SQLAlchemy engine, the writer with replicas
+    - `make_sessionmaker`: builds the sessionmaker of an engine
+    """
+
+    sharded: bool = False
+
+    def __init__(
+        self, engine: ENGINE_TYPE, make_sessionmaker: SessionmakerFactory
+    ) -> None:
+        self.engine = engine
+        self.sessionmaker = make_sessionmaker(engine)
+
+    def read_session(self) -> ContextManager[Session]:
+        return self.sessionmaker()
+
+    def write_sessionmaker(
+        self, shard: Optional[str] = None
+    ) -> sqlsessionmaker[Session]:
+        return self.sessionmaker
+
+    def shard_session(self, name: str) -> ContextManager[Session]:
+        raise ValueError(f"Unknown shard '{name}'")
+
+    def row_sessions(
+        self, row_id: Any, read: bool = False
+    ) -> Iterator[ContextManager[Session]]:
+        """
+        Sessions of the databases that may hold the row.
+        """
+        yield self.read_session() if read else self.sessionmaker()
+
+    def can_join(self, engine: Any) -> bool:
+        """
+        Whether the requests can run in a batch transaction on `engine`.
+        """
+        return engine is self.engine
+
+    def record_write(self) -> None:
+        ...
+
+
+class ReplicaRouting(SessionRouting):
+    """
+    The reads go to the reader engines of the `replicas`, unless the current
+    client wrote within the stickiness window, the writes go to `engine`.
+    """
+
+    def __init__(
+        self,
+        engine: ENGINE_TYPE,
+        make_sessionmaker: SessionmakerFactory,
+        replicas: ReplicaRouter,
+    ) -> None:
+        super().__init__(engine, make_sessionmaker)
+        self.replicas = replicas
+        self.read_sessionmakers: List[sqlsessionmaker[Session]] = [
+            make_sessionmaker(reader) for reader in replicas.readers
+        ]
+
+    @contextmanager
+    def read_session(self) -> Iterator[Session]:  # type: ignore[override]
+        if self.replicas.is_sticky():
+            with self.sessionmaker() as session:
+                yield session
+            return
+        with self.replicas.reader() as reader:
+            with self.read_sessionmakers[reader]() as session:
+                yield session
+
+    def record_write(self) -> None:
+        self.replicas.record_write()
+
+
+class ShardRouting(SessionRouting):
+    """
+    The rows are partitioned across the engines of the `shards`. A row goes
+    to the shard of its key, when the primary key is the shard key the row
+    operations go to a single shard and otherwise they look in every shard.
+
+    Shards don't join batch transactions, they would span several databases.
+    """
+
+    sharded = True
+
+    def __init__(
+        self,
+        engine: ENGINE_TYPE,
+        make_sessionmaker: SessionmakerFactory,
+        shards: ShardMap,
+        primary_key: str,
+    ) -> None:
+        super().__init__(engine, make_sessionmaker)
+        self.shards = shards
+        self.primary_key = primary_key
+        self.shard_sessionmakers = {
+            name: make_sessionmaker(shard) for name, shard in shards.engines.items()
+        }
+
+    def shard_session(self, name: str) -> ContextManager[Session]:
+        return self.shard_sessionmakers[name]()
+
+    def write_sessionmaker(
+        self, shard: Optional[str] = None
+    ) -> sqlsessionmaker[Session]:
+        assert shard is not None
+        return self.shard_sessionmakers[shard]
+
+    def row_sessions(
+        self, row_id: Any, read: bool = False
+    ) -> Iterator[ContextManager[Session]]:
+        if self.shards.key == self.primary_key:
+            yield self.shard_session(self.shards.shard_for(row_id))
+            return
+        for name in self.shards.names:
+            yield self.shard_session(name)
+
+    def can_join(self, engine: Any) -> bool:
+        return False
+
+
+def session_routing(
+    engine: ENGINE_TYPE,
+    make_sessionmaker: SessionmakerFactory,
+    replicas: Optional[ReplicaRouter] = None,
+    shards: Optional[ShardMap] = None,
+    primary_key: str = "id",
+) -> SessionRouting:
+    """
+    Session routing of a handler for its `replicas` or `shards`, which can't be
+    combined.
+    """
+    if replicas is not None and shards is not None:
+        raise ValueError("`replicas` and `shards` can't be combined")
+    if replicas is not None:
+        return ReplicaRouting(engine, make_sessionmaker, replicas)
+    if shards is not None:
+        return ShardRouting(engine, make_sessionmaker, shards, primary_key)
+    return SessionRouting(engine, make_sessionmaker)
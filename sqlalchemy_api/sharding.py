@@ -0,0 +1,55 @@
+from sqlalchemy_api._types import ENGINE_TYPE
+from typing import Any, Callable, Dict, List, Mapping, Optional
+import zlib
+
+
+def hash_shard(names: List[str]) -> Callable[[Any], str]:
+    """
+    Stable hash partitioning of the shard key values over the shard names,
+    the same value goes to the same shard across processes and restarts.
+    """
+
+    def shard_for(value: Any) -> str:
+        return names[zlib.crc32(str(value).encode()) % len(names)]
+
+    return shard_for
+
+
+class ShardMap:
+    """
+    Partitions the rows of a model across several databases by a shard key
+    column.
+
+    When the shard key is the primary key, `get`, `put` and `delete` go to a
+    single shard, otherwise they look for the row in every shard. The primary
+    keys must be unique across the shards.
+
+    Params:
+    - `shards`: engine of each shard by name
+    - `key`: name of the shard key column
+    - `shard_for`: returns the shard name of a shard key value, a stable hash of
+        the value by default
+    """
+
+    engines: Dict[str, ENGINE_TYPE]
+    names: List[str]
+
+    def __init__(
+        self,
+        shards: Mapping[str, ENGINE_TYPE],
+        key: str,
+        shard_for: Optional[Callable[[Any], str]] = None,
+    ) -> None:
+        if not shards:
+            raise ValueError("At least one shard is required")
+        self.engines = dict(shards)
+        self.names = sorted(self.engines)
+        self.key = key
+        self.shard_for = shard_for or hash_shard(self.names)
+
+    @property
+    def engine(self) -> ENGINE_TYPE:
+        """
+        Engine of the first shard, for the APIs that need a single engine.
+        """
+        return self.engines[self.names[0]]
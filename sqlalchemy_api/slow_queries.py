@@ -0,0 +1,132 @@
+from collections import deque
+from datetime import datetime, timezone
+from pydantic import BaseModel, Field
+from sqlalchemy_api.filtering import Filter, NULL_OPERATORS
+from threading import Lock
+from typing import Any, Deque, Dict, Iterable, List, Optional, Tuple
+
+
+class SlowStatement(BaseModel):
+    sql: str
+    duration: float
+
+
+class SlowQuery(BaseModel):
+    """
+    Request whose SQL time exceeded the threshold of a `SlowQueryLog`.
+
+    The filter values are never stored, only the shape of the query: the
+    (column, operator) pairs, the page size and the sort. The statements are
+    stored as rendered by the dialect, with placeholders instead of values.
+    """
+
+    model: str
+    action: str
+    filters: List[Tuple[str, str]] = Field(default_factory=list)
+    page_size: Optional[int] = None
+    sort: Optional[str] = None
+    statements: List[SlowStatement] = Field(default_factory=list)
+    sql_time: float
+    total_time: float
+    timings: Dict[str, float] = Field(default_factory=dict)
+    timestamp: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+    @property
+    def shape(self) -> Tuple:
+        return (self.model, self.action, tuple(self.filters), self.sort)
+
+
+class SlowQueryShape(BaseModel):
+    model: str
+    action: str
+    filters: List[Tuple[str, str]]
+    sort: Optional[str] = None
+    count: int
+    sql_time: float
+    max_sql_time: float
+
+
+class SlowQueryLog:
+    """
+    Bounded in-memory log of the slow requests, once `size` entries are logged
+    the oldest are dropped.
+
+    Params:
+    - `threshold`: seconds of SQL time from which a request is logged
+    - `size`: max number of entries kept
+    """
+
+    buffer: Deque[SlowQuery]
+
+    def __init__(self, threshold: float = 0.5, size: int = 100) -> None:
+        self.threshold = threshold
+        self.size = size
+        self.buffer = deque(maxlen=size)
+        self.lock = Lock()
+
+    def is_slow(self, sql_time: float) -> bool:
+        return sql_time >= self.threshold
+
+    def record(self, entry: SlowQuery) -> None:
+        with self.lock:
+            self.buffer.append(entry)
+
+    def entries(self, model: Optional[str] = None) -> List[SlowQuery]:
+        """
+        Logged entries, newest first.
+        """
+        with self.lock:
+            entries = list(reversed(self.buffer))
+        if model is not None:
+            entries = [entry for entry in entries if entry.model == model]
+        return entries
+
+    def shapes(self, model: Optional[str] = None) -> List[SlowQueryShape]:
+        """
+        Logged entries grouped by query shape, the most expensive first.
+        """
+        shapes: Dict[Tuple, SlowQueryShape] = {}
+        for entry in self.entries(model):
+            shape = shapes.get(entry.shape)
+            if shape is None:
+                shapes[entry.shape] = SlowQueryShape(
+                    model=entry.model,
+                    action=entry.action,
+                    filters=entry.filters,
+                    sort=entry.sort,
+                    count=1,
+                    sql_time=entry.sql_time,
+                    max_sql_time=entry.sql_time,
+                )
+                continue
+            shape.count += 1
+            shape.sql_time += entry.sql_time
+            shape.max_sql_time = max(shape.max_sql_time, entry.sql_time)
+        return sorted(shapes.values(), key=lambda shape: shape.sql_time, reverse=True)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.buffer.clear()
+
+    def to_dict(self, model: Optional[str] = None) -> Dict[str, Any]:
+        return {
+            "threshold": self.threshold,
+            "size": self.size,
+            "shapes": [shape.model_dump(mode="json") for shape in self.shapes(model)],
+            "entries": [entry.model_dump(mode="json") for entry in self.entries(model)],
+        }
+
+
+def filter_shape(
+    filters: Iterable[Filter], query_params: Dict
+) -> List[Tuple[str, str]]:
+    """
+    (column, operator) pairs of the filters applied by the query params, without
+    their values.
+    """
+    shape = []
+    for filter in filters:
+        operator = query_params.get(filter.operator_name, "equal")
+        if filter.name in query_params or operator in NULL_OPERATORS:
+            shape.append((filter.name, operator))
+    return shape
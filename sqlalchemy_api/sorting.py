@@ -0,0 +1,123 @@
+from functools import total_ordering
+from sqlalchemy import and_, false, or_
+from sqlalchemy.sql.elements import ColumnElement
+from sqlalchemy_api.exceptions import InvalidSort
+from typing import Any, Callable, List, Mapping, Optional, Sequence, Tuple
+
+# (column name, descending)
+SortKey = Tuple[str, bool]
+
+
+def parse_sort(
+    value: Optional[str], columns: Sequence[str], primary_key: str
+) -> List[SortKey]:
+    """
+    Sort keys of a `sort` query param, e.g. `-created_at,id`, a leading `-`
+    sorts descending. The primary key is appended as the tiebreaker, so the
+    order is total and the pages are stable.
+    """
+    keys: List[SortKey] = []
+    for item in (value or "").split(","):
+        item = item.strip()
+        if not item:
+            continue
+        descending = item.startswith("-")
+        name = item[1:] if descending else item
+        if name not in columns:
+            raise InvalidSort(name, list(columns))
+        if name not in [key for key, _ in keys]:
+            keys.append((name, descending))
+    if primary_key not in [key for key, _ in keys]:
+        keys.append((primary_key, False))
+    return keys
+
+
+def order_by(keys: Sequence[SortKey], columns: Mapping[str, Any]) -> List[Any]:
+    """
+    `ORDER BY` clauses of the sort keys. NULLs sort as the greatest value: last
+    ascending and first descending, as PostgreSQL does by default.
+    """
+    clauses: List[Any] = []
+    for name, descending in keys:
+        column = columns[name]
+        if descending:
+            clause = column.desc()
+            clauses.append(clause.nulls_first() if _nullable(column) else clause)
+        else:
+            clause = column.asc()
+            clauses.append(clause.nulls_last() if _nullable(column) else clause)
+    return clauses
+
+
+def _nullable(column: Any) -> bool:
+    # Expressions other than columns, e.g. computed fields, may be NULL
+    return getattr(column, "nullable", True)
+
+
+def _equal(column: Any, value: Any) -> ColumnElement:
+    return column.is_(None) if value is None else column == value
+
+
+def _beyond(column: Any, value: Any, descending: bool) -> Optional[ColumnElement]:
+    if descending:
+        return column.is_not(None) if value is None else column < value
+    if value is None:
+        # NULLs are the greatest values, nothing comes after them
+        return None
+    return (
+        or_(column > value, column.is_(None)) if _nullable(column) else column > value
+    )
+
+
+def after(
+    keys: Sequence[SortKey], columns: Mapping[str, Any], values: Sequence[Any]
+) -> ColumnElement:
+    """
+    Keyset condition of the rows that come after the row with the sort key
+    `values`, in the order of `order_by`.
+    """
+    conditions = []
+    for index, (name, descending) in enumerate(keys):
+        beyond = _beyond(columns[name], values[index], descending)
+        if beyond is None:
+            continue
+        previous = [
+            _equal(columns[previous_name], values[position])
+            for position, (previous_name, _) in enumerate(keys[:index])
+        ]
+        conditions.append(and_(*previous, beyond))
+    return or_(*conditions) if conditions else false()
+
+
+@total_ordering
+class SortValue:
+    """
+    Value of a sort key of a row, compared like the database does in
+    `order_by`, to merge the rows of several queries.
+    """
+
+    def __init__(self, value: Any, descending: bool) -> None:
+        self.value = value
+        self.descending = descending
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, SortValue) and self.value == other.value
+
+    def __lt__(self, other: "SortValue") -> bool:
+        if self.value == other.value:
+            return False
+        if self.value is None or other.value is None:
+            # NULL is the greatest value
+            less = other.value is None
+        else:
+            less = self.value < other.value
+        return not less if self.descending else less
+
+
+def sort_key(keys: Sequence[SortKey]) -> Callable[[Any], Tuple[SortValue, ...]]:
+    def key(record: Any) -> Tuple[SortValue, ...]:
+        return tuple(
+            SortValue(getattr(record, name), descending) for name, descending in keys
+        )
+
+    return key
@@ -0,0 +1,178 @@
+from sqlalchemy import false, func, literal_column, select
+from sqlalchemy.sql import column as sql_column, table as sql_table
+from sqlalchemy.sql.elements import ColumnElement
+from typing import Any, List, Optional
+import re
+
+SEARCH = "search"
+ICONTAINS = "icontains"
+TEXT_SEARCH_OPERATORS = [SEARCH, ICONTAINS]
+TEXT_SEARCH_DIALECTS = ["postgresql", "sqlite"]
+
+_NAME = re.compile(r"^\w+$")
+
+
+class TextSearch:
+    """
+    Declares a text column searchable with the `search` (full-text) and
+    `icontains` (case insensitive substring) operators, and the indexes behind
+    them.
+
+    Params:
+    - `config`: PostgreSQL text search configuration of `to_tsvector` and
+        `plainto_tsquery`
+    - `tsvector`: PostgreSQL `tsvector` column matched by `search` instead of
+        `to_tsvector(config, column)`, e.g. a stored generated column with a GIN
+        index. Without it, a GIN index on `to_tsvector(config, column)` serves
+        `search`
+    - `fts_table`: SQLite FTS5 table indexing the column, whose `rowid` is the
+        primary key of the model, required for `search` on SQLite
+    - `trigram`: the column has a `pg_trgm` GIN index (`gin_trgm_ops`), which
+        serves `icontains`
+    """
+
+    def __init__(
+        self,
+        config: str = "simple",
+        tsvector: Optional[str] = None,
+        fts_table: Optional[str] = None,
+        trigram: bool = False,
+    ) -> None:
+        for name in [config, tsvector, fts_table]:
+            if name is not None and not _NAME.match(name):
+                raise ValueError(f"Invalid name '{name}'")
+        self.config = config
+        self.tsvector = tsvector
+        self.fts_table = fts_table
+        self.trigram = trigram
+
+    def indexed_operators(self, dialect: str) -> List[str]:
+        """
+        Operators served by an index on the `dialect`.
+        """
+        if dialect == "sqlite":
+            return [SEARCH] if self.fts_table is not None else []
+        return [SEARCH, ICONTAINS] if self.trigram else [SEARCH]
+
+    def check(self, column: str, dialect: str) -> None:
+        if dialect not in TEXT_SEARCH_DIALECTS:
+            raise ValueError(f"Text search is not supported on {dialect}")
+        if dialect == "sqlite" and self.fts_table is None:
+            raise ValueError(f"Text search of '{column}' on SQLite needs a `fts_table`")
+
+
+def fts5_query(value: str) -> str:
+    """
+    FTS5 query matching the rows with all the words of `value`, each quoted so
+    the FTS5 query syntax doesn't apply, like `plainto_tsquery`.
+    """
+    return " ".join('"' + word.replace('"', '""') + '"' for word in value.split())
+
+
+def escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def icontains(column: Any, value: str) -> ColumnElement:
+    """
+    `column ILIKE '%value%'`, served by a `pg_trgm` index on PostgreSQL.
+    """
+    return column.ilike(f"%{escape_like(value)}%", escape="\\")
+
+
+def _tsvector(search: TextSearch, column: Any) -> ColumnElement:
+    if search.tsvector is not None:
+        return column.table.c[search.tsvector]
+    return func.to_tsvector(_config(search), column)
+
+
+def _tsquery(search: TextSearch, value: str) -> ColumnElement:
+    return func.plainto_tsquery(_config(search), value)
+
+
+def _config(search: TextSearch) -> Any:
+    # Inlined, so `to_tsvector` matches the expression of an index on it
+    return literal_column(f"'{search.config}'::regconfig")
+
+
+def _fts5_match(search: TextSearch, column: Any, value: str):
+    assert search.fts_table is not None
+    fts_table = sql_table(
+        search.fts_table,
+        sql_column("rowid"),
+        sql_column("rank"),
+        sql_column(column.name),
+    )
+    return fts_table, fts_table.c[column.name].match(fts5_query(value))
+
+
+def search_condition(
+    dialect: str,
+    search: TextSearch,
+    column: Any,
+    primary_key: Any,
+    value: str,
+) -> ColumnElement:
+    """
+    Condition of the rows whose `column` has all the words of `value`.
+    """
+    if not value.split():
+        return false()
+    if dialect == "sqlite":
+        fts_table, match = _fts5_match(search, column, value)
+        return primary_key.in_(select(fts_table.c.rowid).where(match))
+    return _tsvector(search, column).bool_op("@@")(_tsquery(search, value))
+
+
+def search_rank(
+    dialect: str,
+    search: TextSearch,
+    column: Any,
+    primary_key: Any,
+    value: str,
+) -> ColumnElement:
+    """
+    Relevance order of the rows matching `value`, the most relevant first.
+    """
+    if dialect == "sqlite":
+        # FTS5 `rank` is the bm25 score, lower is more relevant
+        fts_table, match = _fts5_match(search, column, value)
+        return (
+            select(fts_table.c.rank)
+            .where(match, fts_table.c.rowid == primary_key)
+            .scalar_subquery()
+            .asc()
+        )
+    return func.ts_rank(_tsvector(search, column), _tsquery(search, value)).desc()
+
+
+def fts5_statements(
+    table: str, primary_key: str, columns: List[str], fts_table: str
+) -> List[str]:
+    """
+    Statements creating an external content FTS5 table indexing the `columns` of
+    `table`, and the triggers keeping it in sync. The names are written in the
+    statements as is, so they must be plain identifiers.
+    """
+    for name in [table, primary_key, *columns, fts_table]:
+        if not _NAME.match(name):
+            raise ValueError(f"Invalid name '{name}'")
+    names = ", ".join(columns)
+    new = ", ".join(f"new.{column}" for column in columns)
+    old = ", ".join(f"old.{column}" for column in columns)
+    return [
+        f"CREATE VIRTUAL TABLE {fts_table} USING fts5({names}, "
+        f"content='{table}', content_rowid='{primary_key}')",
+        f"CREATE TRIGGER {fts_table}_insert AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO {fts_table}(rowid, {names}) VALUES (new.{primary_key}, {new}); "
+        "END",
+        f"CREATE TRIGGER {fts_table}_delete AFTER DELETE ON {table} BEGIN "
+        f"INSERT INTO {fts_table}({fts_table}, rowid, {names}) "
+        f"VALUES ('delete', old.{primary_key}, {old}); END",
+        f"CREATE TRIGGER {fts_table}_update AFTER UPDATE ON {table} BEGIN "
+        f"INSERT INTO {fts_table}({fts_table}, rowid, {names}) "
+        f"VALUES ('delete', old.{primary_key}, {old}); "
+        f"INSERT INTO {fts_table}(rowid, {names}) VALUES (new.{primary_key}, {new}); "
+        "END",
+        f"INSERT INTO {fts_table}({fts_table}) VALUES ('rebuild')",
+    ]
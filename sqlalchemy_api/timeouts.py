@@ -0,0 +1,88 @@
+from contextlib import contextmanager
+from functools import partial
+from sqlalchemy import event
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import DBAPIError, OperationalError
+from sqlalchemy_api.exceptions import StatementTimeout
+from typing import Any, Dict, Iterator, Optional
+import time
+
+TIMEOUT_KEY = "sqlalchemy_api_statement_timeout"
+DEADLINE_KEY = "sqlalchemy_api_deadline"
+# Number of SQLite virtual machine instructions between deadline checks
+SQLITE_PROGRESS_STEPS = 1000
+POSTGRES_QUERY_CANCELED = "57014"
+
+
+def _sqlite_progress_handler(info: Dict[str, Any]) -> int:
+    deadline = info.get(DEADLINE_KEY)
+    # A non zero value interrupts the statement
+    return int(deadline is not None and time.monotonic() > deadline)
+
+
+def _set_deadline(conn, cursor, statement, parameters, context, many) -> None:
+    timeout = conn.info.get(TIMEOUT_KEY)
+    if timeout is not None:
+        conn.info[DEADLINE_KEY] = time.monotonic() + timeout
+
+
+def _clear_timeout(conn, *args) -> None:
+    if conn.info.pop(TIMEOUT_KEY, None) is not None:
+        conn.info.pop(DEADLINE_KEY, None)
+        conn.connection.dbapi_connection.set_progress_handler(None, 0)
+
+
+def _install_sqlite_events(engine: Engine) -> None:
+    if not event.contains(engine, "before_cursor_execute", _set_deadline):
+        event.listen(engine, "before_cursor_execute", _set_deadline)
+        # The timeout lasts until the end of the transaction, like `SET LOCAL`
+        event.listen(engine, "commit", _clear_timeout)
+        event.listen(engine, "rollback", _clear_timeout)
+
+
+def apply_statement_timeout(connection: Connection, timeout: float) -> None:
+    """
+    Limit the duration of each statement of the current transaction of a
+    connection: `SET LOCAL statement_timeout` on PostgreSQL, a progress handler
+    interrupting the statements that run past the timeout on SQLite. Other
+    dialects are left untouched.
+    """
+    dialect = connection.dialect.name
+    if dialect == "postgresql":
+        connection.exec_driver_sql(
+            f"SET LOCAL statement_timeout = {max(int(timeout * 1000), 1)}"
+        )
+    elif dialect == "sqlite":
+        dbapi_connection = connection.connection.dbapi_connection
+        set_progress_handler = getattr(dbapi_connection, "set_progress_handler", None)
+        if set_progress_handler is None:
+            # e.g. aiosqlite, that runs the statements in its own thread
+            return
+        _install_sqlite_events(connection.engine)
+        connection.info[TIMEOUT_KEY] = timeout
+        set_progress_handler(
+            partial(_sqlite_progress_handler, connection.info), SQLITE_PROGRESS_STEPS
+        )
+
+
+def is_statement_timeout(exc: DBAPIError) -> bool:
+    """
+    Whether a database error was raised by a statement timeout.
+    """
+    code = getattr(exc.orig, "pgcode", None) or getattr(exc.orig, "sqlstate", None)
+    if code == POSTGRES_QUERY_CANCELED:
+        return True
+    return isinstance(exc, OperationalError) and "interrupted" in str(exc.orig)
+
+
+@contextmanager
+def raise_statement_timeout(timeout: Optional[float]) -> Iterator[None]:
+    """
+    Raise `StatementTimeout` instead of the database errors caused by a timeout.
+    """
+    try:
+        yield
+    except DBAPIError as exc:
+        if timeout is not None and is_statement_timeout(exc):
+            raise StatementTimeout(timeout) from exc
+        raise
@@ -0,0 +1,123 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional, Protocol
+import time
+
+
+class TracerProtocol(Protocol):
+    """
+    Subset of the OpenTelemetry `Tracer` interface used by the `CRUDHandler`, an
+    OpenTelemetry tracer (`opentelemetry.trace.get_tracer(...)`) can be used as
+    is, `InMemoryTracer` implements it without any dependency.
+    """
+
+    def start_span(self, name: str, attributes: Optional[Dict] = None) -> Any:
+        ...
+
+    def start_as_current_span(
+        self, name: str, attributes: Optional[Dict] = None
+    ) -> Any:
+        ...
+
+
+class Span:
+    """
+    Finished or in progress span of an `InMemoryTracer`, times are in
+    nanoseconds like OpenTelemetry.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        tracer: "InMemoryTracer",
+        attributes: Optional[Dict] = None,
+        parent: Optional["Span"] = None,
+    ) -> None:
+        self.name = name
+        self.tracer = tracer
+        self.attributes: Dict[str, Any] = dict(attributes or {})
+        self.parent = parent
+        self.events: List[Dict[str, Any]] = []
+        self.start_time = time.perf_counter_ns()
+        self.end_time: Optional[int] = None
+
+    @property
+    def duration(self) -> Optional[float]:
+        """Duration in seconds, None if the span didn't end"""
+        if self.end_time is None:
+            return None
+        return (self.end_time - self.start_time) / 1e9
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def record_exception(self, exception: BaseException) -> None:
+        self.events.append(
+            {
+                "name": "exception",
+                "exception.type": type(exception).__name__,
+                "exception.message": str(exception),
+            }
+        )
+
+    def is_recording(self) -> bool:
+        return self.end_time is None
+
+    def end(self) -> None:
+        if self.end_time is None:
+            self.end_time = time.perf_counter_ns()
+            self.tracer.exporter.export(self)
+
+    def __repr__(self) -> str:
+        return f"<Span {self.name} {self.duration}>"
+
+
+class InMemorySpanExporter:
+    """
+    Keeps the finished spans in memory, useful for tests.
+    """
+
+    def __init__(self) -> None:
+        self.spans: List[Span] = []
+
+    def export(self, span: Span) -> None:
+        self.spans.append(span)
+
+    def get_finished_spans(self) -> List[Span]:
+        return list(self.spans)
+
+    def clear(self) -> None:
+        self.spans.clear()
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar(
+    "sqlalchemy_api_current_span", default=None
+)
+
+
+class InMemoryTracer:
+    """
+    Minimal tracer following the OpenTelemetry interface, spans are parented
+    to the current span and exported to `exporter` when they end.
+    """
+
+    def __init__(self, exporter: Optional[InMemorySpanExporter] = None) -> None:
+        self.exporter = exporter or InMemorySpanExporter()
+
+    def start_span(self, name: str, attributes: Optional[Dict] = None) -> Span:
+        return Span(name, self, attributes=attributes, parent=_current_span.get())
+
+    @contextmanager
+    def start_as_current_span(
+        self, name: str, attributes: Optional[Dict] = None
+    ) -> Iterator[Span]:
+        span = self.start_span(name, attributes=attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as exc:
+            span.record_exception(exc)
+            raise
+        finally:
+            _current_span.reset(token)
+            span.end()
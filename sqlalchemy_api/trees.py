@@ -0,0 +1,82 @@
+from sqlalchemy import Integer, Select, literal_column, select
+from typing import Any, Dict, List, Optional
+
+DEFAULT_MAX_DEPTH = 32
+
+
+def parent_column(table: Any) -> Optional[str]:
+    """
+    Column of a self referential model referencing the primary key of the
+    parent row, if the table has a single one.
+    """
+    columns = [
+        foreign_key.parent.name
+        for foreign_key in table.foreign_keys
+        if foreign_key.column.table is table and foreign_key.column.primary_key
+    ]
+    return columns[0] if len(columns) == 1 else None
+
+
+def tree_statement(
+    model: Any,
+    primary_key: Any,
+    parent: Any,
+    row_id: Any,
+    depth: int,
+    ancestors: bool = False,
+) -> Select:
+    """
+    Statement of the row and its descendants (or ancestors) up to `depth`
+    levels, walked by a single recursive CTE of the ids. The rows are the
+    records and their depth, 0 for the row, ordered by depth.
+    """
+    table = model.__table__
+    tree = (
+        select(
+            primary_key.label("id"),
+            parent.label("parent_id"),
+            literal_column("0", Integer).label("depth"),
+        )
+        .where(primary_key == row_id)
+        .cte("tree", recursive=True)
+    )
+    node = table.alias()
+    if ancestors:
+        link = node.c[primary_key.name] == tree.c.parent_id
+    else:
+        link = node.c[parent.name] == tree.c.id
+    tree = tree.union_all(
+        select(node.c[primary_key.name], node.c[parent.name], tree.c.depth + 1).where(
+            link, tree.c.depth < depth
+        )
+    )
+    return (
+        select(model, tree.c.depth)
+        .join(tree, primary_key == tree.c.id)
+        .order_by(tree.c.depth, primary_key)
+    )
+
+
+def nest(
+    nodes: List[Dict[str, Any]], primary_key: str, parent: str, ancestors: bool
+) -> List[Dict[str, Any]]:
+    """
+    Nodes of a tree statement nested in the `children` of their parent, in a
+    single pass over the nodes. The roots are the row for the descendants and
+    the topmost ancestor for the ancestors.
+
+    A node is only nested in a parent one level closer to the root, so a cycle
+    in the data doesn't nest a node in its own subtree.
+    """
+    by_id = {node[primary_key]: node for node in nodes}
+    step = 1 if ancestors else -1
+    roots = []
+    for node in nodes:
+        node["children"] = []
+    for node in nodes:
+        parent_node = by_id.get(node[parent])
+        if parent_node is not None and parent_node["depth"] == node["depth"] + step:
+            parent_node["children"].append(node)
+        else:
+            roots.append(node)
+    return roots
@@ -0,0 +1,88 @@
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import Session
+from sqlalchemy_api.crud import CRUDHandler
+from sqlalchemy_api.sharding import ShardMap
+from tests.database.session import Base, Post, User
+from datetime import date
+from typing import Any, Callable, Sequence
+import pytest
+
+
+def parity(value: int) -> str:
+    return "even" if value % 2 == 0 else "odd"
+
+
+@pytest.fixture
+def shards(tmp_path):
+    """
+    Two shards, users 1 to 10 partitioned by the parity of their id and the
+    posts by the parity of their user id
+    """
+    engines = {}
+    for name in ["even", "odd"]:
+        engine = create_engine(
+            f"sqlite:///{tmp_path}/{name}.db",
+            connect_args={"check_same_thread": False},
+        )
+        Base.metadata.create_all(engine)
+        engines[name] = engine
+    for user_id in range(1, 11):
+        with Session(engines[parity(user_id)]) as session:
+            session.execute(
+                insert(User),
+                [
+                    {
+                        "id": user_id,
+                        "name": f"user{user_id}",
+                        "birthday": date(2000, 1, 1),
+                    }
+                ],
+            )
+            session.execute(
+                insert(Post),
+                [{"id": user_id * 10, "content": "hello", "user_id": user_id}],
+            )
+            session.commit()
+    yield engines
+    for engine in engines.values():
+        engine.dispose()
+
+
+@pytest.fixture
+def shard_map(shards) -> ShardMap:
+    return ShardMap(shards, key="id", shard_for=parity)
+
+
+@pytest.fixture
+def user_crud(shard_map) -> Callable[..., CRUDHandler]:
+    """
+    Builds a handler of the users sharded by id, with the handler options
+    """
+
+    def make(**kwargs: Any) -> CRUDHandler:
+        return CRUDHandler(
+            model=User, engine=shard_map.engine, shards=shard_map, **kwargs
+        )
+
+    return make
+
+
+@pytest.fixture
+def seed_users(db_session) -> Callable[..., CRUDHandler]:
+    """
+    Inserts a user for each of the `rows`, the values of the `columns` with
+    the ids from 1, and returns a handler of the users
+    """
+
+    def seed(columns: Sequence[str], rows: Sequence[Sequence[Any]]) -> CRUDHandler:
+        db_session.execute(
+            insert(User),
+            [
+                {"id": id_, "birthday": date(2000, 1, 1), **dict(zip(columns, row))}
+                for id_, row in enumerate(rows, start=1)
+            ],
+        )
+        db_session.commit()
+        return CRUDHandler(model=User, engine=db_session.get_bind())
+
+    return seed
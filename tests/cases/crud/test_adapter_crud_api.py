@@ -131,6 +131,49 @@ class TestCrudExceptions:
         assert response.status_code == 404
         assert response.json() == {"message": "Not found"}
 
+    def test_patch(self, client, db_session):
+        inserted_id = db_session.execute(
+            insert(User).values(**example_user)
+        ).inserted_primary_key[0]
+        db_session.commit()
+        response = client.patch(
+            f"{USER_PREFIX}/{inserted_id}", json={"age": {"$inc": 2}, "name": "Jane"}
+        )
+        assert response.status_code == 200
+        assert response.json() == {
+            **jsonable_example_user,
+            "id": inserted_id,
+            "age": 32,
+            "name": "Jane",
+        }
+        response = client.patch(
+            f"{USER_PREFIX}/{inserted_id}", json={"age": {"$dec": 5}}
+        )
+        assert response.json()["age"] == 27
+
+    def test_patch_invalid_operator(self, client, db_session):
+        inserted_id = db_session.execute(
+            insert(User).values(**example_user)
+        ).inserted_primary_key[0]
+        db_session.commit()
+        for payload in [
+            {"name": {"$inc": 1}},
+            {"age": {"$mul": 2}},
+            {"age": {"$inc": 1, "$dec": 1}},
+        ]:
+            response = client.patch(f"{USER_PREFIX}/{inserted_id}", json=payload)
+            assert response.status_code == 422
+            assert response.json()["detail"][0]["loc"] == ["body", list(payload)[0]]
+        for operand in ["a", None]:
+            response = client.patch(
+                f"{USER_PREFIX}/{inserted_id}", json={"age": {"$inc": operand}}
+            )
+            assert response.status_code == 422
+        response = client.patch(
+            f"{USER_PREFIX}/{inserted_id + 1}", json={"age": {"$inc": 1}}
+        )
+        assert response.status_code == 404
+
     @pytest.mark.skipif(
         engine.url.drivername == "sqlite",
         reason="sqlite doesn't validate FK constraints",
@@ -0,0 +1,85 @@
+from sqlalchemy_api.admission import AdmissionControl, ConcurrencyLimiter
+from sqlalchemy_api.crud import CRUDHandler
+from sqlalchemy_api.exceptions import Overloaded
+from sqlalchemy_api.metrics import MetricsRegistry
+from tests.database.session import User, engine
+import anyio
+import json
+import pytest
+
+
+class TestConcurrencyLimiter:
+    @pytest.mark.asyncio
+    async def test_queue(self):
+        limiter = ConcurrencyLimiter(limit=1, queue_size=1, queue_timeout=5)
+        await limiter.acquire()
+        admitted = []
+
+        async def wait():
+            await limiter.acquire()
+            admitted.append(True)
+
+        async with anyio.create_task_group() as tg:
+            tg.start_soon(wait)
+            await anyio.sleep(0.01)
+            assert limiter.queue_depth == 1
+            with pytest.raises(Overloaded) as exc:
+                await limiter.acquire()
+            assert exc.value.reason == "queue_full"
+            limiter.release()
+        assert admitted == [True]
+        assert limiter.active == 1
+        limiter.release()
+        assert limiter.active == 0
+
+    @pytest.mark.asyncio
+    async def test_queue_timeout(self):
+        limiter = ConcurrencyLimiter(limit=1, queue_size=1, queue_timeout=0.01)
+        await limiter.acquire()
+        with pytest.raises(Overloaded) as exc:
+            await limiter.acquire()
+        assert exc.value.reason == "queue_timeout"
+        assert exc.value.retry_after == 1
+        assert limiter.queue_depth == 0
+
+
+def test_budgets():
+    shared = AdmissionControl(read_limit=5, write_limit=1)
+    assert shared.limiter("User", "read") is shared.limiter("Post", "read")
+    assert shared.limiter("User", "read").limit == 5
+    assert shared.limiter("User", "write").limit == 1
+    per_model = AdmissionControl(per_model=True)
+    assert per_model.limiter("User", "read") is not per_model.limiter("Post", "read")
+
+
+class TestCRUDHandlerAdmission:
+    @pytest.mark.asyncio
+    async def test_shed_request(self, db_session):
+        registry = MetricsRegistry()
+        admission = AdmissionControl(read_limit=1, queue_size=0, retry_after=3)
+        crud = CRUDHandler(
+            model=User, engine=engine, admission_control=admission, metrics=registry
+        )
+        reads = admission.limiter("User", "read")
+        await reads.acquire()
+        res = await crud.get_many(query_params={})
+        assert res.status_code == 503
+        assert res.headers == {"Retry-After": "3"}
+        assert "overloaded" in json.loads(res.content)["message"]
+        assert (
+            crud.metrics.shed_requests.get(
+                model="User", kind="read", reason="queue_full"
+            )
+            == 1
+        )
+        assert 'sqlalchemy_api_admission_queue_depth{model="User",kind="read"} 0' in (
+            registry.render()
+        )
+
+        # Writes have their own budget
+        res = await crud.post(payload={"name": "John", "birthday": "1990-01-01"})
+        assert res.status_code == 201
+
+        reads.release()
+        assert (await crud.get_many(query_params={})).status_code == 200
+        assert reads.active == 0
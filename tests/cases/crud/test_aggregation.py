@@ -0,0 +1,179 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql
+from starlette.applications import Starlette
+from starlette.testclient import TestClient as StarletteTestClient
+from sqlalchemy_api.adapters.fastapi_crud import APICrud as FastAPICrud
+from sqlalchemy_api.adapters.starlette_crud import APICrud as StarletteCrud
+from sqlalchemy_api.aggregation import (
+    Aggregate,
+    GroupBy,
+    group_expression,
+    merge_rows,
+)
+from sqlalchemy_api.crud import CRUDHandler
+from tests.database.session import User
+from datetime import datetime
+from decimal import Decimal
+import json
+import pytest
+
+
+@pytest.fixture
+def users(seed_users):
+    return seed_users(
+        ["name", "age", "status", "created_at"],
+        [
+            ("a", 10, "active", datetime(2020, 1, 5, 3)),
+            ("b", 20, "active", datetime(2020, 1, 9)),
+            ("c", 30, "inactive", datetime(2020, 2, 1)),
+            ("d", None, None, None),
+        ],
+    )
+
+
+async def aggregate(crud: CRUDHandler, **query_params):
+    response = await crud.aggregate(query_params=query_params)
+    assert response.status_code == 200, response.content
+    return json.loads(response.content)
+
+
+class TestAggregate:
+    @pytest.mark.asyncio
+    async def test_count(self, users):
+        assert await aggregate(users) == {
+            "columns": ["count"],
+            "rows": [[4]],
+            "truncated": False,
+        }
+
+    @pytest.mark.asyncio
+    async def test_group_by(self, users):
+        content = await aggregate(
+            users, group_by="status", aggregate="count,count:age,avg:age,max:name"
+        )
+        assert content["columns"] == [
+            "status",
+            "count",
+            "count__age",
+            "avg__age",
+            "max__name",
+        ]
+        # NULL is the last group
+        assert content["rows"] == [
+            ["active", 2, 2, 15.0, "b"],
+            ["inactive", 1, 1, 30.0, "c"],
+            [None, 1, 0, None, "d"],
+        ]
+
+    @pytest.mark.asyncio
+    async def test_number_types(self, users):
+        # PostgreSQL returns `Decimal`s for `AVG`, serialized as JSON numbers
+        response = await users.aggregate(
+            query_params={"aggregate": "count,sum:age,avg:age"}
+        )
+        [[count, total, average]] = json.loads(response.content)["rows"]
+        assert (count, total, average) == (4, 60, 20.0)
+        assert isinstance(count, int)
+        assert isinstance(total, (int, float))
+        assert isinstance(average, float)
+
+    @pytest.mark.asyncio
+    async def test_filters(self, users):
+        content = await aggregate(
+            users, group_by="status", aggregate="sum:age", age="15", age__op="gt"
+        )
+        assert content["rows"] == [["active", 20], ["inactive", 30]]
+        content = await aggregate(users, filter="or(status.is_null,name.equal.a)")
+        assert content["rows"] == [[2]]
+
+    @pytest.mark.asyncio
+    async def test_time_buckets(self, users):
+        content = await aggregate(
+            users, group_by="created_at:month", aggregate="count,min:created_at"
+        )
+        assert content["columns"] == ["created_at__month", "count", "min__created_at"]
+        assert content["rows"] == [
+            ["2020-01-01T00:00:00", 2, "2020-01-05T03:00:00"],
+            ["2020-02-01T00:00:00", 1, "2020-02-01T00:00:00"],
+            [None, 1, None],
+        ]
+
+    @pytest.mark.asyncio
+    async def test_truncated(self, users):
+        crud = CRUDHandler(model=User, engine=users.engine, page_size_max=2)
+        content = await aggregate(crud, group_by="id")
+        assert content["rows"] == [[1, 1], [2, 1]]
+        assert content["truncated"] is True
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize(
+        "query_params,loc",
+        [
+            ({"group_by": "password"}, "group_by"),
+            ({"group_by": "status:month"}, "group_by"),
+            ({"group_by": "created_at:week"}, "group_by"),
+            ({"aggregate": "sum:name"}, "aggregate"),
+            ({"aggregate": "median:age"}, "aggregate"),
+            ({"aggregate": "avg"}, "aggregate"),
+            ({"aggregate": "count,count"}, "aggregate"),
+            ({"age": "x", "age__op": "gt"}, "age"),
+        ],
+    )
+    async def test_invalid(self, users, query_params, loc):
+        response = await users.aggregate(query_params=query_params)
+        assert response.status_code == 422
+        assert json.loads(response.content)["detail"][0]["loc"][-1] == loc
+
+
+def test_postgresql_time_bucket() -> None:
+    created_at = group_expression(
+        "postgresql", GroupBy("created_at", "day"), User.__table__.c.created_at
+    )
+    stmt = select(created_at).group_by(created_at)
+    sql = str(stmt.compile(dialect=postgresql.dialect()))
+    assert "date_trunc('day', users.created_at) AS created_at__day" in sql
+    assert sql.endswith("GROUP BY date_trunc('day', users.created_at)")
+
+
+@pytest.mark.asyncio
+async def test_merge_across_shards(user_crud):
+    crud = user_crud()
+    content = await aggregate(crud, aggregate="count,avg:id,min:name,max:id")
+    assert content["rows"] == [[10, 5.5, "user1", 10]]
+    content = await aggregate(
+        crud, group_by="id", aggregate="avg:id", id__op="le", id="3"
+    )
+    assert content["rows"] == [[1, 1.0], [2, 2.0], [3, 3.0]]
+
+
+def test_merge_decimals() -> None:
+    rows = merge_rows(
+        [],
+        [Aggregate("sum", "price"), Aggregate("avg", "price")],
+        [
+            {"sum__price": Decimal("1.50"), "count__price": 1},
+            {"sum__price": Decimal("2.50"), "count__price": 3},
+        ],
+    )
+    assert rows == [[4.0, 1.0]]
+    assert all(isinstance(value, float) for value in rows[0])
+
+
+@pytest.mark.parametrize("adapter", ["Starlette", "FastAPI"])
+def test_aggregate_endpoint(adapter, users):
+    if adapter == "Starlette":
+        app = Starlette()
+        app.mount("/user", StarletteCrud(User, users.engine))
+        client = StarletteTestClient(app)
+    else:
+        app = FastAPI()
+        app.include_router(FastAPICrud(User, users.engine), prefix="/user")
+        client = TestClient(app)
+    response = client.get(
+        "/user/_aggregate",
+        params={"group_by": "status", "aggregate": "avg:age", "status": "active"},
+    )
+    assert response.status_code == 200
+    assert response.json()["rows"] == [["active", 15.0]]
@@ -0,0 +1,109 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import MetaData, insert
+from starlette.testclient import TestClient as StarletteTestClient
+from sqlalchemy_api.adapters.fastapi_crud import (
+    APICrudAutomount as FastAPIAPICrudAutomount,
+)
+from sqlalchemy_api.adapters.starlette_crud import (
+    APICrudAutomount as StarletteAPICrudAutomount,
+)
+from sqlalchemy_api.automount import get_models
+from sqlalchemy_api.crud import CRUDHandler
+from tests.database.session import Base, User, Post, engine
+from datetime import date
+import pytest
+
+example_user = {"name": "John", "birthday": date(1990, 1, 1)}
+
+
+class TestGetModels:
+    def test_declarative_base(self):
+        models = get_models(Base)
+        assert list(models) == ["comments", "posts", "users"]
+        assert models["users"] is User
+
+    def test_include_exclude(self):
+        assert list(get_models(Base, include=["users", "posts"])) == [
+            "posts",
+            "users",
+        ]
+        assert list(get_models(Base, exclude=["users"])) == ["comments", "posts"]
+
+    def test_metadata(self):
+        models = get_models(Base.metadata)
+        assert list(models) == ["comments", "posts", "users"]
+        assert models["users"].__table__ is User.__table__
+
+    def test_reflect(self, db_session):
+        models = get_models(engine=engine, reflect=True)
+        assert list(models) == ["comments", "posts", "users"]
+        assert "birthday" in models["users"].__table__.columns
+
+
+class TestLazySchemas:
+    def test_handler_builds_schemas_on_first_request(self, db_session):
+        crud = CRUDHandler(model=User, engine=engine)
+        assert "schema_with_relations" not in crud.__dict__
+        assert crud.schema_relations is crud.schema_with_relations
+        assert "schema_with_relations" in crud.__dict__
+
+
+@pytest.fixture(
+    params=[
+        pytest.param("Starlette"),
+        pytest.param("FastAPI"),
+    ],
+)
+def automount_client(request, db_session):
+    if request.param == "Starlette":
+        app = StarletteAPICrudAutomount(Base, engine)
+        cruds = app.cruds
+        test_client = StarletteTestClient
+    else:
+        app = FastAPI()
+        router = FastAPIAPICrudAutomount(Base, engine)
+        app.include_router(router)
+        cruds = router.cruds
+        test_client = TestClient
+    with test_client(app) as c:
+        yield c, cruds
+
+
+class TestAutomount:
+    def test_routes_are_mounted_without_building_schemas(self, automount_client):
+        client, cruds = automount_client
+        assert sorted(cruds) == ["comments", "posts", "users"]
+        handler = cruds["users"].crud_handler
+        assert "schema_paginated" not in handler.__dict__
+
+        response = client.post(
+            "/users/", json={"name": "John", "birthday": "1990-01-01"}
+        )
+        assert response.status_code == 201
+        response = client.get("/users/")
+        assert response.status_code == 200
+        assert response.json().get("total") == 1
+        response = client.get("/users/", params={"name": "Jane"})
+        assert response.json().get("total") == 0
+        assert "schema_paginated" in handler.__dict__
+        assert "schema_paginated" not in cruds["posts"].crud_handler.__dict__
+
+    def test_validation_on_lazy_routes(self, automount_client, db_session):
+        client, _ = automount_client
+        db_session.execute(insert(User).values(**example_user))
+        db_session.commit()
+        response = client.put("/users/1", json={"birthday": "01/01/1990"})
+        assert response.status_code == 422
+        response = client.post("/posts/", json={"user_id": 1})
+        assert response.status_code == 422
+
+    def test_reflected_tables(self, db_session):
+        db_session.execute(insert(User).values(**example_user))
+        db_session.execute(insert(Post).values(content="Hi", user_id=1))
+        db_session.commit()
+        app = StarletteAPICrudAutomount(MetaData(), engine, reflect=True)
+        with StarletteTestClient(app) as client:
+            response = client.get("/posts/1")
+            assert response.status_code == 200
+            assert response.json().get("content") == "Hi"
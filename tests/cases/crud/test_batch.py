@@ -0,0 +1,224 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, func, insert, select
+from starlette.applications import Starlette
+from starlette.testclient import TestClient as StarletteTestClient
+from sqlalchemy_api.actions import Actions
+from sqlalchemy_api.adapters.fastapi_crud import (
+    APICrudAutomount as FastAPIAPICrudAutomount,
+)
+from sqlalchemy_api.adapters.starlette_crud import (
+    APICrudAutomount as StarletteAPICrudAutomount,
+)
+from sqlalchemy_api.batch import BatchExecutor
+from sqlalchemy_api.crud import CRUDHandler
+from tests.database.session import Base, Post, User, engine
+from datetime import date
+import json
+import pytest
+
+example_user = {"name": "John", "birthday": "1990-01-01"}
+
+
+def batch_client(adapter: str, **kwargs):
+    if adapter == "Starlette":
+        app = Starlette()
+        app.mount("/", StarletteAPICrudAutomount(Base, engine, batch=True, **kwargs))
+        return StarletteTestClient(app)
+    app = FastAPI()
+    app.include_router(FastAPIAPICrudAutomount(Base, engine, batch=True, **kwargs))
+    return TestClient(app)
+
+
+def count_users(db_session) -> int:
+    db_session.expire_all()
+    return db_session.execute(select(func.count()).select_from(User)).scalar()
+
+
+@pytest.fixture(params=["Starlette", "FastAPI"])
+def client(request, db_session):
+    db_session.execute(
+        insert(User),
+        [{"id": 1, "name": "Jane", "age": 30, "birthday": date(1990, 1, 1)}],
+    )
+    db_session.commit()
+    with batch_client(request.param) as test_client:
+        yield test_client
+
+
+class TestBatch:
+    def test_atomic_batch(self, client, db_session):
+        response = client.post(
+            "/_batch",
+            json={
+                "operations": [
+                    {"model": "users", "action": "get", "row_id": 1},
+                    {"model": "users", "action": "create", "payload": example_user},
+                    {
+                        "model": "users",
+                        "action": "patch",
+                        "row_id": 1,
+                        "payload": {"age": {"$inc": 1}},
+                    },
+                    {"model": "users", "action": "get_many", "query": {"name": "John"}},
+                    {
+                        "model": "posts",
+                        "action": "create",
+                        "payload": {"content": "hello", "user_id": 1},
+                    },
+                ]
+            },
+        )
+        assert response.status_code == 200
+        content = response.json()
+        assert content["committed"] is True
+        results = content["results"]
+        assert [result["status_code"] for result in results] == [
+            200,
+            201,
+            200,
+            200,
+            201,
+        ]
+        assert results[0]["body"]["name"] == "Jane"
+        assert results[2]["body"]["age"] == 31
+        # Reads after a write see the uncommitted writes of the batch
+        assert results[3]["body"]["total"] == 1
+        assert count_users(db_session) == 2
+
+    def test_atomic_batch_rolls_back(self, client, db_session):
+        response = client.post(
+            "/_batch",
+            json={
+                "operations": [
+                    {"model": "users", "action": "create", "payload": example_user},
+                    {"model": "users", "action": "delete", "row_id": 999},
+                    {"model": "users", "action": "create", "payload": example_user},
+                ]
+            },
+        )
+        assert response.status_code == 404
+        content = response.json()
+        assert content["committed"] is False
+        assert [result["status_code"] for result in content["results"]] == [
+            201,
+            404,
+            424,
+        ]
+        assert count_users(db_session) == 1
+
+    def test_failed_read_stops_atomic_batch(self, client, db_session):
+        response = client.post(
+            "/_batch",
+            json={
+                "operations": [
+                    {"model": "users", "action": "get", "row_id": 999},
+                    {"model": "users", "action": "get", "row_id": 1},
+                    {"model": "users", "action": "create", "payload": example_user},
+                ]
+            },
+        )
+        assert response.status_code == 404
+        content = response.json()
+        # The reads run in order in the batch transaction too
+        assert [result["status_code"] for result in content["results"]] == [
+            404,
+            424,
+            424,
+        ]
+        assert count_users(db_session) == 1
+
+    def test_per_operation_outcomes(self, client, db_session):
+        response = client.post(
+            "/_batch",
+            json={
+                "atomic": False,
+                "operations": [
+                    {"model": "users", "action": "create", "payload": example_user},
+                    {
+                        "model": "users",
+                        "action": "update",
+                        "row_id": 999,
+                        "payload": {"name": "x"},
+                    },
+                    {"model": "users", "action": "create", "payload": example_user},
+                    {"model": "users", "action": "delete", "row_id": 1},
+                ],
+            },
+        )
+        assert response.status_code == 200
+        content = response.json()
+        assert content["committed"] is True
+        assert [result["status_code"] for result in content["results"]] == [
+            201,
+            404,
+            201,
+            200,
+        ]
+        assert count_users(db_session) == 2
+
+    def test_invalid_batch(self, client, db_session):
+        response = client.post("/_batch", json={"operations": []})
+        assert response.status_code == 422
+        response = client.post(
+            "/_batch",
+            json={"operations": [{"model": "nope", "action": "get", "row_id": 1}]},
+        )
+        assert response.status_code == 422
+        assert response.json()["detail"][0]["loc"] == [
+            "body",
+            "operations",
+            0,
+            "model",
+        ]
+
+
+@pytest.mark.asyncio
+async def test_batch_rejects_other_transactions(db_session, user_crud, tmp_path):
+    other_engine = create_engine(
+        f"sqlite:///{tmp_path}/other.db", connect_args={"check_same_thread": False}
+    )
+    Base.metadata.create_all(other_engine)
+    executor = BatchExecutor(
+        {
+            "users": CRUDHandler(model=User, engine=engine),
+            "posts": CRUDHandler(model=Post, engine=other_engine),
+            "sharded_users": user_crud(),
+        }
+    )
+    response = await executor.execute(
+        {
+            "operations": [
+                {"model": "users", "action": "create", "payload": example_user},
+                {
+                    "model": "posts",
+                    "action": "create",
+                    "payload": {"content": "hello", "user_id": 1},
+                },
+                {"model": "sharded_users", "action": "get", "row_id": 1},
+            ]
+        }
+    )
+    assert response.status_code == 422
+    errors = json.loads(response.content)["detail"]
+    assert [error["loc"] for error in errors] == [
+        ["body", "operations", 1, "model"],
+        ["body", "operations", 2, "model"],
+    ]
+    assert count_users(db_session) == 0
+    other_engine.dispose()
+
+
+@pytest.mark.parametrize("adapter", ["Starlette", "FastAPI"])
+def test_batch_respects_actions(adapter, db_session):
+    with batch_client(adapter, actions=[Actions.GET, Actions.GET_MANY]) as client:
+        response = client.post(
+            "/_batch",
+            json={
+                "operations": [
+                    {"model": "users", "action": "create", "payload": example_user}
+                ]
+            },
+        )
+    assert response.status_code == 422
+    assert response.json()["detail"][0]["loc"][-1] == "action"
@@ -0,0 +1,117 @@
+from sqlalchemy import create_engine
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlalchemy.orm import Session
+from sqlalchemy_api.circuit_breaker import CircuitBreaker
+from sqlalchemy_api.crud import CRUDHandler
+from sqlalchemy_api.exceptions import CircuitOpen
+from sqlalchemy_api.metrics import MetricsRegistry
+from tests.database.session import User, engine
+from asyncio import CancelledError
+from unittest.mock import patch
+import pytest
+import time
+
+connection_error = OperationalError("SELECT 1", {}, Exception("connection refused"))
+
+
+def fail(breaker: CircuitBreaker, exc: BaseException = connection_error) -> None:
+    with pytest.raises(type(exc)):
+        with breaker.call():
+            raise exc
+
+
+def succeed(breaker: CircuitBreaker) -> None:
+    with breaker.call():
+        ...
+
+
+class TestCircuitBreaker:
+    def test_open_half_open_close(self):
+        registry = MetricsRegistry()
+        breaker = CircuitBreaker(
+            failure_threshold=2, reset_timeout=0.05, metrics=registry
+        )
+        transitions = []
+        breaker.add_listener(lambda _, old, new: transitions.append((old, new)))
+        fail(breaker)
+        succeed(breaker)
+        fail(breaker)
+        assert breaker.state == "closed"
+        fail(breaker)
+        assert breaker.state == "open"
+        with pytest.raises(CircuitOpen) as exc:
+            succeed(breaker)
+        assert exc.value.retry_after == 1
+
+        time.sleep(0.05)
+        fail(breaker)
+        assert breaker.state == "open"
+        time.sleep(0.05)
+        succeed(breaker)
+        assert breaker.state == "closed"
+        assert transitions == [
+            ("closed", "open"),
+            ("open", "half_open"),
+            ("half_open", "open"),
+            ("open", "half_open"),
+            ("half_open", "closed"),
+        ]
+        assert breaker.rejected.get(name="database") == 1
+        assert breaker.transitions.get(name="database", state="open") == 2
+        assert 'sqlalchemy_api_circuit_state{name="database"} 0' in registry.render()
+
+    def test_failure_rate(self):
+        breaker = CircuitBreaker(failure_threshold=100, failure_rate=0.5, min_calls=4)
+        for _ in range(2):
+            succeed(breaker)
+            fail(breaker)
+        assert breaker.state == "open"
+
+    def test_other_errors_are_not_failures(self):
+        breaker = CircuitBreaker(failure_threshold=1)
+        fail(breaker, IntegrityError("INSERT", {}, Exception("unique")))
+        fail(breaker, ValueError())
+        assert breaker.state == "closed"
+
+    def test_half_open_trial_calls(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        fail(breaker)
+        breaker.before_call()
+        assert breaker.state == "half_open"
+        with pytest.raises(CircuitOpen) as exc:
+            breaker.before_call()
+        assert exc.value.retry_after == 1
+
+    def test_cancelled_trial_call(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        fail(breaker)
+        fail(breaker, CancelledError())
+        # Neither closed by the cancelled trial nor holding its slot
+        assert breaker.state == "half_open"
+        succeed(breaker)
+        assert breaker.state == "closed"
+
+
+@pytest.mark.asyncio
+async def test_handler_fails_fast(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/missing/database.db")
+    breaker = CircuitBreaker(failure_threshold=2)
+    crud = CRUDHandler(model=User, engine=engine, circuit_breaker=breaker)
+    for _ in range(2):
+        assert (await crud.get_many(query_params={})).status_code == 500
+    res = await crud.get_many(query_params={})
+    assert res.status_code == 503
+    assert int(res.headers["Retry-After"]) == 30
+    assert (await crud.delete(row_id=1)).status_code == 503
+
+
+@pytest.mark.asyncio
+async def test_refresh_is_guarded(db_session):
+    breaker = CircuitBreaker(failure_threshold=1)
+    crud = CRUDHandler(
+        model=User, engine=engine, circuit_breaker=breaker, returning=False
+    )
+    with patch.object(Session, "refresh", side_effect=connection_error):
+        res = await crud.post(payload={"name": "John", "birthday": "1990-01-01"})
+    assert res.status_code == 500
+    assert breaker.state == "open"
@@ -0,0 +1,174 @@
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import DeclarativeBase, Mapped, Session, mapped_column
+from sqlalchemy_api.coalescing import WriteCoalescer
+from sqlalchemy_api.crud import CRUDHandler
+from sqlalchemy_api.instrumentation import current_request
+from sqlalchemy_api.metrics import MetricsRegistry
+from sqlalchemy_api.tracing import InMemoryTracer
+from typing import Any, List, Optional
+import anyio
+import json
+import pytest
+
+
+class Base(DeclarativeBase):
+    pass
+
+
+class Tag(Base):
+    __tablename__ = "tags"
+    id: Mapped[int] = mapped_column(primary_key=True)
+    name: Mapped[str] = mapped_column(unique=True)
+    color: Mapped[Optional[str]] = mapped_column(default="grey")
+
+
+@pytest.fixture
+def tag_engine(tmp_path):
+    engine = create_engine(
+        f"sqlite:///{tmp_path}/tags.db", connect_args={"check_same_thread": False}
+    )
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+async def post_all(crud: CRUDHandler, names: List[str]) -> List[Any]:
+    responses: List[Any] = [None] * len(names)
+
+    async def post(index: int, name: str) -> None:
+        responses[index] = await crud.post(payload={"name": name})
+
+    async with anyio.create_task_group() as task_group:
+        for index, name in enumerate(names):
+            task_group.start_soon(post, index, name)
+    return responses
+
+
+class TestWriteCoalescer:
+    @pytest.mark.asyncio
+    async def test_concurrent_posts_share_a_batch(self, tag_engine):
+        registry = MetricsRegistry()
+        crud = CRUDHandler(
+            model=Tag,
+            engine=tag_engine,
+            metrics=registry,
+            write_coalescer=WriteCoalescer(window=0.05),
+        )
+        names = [f"tag{index}" for index in range(5)]
+        responses = await post_all(crud, names)
+        assert [response.status_code for response in responses] == [201] * 5
+        contents = [json.loads(response.content) for response in responses]
+        assert [content["name"] for content in contents] == names
+        assert len({content["id"] for content in contents}) == 5
+        assert crud.metrics.write_batch_size.count(model="Tag") == 1
+        assert crud.metrics.write_batch_size.sum(model="Tag") == 5
+        assert crud.metrics.write_batch_duration.count(model="Tag") == 1
+
+    @pytest.mark.asyncio
+    async def test_batch_is_traced_apart(self, tag_engine):
+        tracer = InMemoryTracer()
+        crud = CRUDHandler(
+            model=Tag,
+            engine=tag_engine,
+            tracer=tracer,
+            write_coalescer=WriteCoalescer(window=0.05),
+        )
+        await post_all(crud, ["a", "b"])
+        spans = tracer.exporter.get_finished_spans()
+        [batch] = [span for span in spans if span.name == "Tag.write_batch"]
+        assert batch.parent is None
+        assert batch.attributes["sqlalchemy_api.batch_size"] == 2
+        for span in spans:
+            root = span
+            while root.parent is not None:
+                root = root.parent
+            if span.name == "sql":
+                assert root is batch
+            assert root.name in ["Tag.post", "Tag.write_batch"]
+
+    @pytest.mark.asyncio
+    async def test_flush_context(self):
+        coalescer = WriteCoalescer(window=0.01)
+        seen: List[Any] = []
+
+        async def flush(writes) -> None:
+            seen.append(current_request.get())
+
+        token = current_request.set("request")  # type: ignore
+        try:
+            await coalescer.submit("key", {}, flush)
+        finally:
+            current_request.reset(token)
+        assert seen == [None]
+
+    @pytest.mark.asyncio
+    async def test_constraint_failures_are_isolated(self, tag_engine):
+        crud = CRUDHandler(
+            model=Tag, engine=tag_engine, write_coalescer=WriteCoalescer(window=0.05)
+        )
+        responses = await post_all(crud, ["a", "b", "a", "c"])
+        assert [response.status_code for response in responses] == [201, 201, 409, 201]
+        with Session(tag_engine) as session:
+            assert session.execute(select(Tag.name)).scalars().all() == ["a", "b", "c"]
+
+    @pytest.mark.asyncio
+    async def test_column_defaults(self, tag_engine):
+        crud = CRUDHandler(
+            model=Tag, engine=tag_engine, write_coalescer=WriteCoalescer(window=0.05)
+        )
+        payloads = [{"name": "a"}, {"name": "b", "color": "red"}, {"name": "c"}]
+        responses: List[Any] = [None] * len(payloads)
+
+        async def post(index: int) -> None:
+            responses[index] = await crud.post(payload=payloads[index])
+
+        async with anyio.create_task_group() as task_group:
+            for index in range(len(payloads)):
+                task_group.start_soon(post, index)
+        assert [json.loads(response.content)["color"] for response in responses] == [
+            "grey",
+            "red",
+            "grey",
+        ]
+
+    @pytest.mark.asyncio
+    async def test_max_batch(self):
+        coalescer = WriteCoalescer(window=10, max_batch=2)
+        batches: List[int] = []
+
+        async def flush(writes) -> None:
+            batches.append(len(writes))
+            for write in writes:
+                write.result = write.values["n"]
+
+        results: List[Any] = []
+
+        async def submit(n: int) -> None:
+            results.append(await coalescer.submit("key", {"n": n}, flush))
+
+        with anyio.fail_after(1):
+            async with anyio.create_task_group() as task_group:
+                for n in range(4):
+                    task_group.start_soon(submit, n)
+        assert batches == [2, 2]
+        assert sorted(results) == [0, 1, 2, 3]
+
+    @pytest.mark.asyncio
+    async def test_flush_error_reaches_every_write(self):
+        coalescer = WriteCoalescer(window=0.01)
+
+        async def flush(writes) -> None:
+            raise RuntimeError("database is gone")
+
+        errors: List[Exception] = []
+
+        async def submit() -> None:
+            try:
+                await coalescer.submit("key", {}, flush)
+            except RuntimeError as exc:
+                errors.append(exc)
+
+        async with anyio.create_task_group() as task_group:
+            for _ in range(3):
+                task_group.start_soon(submit)
+        assert len(errors) == 3
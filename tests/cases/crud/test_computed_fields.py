@@ -0,0 +1,238 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import Column, ForeignKey, Table, create_engine, event, insert
+from sqlalchemy.orm import DeclarativeBase, Mapped, Session, mapped_column, relationship
+from sqlalchemy_api.adapters.fastapi_crud import APICrud
+from sqlalchemy_api.computed import RelationAggregate
+from sqlalchemy_api.crud import CRUDHandler
+from datetime import date
+from typing import List, Optional
+import json
+import pytest
+
+
+class Base(DeclarativeBase):
+    pass
+
+
+post_tags = Table(
+    "post_tags",
+    Base.metadata,
+    Column("post_id", ForeignKey("posts.id")),
+    Column("tag_id", ForeignKey("tags.id")),
+)
+
+
+class Author(Base):
+    __tablename__ = "authors"
+    id: Mapped[int] = mapped_column(primary_key=True)
+    name: Mapped[str] = mapped_column()
+    posts: Mapped[List["Post"]] = relationship()
+
+
+class Post(Base):
+    __tablename__ = "posts"
+    id: Mapped[int] = mapped_column(primary_key=True)
+    author_id: Mapped[int] = mapped_column(ForeignKey("authors.id"))
+    parent_id: Mapped[Optional[int]] = mapped_column(ForeignKey("posts.id"))
+    likes: Mapped[int] = mapped_column()
+    published: Mapped[date] = mapped_column()
+    replies: Mapped[List["Post"]] = relationship()
+    tags: Mapped[List["Tag"]] = relationship(secondary=post_tags)
+
+
+class Tag(Base):
+    __tablename__ = "tags"
+    id: Mapped[int] = mapped_column(primary_key=True)
+    name: Mapped[str] = mapped_column()
+
+
+COMPUTED_FIELDS = {
+    "post_count": RelationAggregate("posts"),
+    "total_likes": RelationAggregate("posts", "sum", "likes"),
+    "average_likes": RelationAggregate("posts", "avg", "likes"),
+    "latest_post": RelationAggregate("posts", "max", "published"),
+}
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(
+        f"sqlite:///{tmp_path}/computed.db", connect_args={"check_same_thread": False}
+    )
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.execute(
+            insert(Author),
+            [{"id": 1, "name": "a"}, {"id": 2, "name": "b"}, {"id": 3, "name": "c"}],
+        )
+        session.execute(
+            insert(Post),
+            [
+                {
+                    "id": id_,
+                    "author_id": author_id,
+                    "parent_id": parent_id,
+                    "likes": likes,
+                    "published": date(2024, month, 1),
+                }
+                for id_, author_id, parent_id, likes, month in [
+                    (1, 1, None, 10, 1),
+                    (2, 1, 1, 20, 3),
+                    (3, 1, 1, 30, 2),
+                    (4, 2, None, 5, 6),
+                ]
+            ],
+        )
+        session.execute(insert(Tag), [{"id": 1, "name": "x"}, {"id": 2, "name": "y"}])
+        session.execute(
+            insert(post_tags),
+            [
+                {"post_id": 1, "tag_id": 1},
+                {"post_id": 1, "tag_id": 2},
+                {"post_id": 2, "tag_id": 1},
+            ],
+        )
+        session.commit()
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def authors(engine):
+    return CRUDHandler(model=Author, engine=engine, computed_fields=COMPUTED_FIELDS)
+
+
+async def records(crud: CRUDHandler, **query_params):
+    response = await crud.get_many(query_params=query_params)
+    assert response.status_code == 200, response.content
+    return json.loads(response.content)["records"]
+
+
+class TestComputedFields:
+    @pytest.mark.asyncio
+    async def test_aggregates(self, authors):
+        assert await records(authors) == [
+            {
+                "id": 1,
+                "name": "a",
+                "post_count": 3,
+                "total_likes": 60,
+                "average_likes": 20.0,
+                "latest_post": "2024-03-01",
+            },
+            {
+                "id": 2,
+                "name": "b",
+                "post_count": 1,
+                "total_likes": 5,
+                "average_likes": 5.0,
+                "latest_post": "2024-06-01",
+            },
+            {
+                "id": 3,
+                "name": "c",
+                "post_count": 0,
+                "total_likes": None,
+                "average_likes": None,
+                "latest_post": None,
+            },
+        ]
+        response = await authors.get(row_id=1)
+        record = json.loads(response.content)
+        assert record["post_count"] == 3
+        assert len(record["posts"]) == 3
+
+    @pytest.mark.asyncio
+    async def test_children_not_loaded(self, authors, engine):
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(engine, "before_cursor_execute", before_cursor_execute)
+        try:
+            await records(authors)
+        finally:
+            event.remove(engine, "before_cursor_execute", before_cursor_execute)
+        # The page and the count, no statement per author
+        assert len(statements) == 2
+
+    @pytest.mark.asyncio
+    async def test_filter_and_sort(self, authors):
+        found = await records(authors, post_count="1", post_count__op="ge")
+        assert [record["id"] for record in found] == [1, 2]
+        found = await records(authors, filter="total_likes.lt.10")
+        assert [record["id"] for record in found] == [2]
+        found = await records(authors, sort="-latest_post")
+        assert [record["id"] for record in found] == [3, 2, 1]
+
+    @pytest.mark.asyncio
+    async def test_cursor(self, authors):
+        response = await authors.get_many(
+            query_params={"sort": "post_count", "cursor": "", "page_size": 2}
+        )
+        page = json.loads(response.content)
+        assert [record["id"] for record in page["records"]] == [3, 2]
+        response = await authors.get_many(
+            query_params={
+                "sort": "post_count",
+                "cursor": page["next_cursor"],
+                "page_size": 2,
+            }
+        )
+        assert [record["id"] for record in json.loads(response.content)["records"]] == [
+            1
+        ]
+
+    @pytest.mark.asyncio
+    async def test_self_referential_and_many_to_many(self, engine):
+        posts = CRUDHandler(
+            model=Post,
+            engine=engine,
+            computed_fields={
+                "reply_count": RelationAggregate("replies"),
+                "tag_count": RelationAggregate("tags"),
+                "first_tag": RelationAggregate("tags", "min", "name"),
+            },
+        )
+        found = await records(posts)
+        assert [
+            (record["reply_count"], record["tag_count"], record["first_tag"])
+            for record in found
+        ] == [(2, 2, "x"), (0, 1, "x"), (0, 0, None), (0, 0, None)]
+
+    def test_invalid(self, engine):
+        with pytest.raises(ValueError):
+            RelationAggregate("posts", "median", "likes")
+        with pytest.raises(ValueError):
+            RelationAggregate("posts", "sum")
+        with pytest.raises(ValueError):
+            CRUDHandler(
+                model=Author,
+                engine=engine,
+                computed_fields={"posts": RelationAggregate("posts")},
+            )
+        for field in [
+            RelationAggregate("name"),
+            RelationAggregate("posts", "sum", "unknown"),
+            RelationAggregate("posts", "sum", "published"),
+        ]:
+            crud = CRUDHandler(
+                model=Author, engine=engine, computed_fields={"field": field}
+            )
+            with pytest.raises(ValueError):
+                crud.get_filters()
+
+    def test_api(self, engine):
+        app = FastAPI()
+        app.include_router(
+            APICrud(Author, engine, computed_fields=COMPUTED_FIELDS), prefix="/author"
+        )
+        client = TestClient(app)
+        response = client.get(
+            "/author", params={"sort": "-post_count", "post_count": 0}
+        )
+        assert response.status_code == 200, response.text
+        assert [record["id"] for record in response.json()["records"]] == [3]
+        assert "posts" not in response.json()["records"][0]
@@ -1,7 +1,11 @@
 from sqlalchemy_api.crud import CRUDHandler
 from tests.database.session import User, engine
+from sqlalchemy import event
 from sqlalchemy.orm import Session
+from contextlib import contextmanager
+from typing import Iterator, List
 from unittest.mock import patch
+import anyio
 import json
 import pytest
 
@@ -27,3 +31,112 @@ class TestCRUDHandler:
             res = await crud.get_many(query_params={})
             assert res.status_code == 500
             assert isinstance(json.loads(res.content), list)
+
+    @pytest.mark.asyncio
+    async def test_explain(self, db_session: Session):
+        crud = CRUDHandler(model=User, engine=engine, debug=True)
+        res = await crud.get_many(query_params={"name": "John", "explain": "true"})
+        assert res.status_code == 200
+        content = json.loads(res.content)
+        assert content["dialect"] == engine.dialect.name
+        assert "users.name" in content["page"]["sql"]
+        assert "count(*)" in content["count"]["sql"]
+        assert content["page"]["plan"]
+        assert {"validation", "explain_page", "explain_count"} <= set(
+            content["timings"]
+        )
+        if engine.dialect.name == "sqlite":
+            assert content["page"]["full_scans"] == ["users"]
+
+    @pytest.mark.asyncio
+    async def test_explain_requires_debug(self, db_session: Session):
+        crud = CRUDHandler(model=User, engine=engine)
+        res = await crud.get_many(query_params={"explain": "true"})
+        assert res.status_code == 200
+        assert "records" in json.loads(res.content)
+
+
+def test_explain_postgresql_statement():
+    from sqlalchemy import select
+    from sqlalchemy.dialects import postgresql
+    from sqlalchemy_api.explain import Explain, full_scans
+
+    stmt = Explain(select(User).where(User.name == "John"))
+    sql = str(stmt.compile(dialect=postgresql.dialect()))
+    assert sql.startswith("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) SELECT")
+    plan = [
+        {
+            "Plan": {
+                "Node Type": "Limit",
+                "Plans": [{"Node Type": "Seq Scan", "Relation Name": "users"}],
+            }
+        }
+    ]
+    assert full_scans("postgresql", plan) == ["users"]
+
+
+@contextmanager
+def count_statements() -> Iterator[List[str]]:
+    statements: List[str] = []
+
+    def before_cursor_execute(conn, cursor, statement, *args) -> None:
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+@pytest.mark.parametrize("returning", [True, False])
+@pytest.mark.asyncio
+async def test_returning_writes(db_session: Session, returning: bool):
+    crud = CRUDHandler(model=User, engine=engine, returning=returning)
+    supported = engine.dialect.insert_returning and engine.dialect.update_returning
+    with count_statements() as statements:
+        res = await crud.post(payload={"name": "John", "birthday": "2000-01-01"})
+    assert res.status_code == 201
+    created = json.loads(res.content)
+    assert created["name"] == "John"
+    assert len(statements) == (1 if returning and supported else 2)
+
+    with count_statements() as statements:
+        res = await crud.put(row_id=created["id"], payload={"name": "Jane"})
+    assert json.loads(res.content) == {**created, "name": "Jane"}
+    assert len(statements) == (1 if returning and supported else 2)
+
+    res = await crud.put(row_id=created["id"] + 1, payload={"name": "Jane"})
+    assert res.status_code == 404
+
+
+@pytest.mark.parametrize("returning", [True, False])
+@pytest.mark.asyncio
+async def test_returning_column_defaults(db_session: Session, returning: bool):
+    crud = CRUDHandler(model=User, engine=engine, returning=returning)
+    res = await crud.post(payload={"name": "John", "birthday": "2000-01-01"})
+    assert res.status_code == 201
+    # `active` has a python side default
+    assert json.loads(res.content)["active"] is True
+    res = await crud.post(
+        payload={"name": "Jane", "birthday": "2000-01-01", "active": False}
+    )
+    assert json.loads(res.content)["active"] is False
+
+
+@pytest.mark.asyncio
+async def test_concurrent_increments(db_session: Session):
+    crud = CRUDHandler(model=User, engine=engine)
+    res = await crud.post(payload={"name": "John", "birthday": "2000-01-01"})
+    row_id = json.loads(res.content)["id"]
+
+    async def increment() -> None:
+        res = await crud.patch(row_id=row_id, payload={"age": {"$inc": 1}})
+        assert res.status_code == 200
+
+    async with anyio.create_task_group() as task_group:
+        for _ in range(20):
+            task_group.start_soon(increment)
+    # A NULL column counts as 0
+    res = await crud.get(row_id=row_id)
+    assert json.loads(res.content)["age"] == 20
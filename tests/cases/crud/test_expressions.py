@@ -0,0 +1,172 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from starlette.applications import Starlette
+from starlette.testclient import TestClient as StarletteTestClient
+from sqlalchemy_api.adapters.fastapi_crud import APICrud as FastAPICrud
+from sqlalchemy_api.adapters.starlette_crud import APICrud as StarletteCrud
+from sqlalchemy_api.crud import CRUDHandler
+from sqlalchemy_api.exceptions import InvalidFilterExpression
+from sqlalchemy_api.expressions import Condition, Group, Not, parse_filter, shape
+from sqlalchemy_api.indexes import IndexPolicy
+from tests.database.session import User
+import json
+import pytest
+
+
+@pytest.fixture
+def users(seed_users):
+    return seed_users(
+        ["name", "age", "status"],
+        [
+            ("Ann", 15, "active"),
+            ("Bob", 25, "active"),
+            ("Carl, Jr", 35, "inactive"),
+            ("Dan", 45, None),
+            ("Eve", None, "deleted"),
+        ],
+    )
+
+
+async def ids(crud: CRUDHandler, expression, **query_params):
+    response = await crud.get_many(query_params={"filter": expression, **query_params})
+    assert response.status_code == 200, response.content
+    return [record["id"] for record in json.loads(response.content)["records"]]
+
+
+def test_parse_text() -> None:
+    node = parse_filter(
+        'or(age.lt.18, and(name.in.("Carl, Jr",Dan), not(status.is_null)))', 8, 32
+    )
+    assert isinstance(node, Group) and node.kind == "or"
+    condition, group = node.operands
+    assert isinstance(condition, Condition)
+    assert (condition.column, condition.operator, condition.value) == (
+        "age",
+        "lt",
+        "18",
+    )
+    assert isinstance(group, Group) and group.operands[0].value == ["Carl, Jr", "Dan"]
+    assert isinstance(group.operands[1], Not)
+    assert shape(node) == ([], [[("age", "lt"), ("name", "in"), ("status", "is_null")]])
+
+
+def test_parse_is_cached_by_normalized_text() -> None:
+    first = parse_filter("and(age.gt.1,name.equal.a)", 8, 32)
+    assert parse_filter(" and( age.gt.1 , name.equal.a ) ", 8, 32) is first
+    first = parse_filter({"not": {"column": "age", "op": "gt", "value": 1}}, 8, 32)
+    assert parse_filter({"not": {"value": 1, "op": "gt", "column": "age"}}, 8, 32) is (
+        first
+    )
+
+
+@pytest.mark.parametrize(
+    "expression",
+    [
+        "and(age.gt.1",
+        "age",
+        "or(age.gt.1)x",
+        'name.equal."open',
+        "not(not(not(age.gt.1)))",
+        "or(" + ",".join(["age.gt.1"] * 5) + ")",
+        {"and": []},
+        {"or": [{"column": "age"}], "not": {}},
+    ],
+)
+def test_invalid_expressions(expression) -> None:
+    with pytest.raises(InvalidFilterExpression):
+        parse_filter(expression, 2, 4)
+
+
+class TestFilterExpressions:
+    @pytest.mark.asyncio
+    async def test_or_across_columns(self, users):
+        assert await ids(users, "or(age.lt.20,status.equal.inactive)") == [1, 3]
+
+    @pytest.mark.asyncio
+    async def test_nested_and_not(self, users):
+        expression = "and(not(status.is_null),or(age.ge.40,name.startswith.B))"
+        assert await ids(users, expression) == [2]
+        assert await ids(users, 'name.in.("Carl, Jr",Eve)') == [3, 5]
+        assert await ids(users, "age.between.(20,40)") == [2, 3]
+
+    @pytest.mark.asyncio
+    async def test_combined_with_column_filters(self, users):
+        assert await ids(users, "or(age.lt.20,age.gt.30)", status="active") == [1]
+
+    @pytest.mark.asyncio
+    async def test_invalid_conditions(self, users):
+        for expression, loc in [
+            ("password.equal.x", ["query", "filter"]),
+            ("age.contains.1", ["query", "age__contains"]),
+            ("age.gt", ["query", "filter"]),
+        ]:
+            response = await users.get_many(query_params={"filter": expression})
+            assert response.status_code == 422
+            assert json.loads(response.content)["detail"][0]["loc"] == loc
+        response = await users.get_many(query_params={"filter": "age.gt.abc"})
+        assert response.status_code == 422
+
+    @pytest.mark.asyncio
+    async def test_limits(self, users):
+        crud = CRUDHandler(model=User, engine=users.engine, max_filter_conditions=2)
+        response = await crud.get_many(
+            query_params={"filter": "or(age.gt.1,age.gt.2,age.gt.3)"}
+        )
+        assert response.status_code == 422
+
+    @pytest.mark.asyncio
+    async def test_index_policy(self, users):
+        crud = CRUDHandler(
+            model=User, engine=users.engine, index_policy=IndexPolicy("cofilter")
+        )
+        response = await crud.get_many(query_params={"filter": "and(id.gt.1,age.gt.1)"})
+        assert response.status_code == 200
+        # An or with an unindexed condition can't use the index of id
+        response = await crud.get_many(query_params={"filter": "or(id.gt.1,age.gt.1)"})
+        assert response.status_code == 422
+        response = await crud.get_many(
+            query_params={"filter": "and(id.lt.4,or(age.gt.1,name.equal.Bob))"}
+        )
+        assert response.status_code == 200
+
+    @pytest.mark.asyncio
+    async def test_search(self, users):
+        response = await users.search(
+            payload={
+                "filter": {
+                    "or": [
+                        {"column": "age", "op": "lt", "value": 20},
+                        {"column": "name", "op": "in", "value": ["Dan", "Eve"]},
+                    ]
+                },
+                "sort": "-id",
+                "page_size": 2,
+            }
+        )
+        content = json.loads(response.content)
+        assert content["total"] == 3
+        assert [record["id"] for record in content["records"]] == [5, 4]
+        response = await users.search(
+            payload={"filter": {"column": "nope", "value": 1}}
+        )
+        assert response.status_code == 422
+        assert json.loads(response.content)["detail"][0]["loc"] == ["body", "filter"]
+        response = await users.search(payload={"page_size": 10_000})
+        assert response.status_code == 422
+
+
+@pytest.mark.parametrize("adapter", ["Starlette", "FastAPI"])
+def test_search_endpoint(adapter, users):
+    if adapter == "Starlette":
+        app = Starlette()
+        app.mount("/user", StarletteCrud(User, users.engine))
+        client = StarletteTestClient(app)
+    else:
+        app = FastAPI()
+        app.include_router(FastAPICrud(User, users.engine), prefix="/user")
+        client = TestClient(app)
+    response = client.post("/user/_search", json={"filter": "not(age.lt.40)"})
+    assert response.status_code == 200
+    assert [record["id"] for record in response.json()["records"]] == [4]
+    response = client.get("/user/", params={"filter": "or(id.equal.1,id.equal.5)"})
+    assert [record["id"] for record in response.json()["records"]] == [1, 5]
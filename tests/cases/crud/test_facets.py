@@ -0,0 +1,108 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy.dialects import postgresql
+from sqlalchemy_api.adapters.fastapi_crud import APICrud
+from sqlalchemy_api.crud import CRUDHandler
+from sqlalchemy_api.facets import facet_statement
+from tests.database.session import User
+import json
+import pytest
+
+
+@pytest.fixture
+def users(seed_users):
+    return seed_users(
+        ["name", "age", "status", "active"],
+        [
+            ("a", 10, "active", True),
+            ("b", 20, "active", False),
+            ("c", 30, "inactive", True),
+            ("d", None, None, True),
+        ],
+    )
+
+
+async def facets(crud: CRUDHandler, **query_params):
+    response = await crud.get_many(query_params=query_params)
+    assert response.status_code == 200, response.content
+    return json.loads(response.content)["facets"]
+
+
+class TestFacets:
+    @pytest.mark.asyncio
+    async def test_counts(self, users):
+        assert await facets(users, facets="status,active") == {
+            "status": [
+                {"value": "active", "count": 2},
+                {"value": "inactive", "count": 1},
+                {"value": None, "count": 1},
+            ],
+            "active": [{"value": True, "count": 3}, {"value": False, "count": 1}],
+        }
+        assert await facets(users) is None
+
+    @pytest.mark.asyncio
+    async def test_under_filters(self, users):
+        # The counts ignore the pagination, not the filters
+        assert await facets(
+            users, facets="active", age="15", age__op="gt", page_size=1
+        ) == {"active": [{"value": False, "count": 1}, {"value": True, "count": 1}]}
+        assert await facets(
+            users, facets="status", filter="not(active.equal.true)"
+        ) == {"status": [{"value": "active", "count": 1}]}
+
+    @pytest.mark.asyncio
+    async def test_columns(self, users):
+        response = await users.get_many(query_params={"facets": "name"})
+        assert response.status_code == 422
+        error = json.loads(response.content)["detail"][0]
+        assert error["loc"] == ["query", "facets"]
+        assert error["input"] == "name"
+        crud = CRUDHandler(model=User, engine=users.engine, facet_columns=["age"])
+        assert await facets(crud, facets="age") == {
+            "age": [
+                {"value": 10, "count": 1},
+                {"value": 20, "count": 1},
+                {"value": 30, "count": 1},
+                {"value": None, "count": 1},
+            ]
+        }
+        with pytest.raises(ValueError):
+            CRUDHandler(model=User, engine=users.engine, facet_columns=["nope"])
+
+    @pytest.mark.asyncio
+    async def test_search(self, users):
+        response = await users.search(
+            payload={"filter": "age.lt.25", "facets": ["status", "active"]}
+        )
+        content = json.loads(response.content)
+        assert content["facets"]["status"] == [{"value": "active", "count": 2}]
+
+    def test_fastapi(self, users):
+        app = FastAPI()
+        app.include_router(APICrud(User, users.engine), prefix="/user")
+        client = TestClient(app)
+        response = client.get("/user/", params={"facets": "active", "status": "active"})
+        assert response.json()["facets"] == {
+            "active": [{"value": False, "count": 1}, {"value": True, "count": 1}]
+        }
+
+
+def test_grouping_sets() -> None:
+    table = User.__table__
+    stmt = facet_statement(
+        "postgresql", table, [table.c.status, table.c.active], table.c.age > 1
+    )
+    sql = str(stmt.compile(dialect=postgresql.dialect()))
+    assert "grouping(users.status) AS grouping_0" in sql
+    assert sql.endswith("GROUP BY GROUPING SETS(users.status, users.active)")
+    stmt = facet_statement("sqlite", table, [table.c.status, table.c.active], None)
+    assert " UNION ALL " in str(stmt)
+
+
+@pytest.mark.asyncio
+async def test_counts_across_shards(user_crud):
+    crud = user_crud()
+    assert await facets(crud, facets="active", id="8", id__op="le") == {
+        "active": [{"value": True, "count": 8}]
+    }
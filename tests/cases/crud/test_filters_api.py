@@ -388,3 +388,84 @@ class TestInvalidOperator:
             f"{PREFIX}", params={"name": "John", "name__op": "invalid"}
         )
         assert response.status_code == 422
+
+
+class TestListOperators:
+    def setup_method(self):
+        Base.metadata.create_all(engine)
+        with TestSession() as db_session:
+            for x in range(10):
+                new_user = example_user.copy()
+                new_user["age"] = x
+                new_user["name"] = f"user{x}"
+                new_user["status"] = ["active", "inactive", "deleted"][x % 3]
+                db_session.execute(insert(User).values(new_user))
+            db_session.commit()
+
+    def teardown_method(self):
+        Base.metadata.drop_all(engine)
+
+    def ages(self, response):
+        assert response.status_code == 200, response.text
+        return sorted(item.get("age") for item in response.json().get("records"))
+
+    def test_in_operator_comma_separated(self, client):
+        response = client.get(f"{PREFIX}", params={"age": "1,3,5", "age__op": "in"})
+        assert self.ages(response) == [1, 3, 5]
+
+    def test_in_operator_repeated(self, client):
+        response = client.get(
+            f"{PREFIX}", params=[("age", 2), ("age", 4), ("age__op", "in")]
+        )
+        assert self.ages(response) == [2, 4]
+        response = client.get(
+            f"{PREFIX}",
+            params=[
+                ("status", "inactive"),
+                ("status", "deleted"),
+                ("status__op", "in"),
+            ],
+        )
+        assert self.ages(response) == [1, 2, 4, 5, 7, 8]
+
+    def test_not_in_operator(self, client):
+        response = client.get(
+            f"{PREFIX}", params={"age": "0,1,2,3,4,5", "age__op": "not_in"}
+        )
+        assert self.ages(response) == [6, 7, 8, 9]
+
+    def test_between_operator(self, client):
+        response = client.get(f"{PREFIX}", params={"age": "3,6", "age__op": "between"})
+        assert self.ages(response) == [3, 4, 5, 6]
+
+    def test_between_needs_two_values(self, client):
+        response = client.get(
+            f"{PREFIX}", params={"age": "3,6,9", "age__op": "between"}
+        )
+        assert response.status_code == 422
+
+    def test_invalid_list_value(self, client):
+        response = client.get(f"{PREFIX}", params={"age": "1,x", "age__op": "in"})
+        assert response.status_code == 422
+
+    def test_repeated_single_value_keeps_last(self, client):
+        response = client.get(f"{PREFIX}", params=[("age", 2), ("age", 4)])
+        assert self.ages(response) == [4]
+
+
+def test_in_operator_statement_is_cached():
+    from sqlalchemy import select
+    from sqlalchemy_api.crud import CRUDHandler
+
+    crud = CRUDHandler(model=User, engine=engine)
+    statements = [
+        str(
+            crud.apply_filters(
+                select(User), {"age": ",".join(map(str, values)), "age__op": "in"}
+            )
+        )
+        for values in [range(2), range(200)]
+    ]
+    # An expanding bind parameter: one statement for any number of values
+    assert statements[0] == statements[1]
+    assert "POSTCOMPILE" in statements[0]
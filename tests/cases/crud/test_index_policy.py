@@ -0,0 +1,89 @@
+from sqlalchemy import Column, Index, Integer, String, UniqueConstraint
+from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy_api.crud import CRUDHandler
+from sqlalchemy_api.indexes import IndexAdvisor, IndexPolicy, indexed_columns
+from tests.database.session import User, engine
+import json
+import pytest
+
+
+class Base(DeclarativeBase):
+    ...
+
+
+class Order(Base):
+    __tablename__ = "orders"
+    __table_args__ = (
+        Index("ix_orders_customer_status", "customer", "status"),
+        UniqueConstraint("reference", "customer"),
+    )
+    id = Column(Integer, primary_key=True)
+    customer = Column(Integer)
+    status = Column(String)
+    reference = Column(String)
+    email = Column(String, unique=True)
+    note = Column(String)
+
+
+def test_indexed_columns():
+    assert indexed_columns(Order.__table__) == {"id", "customer", "reference", "email"}
+
+
+def test_policy_modes():
+    indexed = {"id", "customer"}
+    IndexPolicy("allow").check("orders", [("note", "equal")], indexed)
+    IndexPolicy("cofilter").check(
+        "orders", [("customer", "equal"), ("note", "equal")], indexed
+    )
+    with pytest.raises(ValueError):
+        IndexPolicy("cofilter").check("orders", [("note", "equal")], indexed)
+    with pytest.raises(ValueError):
+        IndexPolicy("reject").check(
+            "orders", [("customer", "equal"), ("note", "equal")], indexed
+        )
+    with pytest.raises(ValueError):
+        # contains can't use the index of customer
+        IndexPolicy("reject").check("orders", [("customer", "contains")], indexed)
+
+
+def test_advisor_recommendations():
+    advisor = IndexAdvisor()
+    policy = IndexPolicy("allow", advisor=advisor)
+    indexed = indexed_columns(Order.__table__)
+    for _ in range(3):
+        policy.check("orders", [("note", "gt"), ("status", "equal")], indexed)
+    policy.check("orders", [("status", "equal"), ("note", "ge")], indexed)
+    policy.check("orders", [("note", "contains")], indexed)
+    policy.check("orders", [("customer", "equal"), ("note", "equal")], indexed)
+    [status_note, contains] = advisor.recommendations()
+    assert status_note.columns == ["status", "note"]
+    assert status_note.count == 4
+    assert status_note.statement == (
+        "CREATE INDEX ix_orders_status_note ON orders (status, note)"
+    )
+    assert contains.columns == []
+    assert contains.unsupported == ["note"]
+    assert advisor.recommendations(min_count=2) == [status_note]
+
+
+class TestCRUDHandlerIndexPolicy:
+    @pytest.mark.asyncio
+    async def test_unindexed_filter_is_rejected(self, db_session):
+        crud = CRUDHandler(model=User, engine=engine, index_policy=IndexPolicy())
+        assert {f.name: f.indexed for f in crud.get_filters()}["id"] is True
+        res = await crud.get_many(query_params={"name": "John"})
+        assert res.status_code == 422
+        [error] = json.loads(res.content)["detail"]
+        assert error["loc"] == ["query", "name"]
+        assert error["indexed_columns"] == ["id"]
+
+    @pytest.mark.asyncio
+    async def test_indexed_cofilter(self, db_session):
+        policy = IndexPolicy()
+        crud = CRUDHandler(model=User, engine=engine, index_policy=policy)
+        res = await crud.get_many(query_params={"name": "John", "id": "1"})
+        assert res.status_code == 200
+        assert policy.advisor.recommendations() == []
+        await crud.get_many(query_params={"name": "John"})
+        [recommendation] = policy.advisor.recommendations()
+        assert recommendation.columns == ["name"]
@@ -0,0 +1,195 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import (
+    ARRAY,
+    JSON,
+    Column,
+    Index,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    create_engine,
+    insert,
+)
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
+from sqlalchemy_api.adapters.fastapi_crud import APICrud
+from sqlalchemy_api.crud import CRUDHandler
+from sqlalchemy_api.indexes import IndexPolicy, gin_indexed
+from sqlalchemy_api.json_filters import json_condition
+from typing import Any, Optional
+import json
+import pytest
+
+
+class Base(DeclarativeBase):
+    pass
+
+
+class Document(Base):
+    __tablename__ = "documents"
+    id: Mapped[int] = mapped_column(primary_key=True)
+    meta: Mapped[Optional[Any]] = mapped_column(JSON)
+    tags: Mapped[Optional[Any]] = mapped_column(JSON)
+
+
+DOCUMENTS = [
+    (1, {"a": {"b": "x"}, "n": 1, "ok": True}, ["red", "blue"]),
+    (2, {"a": {"b": "y"}, "n": 2}, ["green"]),
+    (3, {"c": None, "list": [1, 2]}, [1, 2]),
+    (4, None, None),
+]
+
+
+@pytest.fixture
+def documents(tmp_path):
+    engine = create_engine(
+        f"sqlite:///{tmp_path}/documents.db", connect_args={"check_same_thread": False}
+    )
+    Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(
+            insert(Document),
+            [{"id": id_, "meta": meta, "tags": tags} for id_, meta, tags in DOCUMENTS],
+        )
+    yield CRUDHandler(model=Document, engine=engine)
+    engine.dispose()
+
+
+async def ids(crud: CRUDHandler, **query_params):
+    response = await crud.get_many(query_params=query_params)
+    assert response.status_code == 200, response.content
+    return [record["id"] for record in json.loads(response.content)["records"]]
+
+
+class TestJSONFilters:
+    @pytest.mark.asyncio
+    async def test_has_key(self, documents):
+        assert await ids(documents, meta="a", meta__op="has_key") == [1, 2]
+        # A null value is still a key
+        assert await ids(documents, meta="c", meta__op="has_key") == [3]
+
+    @pytest.mark.asyncio
+    async def test_path_equal(self, documents):
+        assert await ids(documents, meta="a.b=x", meta__op="path_equal") == [1]
+        assert await ids(documents, meta="n=2", meta__op="path_equal") == [2]
+        assert await ids(documents, meta="ok=true", meta__op="path_equal") == [1]
+        assert await ids(documents, meta="c=null", meta__op="path_equal") == [3]
+
+    @pytest.mark.asyncio
+    async def test_contains_json(self, documents):
+        query_params = {"meta": '{"a": {"b": "y"}}', "meta__op": "contains_json"}
+        assert await ids(documents, **query_params) == [2]
+        query_params = {"meta": '{"list": [2]}', "meta__op": "contains_json"}
+        assert await ids(documents, **query_params) == [3]
+
+    @pytest.mark.asyncio
+    async def test_arrays(self, documents):
+        query_params = {"tags": "red,green", "tags__op": "array_overlaps"}
+        assert await ids(documents, **query_params) == [1, 2]
+        query_params = {"tags": ["blue", "red"], "tags__op": "array_contains"}
+        assert await ids(documents, **query_params) == [1]
+        # JSON arrays keep the types of their items
+        assert await ids(documents, tags="[1]", tags__op="array_contains") == [3]
+
+    @pytest.mark.asyncio
+    async def test_patch_dollar_keys(self, documents):
+        # `$` keys of a JSON column are values, not update operators
+        response = await documents.patch(row_id=4, payload={"meta": {"$ref": 1}})
+        assert response.status_code == 200, response.content
+        assert json.loads(response.content)["meta"] == {"$ref": 1}
+
+    @pytest.mark.asyncio
+    async def test_filter_expression(self, documents):
+        expression = "or(meta.has_key.c,tags.array_contains.(red,blue))"
+        assert await ids(documents, filter=expression) == [1, 3]
+        response = await documents.search(
+            payload={
+                "filter": {
+                    "column": "meta",
+                    "op": "contains_json",
+                    "value": {"a": {"b": "x"}},
+                }
+            }
+        )
+        assert [record["id"] for record in json.loads(response.content)["records"]] == [
+            1
+        ]
+
+    @pytest.mark.asyncio
+    async def test_invalid_values(self, documents):
+        for query_params in [
+            {"meta": "a.b", "meta__op": "path_equal"},
+            {"meta": 'a={"b": 1}', "meta__op": "path_equal"},
+            {"tags": "[]", "tags__op": "array_contains"},
+            {"meta": '[{"a": 1}]', "meta__op": "contains_json"},
+        ]:
+            response = await documents.get_many(query_params=query_params)
+            assert response.status_code == 422, query_params
+            loc = json.loads(response.content)["detail"][0]["loc"]
+            assert loc == ["query", [*query_params][0]]
+
+    @pytest.mark.asyncio
+    async def test_index_policy(self, documents):
+        crud = CRUDHandler(
+            model=Document, engine=documents.engine, index_policy=IndexPolicy("reject")
+        )
+        response = await crud.get_many(
+            query_params={"meta": "a", "meta__op": "has_key"}
+        )
+        assert response.status_code == 422
+
+    def test_fastapi(self, documents):
+        app = FastAPI()
+        app.include_router(APICrud(Document, documents.engine), prefix="/document")
+        client = TestClient(app)
+        response = client.get(
+            "/document/",
+            params={"tags": ["red", "green"], "tags__op": "array_overlaps"},
+        )
+        assert [record["id"] for record in response.json()["records"]] == [1, 2]
+        assert response.json()["records"][0]["tags"] == ["red", "blue"]
+
+
+def test_postgresql_statements() -> None:
+    table = Table(
+        "documents",
+        MetaData(),
+        Column("id", Integer, primary_key=True),
+        Column("meta", JSONB),
+        Column("raw", JSON),
+        Column("tags", ARRAY(String)),
+        Index(
+            "ix_documents_meta",
+            "meta",
+            postgresql_using="gin",
+            postgresql_ops={"meta": "jsonb_path_ops"},
+        ),
+        Index("ix_documents_tags", "tags", postgresql_using="gin"),
+    )
+
+    def sql(column, operator, value):
+        condition = json_condition("postgresql", table.c[column], operator, value)
+        return str(condition.compile(dialect=postgresql.dialect()))
+
+    assert sql("meta", "has_key", "a") == "documents.meta ? %(meta_1)s"
+    # Containment, so the GIN index serves the path
+    assert sql("meta", "path_equal", "a.b=1") == "documents.meta @> %(meta_1)s::JSONB"
+    assert sql("raw", "has_key", "a") == "CAST(documents.raw AS JSONB) ? %(param_1)s"
+    assert sql("tags", "array_overlaps", "x,y") == (
+        "documents.tags && %(param_1)s::VARCHAR[]"
+    )
+    assert sql("tags", "array_contains", "x") == (
+        "documents.tags @> %(param_1)s::VARCHAR[]"
+    )
+    # jsonb_path_ops doesn't serve `?`
+    assert gin_indexed(table) == {
+        "meta__contains_json",
+        "meta__path_equal",
+        "meta__array_overlaps",
+        "meta__array_contains",
+        "tags__array_overlaps",
+        "tags__array_contains",
+    }
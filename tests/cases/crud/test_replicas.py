@@ -0,0 +1,125 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from starlette.applications import Starlette
+from starlette.testclient import TestClient as StarletteTestClient
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import Session
+from sqlalchemy_api.adapters.fastapi_crud import APICrud as FastAPIAPICrud
+from sqlalchemy_api.adapters.starlette_crud import APICrud as StarletteAPICrud
+from sqlalchemy_api.crud import CRUDHandler
+from sqlalchemy_api.replicas import ReplicaRouter, client
+from tests.database.session import Base, User
+from datetime import date
+import json
+import pytest
+
+
+@pytest.fixture
+def engines(tmp_path):
+    """
+    Writer and two readers, each with a user named after its database
+    """
+    engines = {}
+    for name in ["writer", "reader0", "reader1"]:
+        engine = create_engine(
+            f"sqlite:///{tmp_path}/{name}.db",
+            connect_args={"check_same_thread": False},
+        )
+        Base.metadata.create_all(engine)
+        with Session(engine) as session:
+            session.execute(
+                insert(User), [{"name": name, "birthday": date(1990, 1, 1)}]
+            )
+            session.commit()
+        engines[name] = engine
+    yield engines
+    for engine in engines.values():
+        engine.dispose()
+
+
+async def served_by(crud: CRUDHandler) -> str:
+    response = await crud.get_many(query_params={})
+    return json.loads(response.content)["records"][0]["name"]
+
+
+class TestReplicaRouter:
+    @pytest.mark.asyncio
+    async def test_round_robin(self, engines):
+        replicas = ReplicaRouter([engines["reader0"], engines["reader1"]])
+        crud = CRUDHandler(model=User, engine=engines["writer"], replicas=replicas)
+        assert [await served_by(crud) for _ in range(3)] == [
+            "reader0",
+            "reader1",
+            "reader0",
+        ]
+        response = await crud.get(row_id=1)
+        assert json.loads(response.content)["name"] == "reader1"
+
+    def test_least_busy(self, engines):
+        replicas = ReplicaRouter(
+            [engines["reader0"], engines["reader1"]], balancing="least_busy"
+        )
+        with replicas.reader() as first:
+            assert first == 0
+            assert replicas.choose() == 1
+            # Ties are broken round robin
+            assert replicas.choose() == 0
+            assert replicas.choose() == 1
+            assert replicas.in_flight == [2, 2]
+        assert replicas.in_flight == [1, 2]
+        assert replicas.choose() == 0
+
+    @pytest.mark.asyncio
+    async def test_writes_go_to_writer(self, engines):
+        replicas = ReplicaRouter([engines["reader0"]])
+        crud = CRUDHandler(model=User, engine=engines["writer"], replicas=replicas)
+        response = await crud.post(payload={"name": "new", "birthday": "2000-01-01"})
+        assert response.status_code == 201
+        with Session(engines["writer"]) as session:
+            assert session.get(User, 2).name == "new"
+        with Session(engines["reader0"]) as session:
+            assert session.get(User, 2) is None
+
+    @pytest.mark.asyncio
+    async def test_stickiness(self, engines):
+        replicas = ReplicaRouter([engines["reader0"]], stickiness=60)
+        crud = CRUDHandler(model=User, engine=engines["writer"], replicas=replicas)
+        with client("alice"):
+            await crud.put(row_id=1, payload={"age": 30})
+            assert await served_by(crud) == "writer"
+        with client("bob"):
+            assert await served_by(crud) == "reader0"
+        assert await served_by(crud) == "reader0"
+
+    def test_stickiness_window(self, engines):
+        replicas = ReplicaRouter([engines["reader0"]], stickiness=0.01)
+        with client("alice"):
+            replicas.record_write()
+            assert replicas.is_sticky()
+            replicas.last_writes["alice"] -= 1
+            assert not replicas.is_sticky()
+
+
+@pytest.mark.parametrize("adapter", ["Starlette", "FastAPI"])
+def test_client_token(adapter, engines):
+    replicas = ReplicaRouter([engines["reader0"]], stickiness=60)
+    if adapter == "Starlette":
+        app = Starlette()
+        app.mount("/user", StarletteAPICrud(User, engines["writer"], replicas=replicas))
+        test_client = StarletteTestClient
+    else:
+        app = FastAPI()
+        app.include_router(
+            FastAPIAPICrud(User, engines["writer"], replicas=replicas), prefix="/user"
+        )
+        test_client = TestClient
+    with test_client(app) as http:
+        payload = {"name": "new", "birthday": "2000-01-01"}
+        response = http.post("/user/", json=payload, headers={"X-Client-Token": "a"})
+        assert response.status_code == 201
+        response = http.get("/user/", headers={"X-Client-Token": "a"})
+        assert response.json()["total"] == 2
+        http.cookies.set("client_token", "a")
+        assert http.get("/user/").json()["total"] == 2
+        http.cookies.clear()
+        assert http.get("/user/").json()["total"] == 1
@@ -0,0 +1,175 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+from sqlalchemy_api.adapters.fastapi_crud import APICrud
+from sqlalchemy_api.crud import CRUDHandler
+from sqlalchemy_api.pagination import decode_cursor, encode_cursor
+from sqlalchemy_api.replicas import ReplicaRouter
+from sqlalchemy_api.routing import ShardRouting
+from sqlalchemy_api.sharding import ShardMap, hash_shard
+from tests.database.session import Post, User
+from datetime import date
+import json
+import pytest
+
+
+def shard_ids(engine, model=User):
+    with Session(engine) as session:
+        return session.execute(select(model.id).order_by(model.id)).scalars().all()
+
+
+def test_hash_shard_is_stable() -> None:
+    shard_for = hash_shard(["a", "b", "c"])
+    assert [shard_for(value) for value in range(20)] == [
+        shard_for(value) for value in range(20)
+    ]
+    assert {shard_for(value) for value in range(20)} == {"a", "b", "c"}
+
+
+def test_routing(shards, user_crud) -> None:
+    crud = user_crud()
+    assert isinstance(crud.routing, ShardRouting)
+    assert [session.get_bind() for session in crud.routing.row_sessions(3)] == [
+        shards["odd"]
+    ]
+    assert not crud.routing.can_join(shards["even"])
+    with pytest.raises(ValueError):
+        CRUDHandler(
+            model=User,
+            engine=shards["even"],
+            shards=crud.shards,
+            replicas=ReplicaRouter([shards["odd"]]),
+        )
+
+
+def test_cursor_round_trip() -> None:
+    assert decode_cursor(encode_cursor([42])) == [42]
+
+
+class TestShardedCRUD:
+    @pytest.mark.asyncio
+    async def test_get_routes_by_primary_key(self, user_crud):
+        crud = user_crud()
+        response = await crud.get(row_id=3)
+        assert json.loads(response.content)["name"] == "user3"
+        response = await crud.get(row_id=11)
+        assert response.status_code == 404
+
+    @pytest.mark.asyncio
+    async def test_post_routes_by_shard_key(self, shards, user_crud):
+        crud = user_crud()
+        response = await crud.post(
+            payload={"id": 12, "name": "new", "birthday": "2000-01-01"}
+        )
+        assert response.status_code == 201
+        assert json.loads(response.content)["id"] == 12
+        assert 12 in shard_ids(shards["even"])
+        assert 12 not in shard_ids(shards["odd"])
+
+    @pytest.mark.asyncio
+    async def test_post_without_shard_key(self, user_crud):
+        crud = user_crud()
+        response = await crud.post(payload={"name": "new", "birthday": "2000-01-01"})
+        assert response.status_code == 422
+        assert json.loads(response.content)["detail"][0]["loc"] == ["body", "id"]
+
+    @pytest.mark.asyncio
+    async def test_put_and_delete(self, shards, user_crud):
+        crud = user_crud()
+        response = await crud.put(row_id=4, payload={"name": "renamed"})
+        assert json.loads(response.content)["name"] == "renamed"
+        response = await crud.delete(row_id=5)
+        assert response.status_code == 200
+        assert 5 not in shard_ids(shards["odd"])
+        response = await crud.delete(row_id=5)
+        assert response.status_code == 404
+
+    @pytest.mark.asyncio
+    async def test_non_primary_shard_key(self, shards, shard_map):
+        shard_map = ShardMap(shards, key="user_id", shard_for=shard_map.shard_for)
+        crud = CRUDHandler(model=Post, engine=shard_map.engine, shards=shard_map)
+        response = await crud.get(row_id=30)
+        assert json.loads(response.content)["user_id"] == 3
+        response = await crud.post(payload={"content": "new", "user_id": 11})
+        assert response.status_code == 201
+        post_id = json.loads(response.content)["id"]
+        assert post_id in shard_ids(shards["odd"], Post)
+        assert post_id not in shard_ids(shards["even"], Post)
+        response = await crud.put(row_id=30, payload={"user_id": 4})
+        assert response.status_code == 422
+        response = await crud.delete(row_id=40)
+        assert response.status_code == 200
+
+    @pytest.mark.asyncio
+    async def test_get_many_merges_shards(self, user_crud):
+        crud = user_crud()
+        response = await crud.get_many(query_params={"page_size": 4, "page": 2})
+        content = json.loads(response.content)
+        assert content["total"] == 10
+        assert [record["id"] for record in content["records"]] == [5, 6, 7, 8]
+        response = await crud.get_many(query_params={"id": 6, "age__op": "is_null"})
+        content = json.loads(response.content)
+        assert [record["id"] for record in content["records"]] == [6]
+
+    @pytest.mark.asyncio
+    async def test_get_many_routes_equality_filter(self, user_crud):
+        crud = user_crud(metrics=None)
+        assert crud.query_shards({"id": "3"}) == ["odd"]
+        assert crud.query_shards({"id": "3", "id__op": "gt"}) == ["even", "odd"]
+        assert crud.query_shards({}) == ["even", "odd"]
+
+    @pytest.mark.asyncio
+    async def test_cursor_pagination_across_shards(self, user_crud):
+        crud = user_crud()
+        ids = []
+        cursor = ""
+        while cursor is not None:
+            response = await crud.get_many(
+                query_params={"page_size": 3, "cursor": cursor}
+            )
+            content = json.loads(response.content)
+            ids.append([record["id"] for record in content["records"]])
+            cursor = content["next_cursor"]
+        assert ids == [[1, 2, 3], [4, 5, 6], [7, 8, 9], [10]]
+
+    @pytest.mark.asyncio
+    async def test_invalid_cursor(self, user_crud):
+        crud = user_crud()
+        for cursor in ["not a cursor", encode_cursor(["abc"]), encode_cursor([])]:
+            response = await crud.get_many(query_params={"cursor": cursor})
+            assert response.status_code == 422
+
+    def test_fastapi(self, shard_map):
+        app = FastAPI()
+        app.include_router(
+            APICrud(User, shard_map.engine, shards=shard_map), prefix="/user"
+        )
+        client = TestClient(app)
+        response = client.get("/user/", params={"page_size": 2, "cursor": ""})
+        content = response.json()
+        assert [record["id"] for record in content["records"]] == [1, 2]
+        response = client.get(
+            "/user/", params={"page_size": 2, "cursor": content["next_cursor"]}
+        )
+        assert [record["id"] for record in response.json()["records"]] == [3, 4]
+
+
+@pytest.mark.asyncio
+async def test_cursor_pagination(db_session):
+    db_session.execute(
+        insert(User),
+        [{"name": f"user{index}", "birthday": date(2000, 1, 1)} for index in range(5)],
+    )
+    db_session.commit()
+    crud = CRUDHandler(model=User, engine=db_session.get_bind())
+    response = await crud.get_many(query_params={"page_size": 3, "cursor": ""})
+    content = json.loads(response.content)
+    assert content["total"] == 5
+    assert len(content["records"]) == 3
+    response = await crud.get_many(
+        query_params={"page_size": 3, "cursor": content["next_cursor"]}
+    )
+    content = json.loads(response.content)
+    assert len(content["records"]) == 2
+    assert content["next_cursor"] is None
@@ -0,0 +1,153 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy_api.adapters.fastapi_crud import APICrud
+from sqlalchemy_api.crud import CRUDHandler
+from sqlalchemy_api.indexes import IndexPolicy
+from sqlalchemy_api.pagination import encode_cursor
+from sqlalchemy_api.sorting import parse_sort
+from tests.database.session import User
+from datetime import datetime
+import json
+import pytest
+
+COLUMNS = ["id", "name", "age", "created_at"]
+
+
+@pytest.fixture
+def users(seed_users):
+    """
+    Users with repeated and NULL ages and creation dates
+    """
+    return seed_users(
+        ["name", "age", "created_at"],
+        [
+            ("a", 30, datetime(2020, 1, 3)),
+            ("b", None, datetime(2020, 1, 1)),
+            ("c", 20, None),
+            ("d", 30, datetime(2020, 1, 2)),
+            ("e", 20, datetime(2020, 1, 3)),
+            ("f", None, None),
+            ("g", 30, datetime(2020, 1, 1)),
+        ],
+    )
+
+
+async def all_pages(crud: CRUDHandler, sort: str, page_size: int = 2):
+    pages = []
+    cursor = ""
+    while cursor is not None:
+        response = await crud.get_many(
+            query_params={"sort": sort, "page_size": page_size, "cursor": cursor}
+        )
+        assert response.status_code == 200, response.content
+        content = json.loads(response.content)
+        pages.append([record["id"] for record in content["records"]])
+        cursor = content["next_cursor"]
+    return pages
+
+
+def test_parse_sort() -> None:
+    assert parse_sort(None, COLUMNS, "id") == [("id", False)]
+    assert parse_sort("-age,name", COLUMNS, "id") == [
+        ("age", True),
+        ("name", False),
+        ("id", False),
+    ]
+    assert parse_sort("-id,age,age", COLUMNS, "id") == [("id", True), ("age", False)]
+    with pytest.raises(ValueError):
+        parse_sort("password", COLUMNS, "id")
+
+
+class TestSorting:
+    @pytest.mark.asyncio
+    async def test_offset_pages(self, users):
+        response = await users.get_many(query_params={"sort": "-age", "page_size": 4})
+        content = json.loads(response.content)
+        # NULLs are the greatest values, first in descending order
+        assert [record["id"] for record in content["records"]] == [2, 6, 1, 4]
+        response = await users.get_many(
+            query_params={"sort": "-age", "page_size": 4, "page": 2}
+        )
+        content = json.loads(response.content)
+        assert [record["id"] for record in content["records"]] == [7, 3, 5]
+
+    @pytest.mark.asyncio
+    async def test_default_order_is_primary_key(self, users):
+        response = await users.get_many(query_params={})
+        content = json.loads(response.content)
+        assert [record["id"] for record in content["records"]] == [1, 2, 3, 4, 5, 6, 7]
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize(
+        "sort,expected",
+        [
+            ("age", [[3, 5], [1, 4], [7, 2], [6]]),
+            ("-created_at,name", [[3, 6], [1, 5], [4, 2], [7]]),
+            ("age,-created_at", [[3, 5], [1, 4], [7, 6], [2]]),
+            ("-id", [[7, 6], [5, 4], [3, 2], [1]]),
+        ],
+    )
+    async def test_cursor_pages(self, users, sort, expected):
+        assert await all_pages(users, sort) == expected
+
+    @pytest.mark.asyncio
+    async def test_cursor_of_another_sort(self, users):
+        response = await users.get_many(
+            query_params={"sort": "-age", "cursor": encode_cursor([1])}
+        )
+        assert response.status_code == 422
+
+    @pytest.mark.asyncio
+    async def test_invalid_sort(self, users):
+        response = await users.get_many(query_params={"sort": "age,password"})
+        assert response.status_code == 422
+        error = json.loads(response.content)["detail"][0]
+        assert error["loc"] == ["query", "sort"]
+        assert error["input"] == "password"
+
+    @pytest.mark.asyncio
+    async def test_index_policy(self, users):
+        crud = CRUDHandler(
+            model=User, engine=users.engine, index_policy=IndexPolicy("reject")
+        )
+        response = await crud.get_many(query_params={"sort": "-id"})
+        assert response.status_code == 200
+        response = await crud.get_many(query_params={"sort": "-age"})
+        assert response.status_code == 422
+        error = json.loads(response.content)["detail"][0]
+        assert error["loc"] == ["query", "sort"]
+        assert error["indexed_columns"] == ["id"]
+        crud = CRUDHandler(
+            model=User, engine=users.engine, index_policy=IndexPolicy("allow")
+        )
+        response = await crud.get_many(query_params={"sort": "-age"})
+        assert response.status_code == 200
+
+    def test_fastapi(self, users):
+        app = FastAPI()
+        app.include_router(APICrud(User, users.engine), prefix="/user")
+        client = TestClient(app)
+        response = client.get("/user/", params={"sort": "-age,name", "page_size": 3})
+        assert [record["id"] for record in response.json()["records"]] == [2, 6, 1]
+        response = client.get("/user/", params={"sort": "age;drop"})
+        assert response.status_code == 422
+        parameters = client.get("/openapi.json").json()["paths"]["/user"]["get"][
+            "parameters"
+        ]
+        sort = next(
+            parameter for parameter in parameters if parameter["name"] == "sort"
+        )
+        assert "`created_at`" in sort["description"]
+
+
+@pytest.mark.asyncio
+async def test_sorted_merge_across_shards(user_crud):
+    crud = user_crud()
+    response = await crud.get_many(
+        query_params={"sort": "-name", "page_size": 4, "page": 2}
+    )
+    content = json.loads(response.content)
+    # user10 sorts between user1 and user2
+    assert [record["id"] for record in content["records"]] == [5, 4, 3, 2]
+    pages = await all_pages(crud, "-name", page_size=4)
+    assert pages == [[9, 8, 7, 6], [5, 4, 3, 2], [10, 1]]
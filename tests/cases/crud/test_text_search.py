@@ -0,0 +1,162 @@
+from sqlalchemy import create_engine, insert, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import DeclarativeBase, Mapped, Session, mapped_column
+from sqlalchemy_api.crud import CRUDHandler
+from sqlalchemy_api.indexes import IndexPolicy
+from sqlalchemy_api.text_search import TextSearch, fts5_statements, search_condition
+import json
+import pytest
+
+
+class Base(DeclarativeBase):
+    pass
+
+
+class Article(Base):
+    __tablename__ = "articles"
+    id: Mapped[int] = mapped_column(primary_key=True)
+    title: Mapped[str] = mapped_column()
+    body: Mapped[str] = mapped_column()
+
+
+ARTICLES = [
+    (1, "Red fox", "The quick brown fox"),
+    (2, "Blue whale", "A red red red sea"),
+    (3, "Fox den", "A red fox and another fox"),
+    (4, "100% cotton", "Red_shirt"),
+]
+
+
+@pytest.fixture
+def articles(tmp_path):
+    engine = create_engine(
+        f"sqlite:///{tmp_path}/articles.db", connect_args={"check_same_thread": False}
+    )
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        for statement in fts5_statements(
+            "articles", "id", ["title", "body"], "articles_fts"
+        ):
+            session.execute(text(statement))
+        session.execute(
+            insert(Article),
+            [
+                {"id": id_, "title": title, "body": body}
+                for id_, title, body in ARTICLES
+            ],
+        )
+        session.commit()
+    crud = CRUDHandler(
+        model=Article,
+        engine=engine,
+        text_search={
+            "title": TextSearch(fts_table="articles_fts"),
+            "body": TextSearch(fts_table="articles_fts"),
+        },
+    )
+    yield crud
+    engine.dispose()
+
+
+async def ids(crud: CRUDHandler, **query_params):
+    response = await crud.get_many(query_params=query_params)
+    assert response.status_code == 200, response.content
+    return [record["id"] for record in json.loads(response.content)["records"]]
+
+
+class TestTextSearch:
+    @pytest.mark.asyncio
+    async def test_search(self, articles):
+        assert await ids(articles, body="red fox", body__op="search") == [3]
+        assert await ids(articles, body="RED", body__op="search") == [2, 3, 4]
+        # Restricted to the column, "fox" of the first title isn't in its body
+        assert await ids(articles, title="fox", title__op="search") == [1, 3]
+        # FTS5 query syntax is not interpreted
+        assert await ids(articles, body='fox OR "sea', body__op="search") == []
+        assert await ids(articles, body=" ", body__op="search") == []
+
+    @pytest.mark.asyncio
+    async def test_icontains(self, articles):
+        assert await ids(articles, title="FOX", title__op="icontains") == [1, 3]
+        assert await ids(articles, title="0%", title__op="icontains") == [4]
+        assert await ids(articles, title="e_w", title__op="icontains") == []
+        assert await ids(articles, body="d_s", body__op="icontains") == [4]
+
+    @pytest.mark.asyncio
+    async def test_rank(self, articles):
+        query_params = {"body": "red", "body__op": "search"}
+        assert await ids(articles, **query_params, rank="true") == [2, 4, 3]
+        assert await ids(articles, **query_params, rank="false") == [2, 3, 4]
+        response = await articles.get_many(
+            query_params={**query_params, "rank": "true", "cursor": ""}
+        )
+        assert response.status_code == 422
+        assert json.loads(response.content)["detail"][0]["loc"] == ["query", "rank"]
+
+    @pytest.mark.asyncio
+    async def test_filter_expression(self, articles):
+        expression = 'or(title.icontains.whale,body.search."another fox")'
+        assert await ids(articles, filter=expression) == [2, 3]
+        response = await articles.search(
+            payload={"filter": "and(body.search.red,id.gt.1)", "rank": True}
+        )
+        records = json.loads(response.content)["records"]
+        assert [record["id"] for record in records] == [2, 4, 3]
+
+    @pytest.mark.asyncio
+    async def test_undeclared_column(self, articles):
+        crud = CRUDHandler(model=Article, engine=articles.engine)
+        response = await crud.get_many(
+            query_params={"body": "red", "body__op": "search"}
+        )
+        assert response.status_code == 422
+
+    @pytest.mark.asyncio
+    async def test_index_policy(self, articles):
+        crud = CRUDHandler(
+            model=Article,
+            engine=articles.engine,
+            text_search=articles.text_search,
+            index_policy=IndexPolicy("reject"),
+        )
+        response = await crud.get_many(
+            query_params={"body": "red", "body__op": "search"}
+        )
+        assert response.status_code == 200
+        # Only a pg_trgm index serves icontains
+        response = await crud.get_many(
+            query_params={"body": "red", "body__op": "icontains"}
+        )
+        assert response.status_code == 422
+
+    def test_sqlite_needs_fts_table(self, articles):
+        with pytest.raises(ValueError):
+            CRUDHandler(
+                model=Article,
+                engine=articles.engine,
+                text_search={"body": TextSearch()},
+            )
+        with pytest.raises(ValueError):
+            TextSearch(config="english'; --")
+        with pytest.raises(ValueError):
+            fts5_statements("articles", "id", ["title", "body); --"], "articles_fts")
+        with pytest.raises(ValueError):
+            fts5_statements("articles'", "id", ["title"], "articles_fts")
+
+
+def test_postgresql_statements() -> None:
+    body = Article.__table__.c.body
+    condition = search_condition(
+        "postgresql", TextSearch(config="english"), body, Article.__table__.c.id, "fox"
+    )
+    sql = str(condition.compile(dialect=postgresql.dialect()))
+    assert "to_tsvector('english'::regconfig, articles.body) @@ plainto_tsquery(" in sql
+    condition = search_condition(
+        "postgresql",
+        TextSearch(tsvector="title"),
+        body,
+        Article.__table__.c.id,
+        "fox",
+    )
+    sql = str(condition.compile(dialect=postgresql.dialect()))
+    assert sql.startswith("articles.title @@ plainto_tsquery('simple'::regconfig")
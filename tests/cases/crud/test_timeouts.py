@@ -0,0 +1,104 @@
+from sqlalchemy import insert
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy_api.crud import CRUDHandler
+from sqlalchemy_api.exception_handlers import exception_handlers, get_exception_handler
+from sqlalchemy_api.exceptions import InvalidCursor, UnindexedSort
+from sqlalchemy_api.timeouts import apply_statement_timeout
+from tests.database.session import User, engine
+from datetime import date
+from unittest.mock import MagicMock, patch
+import json
+import pytest
+
+example_user = {"name": "John", "birthday": date(1990, 1, 1)}
+sqlite_only = pytest.mark.skipif(
+    engine.dialect.name != "sqlite", reason="progress handler timeout"
+)
+
+
+@pytest.fixture
+def users(db_session):
+    db_session.execute(insert(User), [example_user] * 300)
+    db_session.commit()
+
+
+class TestStatementTimeout:
+    @sqlite_only
+    @pytest.mark.asyncio
+    async def test_timeout(self, users):
+        crud = CRUDHandler(model=User, engine=engine, statement_timeout=0)
+        res = await crud.get_many(query_params={})
+        assert res.status_code == 504
+        assert json.loads(res.content) == {
+            "message": "Statement canceled after 0 seconds"
+        }
+        # The connection is returned to the pool without the timeout
+        res = await CRUDHandler(model=User, engine=engine).get_many(query_params={})
+        assert res.status_code == 200
+
+    @sqlite_only
+    @pytest.mark.asyncio
+    async def test_timeout_by_action(self, users):
+        crud = CRUDHandler(
+            model=User, engine=engine, statement_timeout={"get_many": 0, "get": 10}
+        )
+        assert (await crud.get(row_id=1)).status_code == 200
+        assert (await crud.get_many(query_params={})).status_code == 504
+
+    def test_postgresql_set_local(self):
+        connection = MagicMock()
+        connection.dialect.name = "postgresql"
+        apply_statement_timeout(connection, 1.5)
+        connection.exec_driver_sql.assert_called_once_with(
+            "SET LOCAL statement_timeout = 1500"
+        )
+
+    def test_pool_timeout(self):
+        response = exception_handlers[PoolTimeoutError](PoolTimeoutError(), False)
+        assert response.status_code == 503
+
+    def test_query_validation_handler(self):
+        response = get_exception_handler(InvalidCursor("x"))(InvalidCursor("x"), False)
+        assert response.status_code == 422
+        assert json.loads(response.content)["detail"] == [
+            {
+                "loc": ["query", "cursor"],
+                "msg": "Invalid pagination cursor",
+                "input": "x",
+            }
+        ]
+        exc = UnindexedSort(["a", "b"], ["id"])
+        assert [error["input"] for error in exc.errors()] == ["a", "b"]
+        assert get_exception_handler(KeyError())(KeyError(), False).status_code == 500
+
+
+class TestCostGuard:
+    @pytest.mark.asyncio
+    async def test_query_too_expensive(self, users):
+        crud = CRUDHandler(model=User, engine=engine, max_cost=100, max_rows=1000)
+        with patch("sqlalchemy_api.crud.estimate", return_value=(5000.0, 10)):
+            res = await crud.get_many(query_params={})
+        assert res.status_code == 422
+        [error] = json.loads(res.content)["detail"]
+        assert error["type"] == "max_cost"
+        assert error["limit"] == 100
+        with patch("sqlalchemy_api.crud.estimate", return_value=(10.0, 5000)):
+            res = await crud.get_many(query_params={})
+        assert json.loads(res.content)["detail"][0]["type"] == "max_rows"
+
+    @pytest.mark.asyncio
+    async def test_query_within_limits(self, users):
+        crud = CRUDHandler(model=User, engine=engine, max_cost=100, max_rows=1000)
+        with patch("sqlalchemy_api.crud.estimate", return_value=(10.0, 300)):
+            res = await crud.get_many(query_params={})
+        assert res.status_code == 200
+        assert json.loads(res.content)["total"] == 300
+
+    def test_estimate(self):
+        from sqlalchemy_api.explain import estimate
+
+        plan = [
+            {"Plan": {"Node Type": "Seq Scan", "Total Cost": 12.5, "Plan Rows": 40}}
+        ]
+        assert estimate("postgresql", plan) == (12.5, 40)
+        assert estimate("sqlite", []) is None
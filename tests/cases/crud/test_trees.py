@@ -0,0 +1,198 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import ForeignKey, create_engine, event, insert, update
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import DeclarativeBase, Mapped, Session, mapped_column
+from sqlalchemy_api.adapters.fastapi_crud import APICrud
+from sqlalchemy_api.adapters.starlette_crud import APICrud as StarletteCrud
+from sqlalchemy_api.crud import CRUDHandler
+from sqlalchemy_api.trees import parent_column, tree_statement
+from starlette.applications import Starlette
+from starlette.routing import Mount
+from typing import Optional
+from tests.database.session import User
+import json
+import pytest
+
+
+class Base(DeclarativeBase):
+    pass
+
+
+class Category(Base):
+    __tablename__ = "categories"
+    id: Mapped[int] = mapped_column(primary_key=True)
+    name: Mapped[str] = mapped_column()
+    parent_id: Mapped[Optional[int]] = mapped_column(ForeignKey("categories.id"))
+
+
+#       1
+#     /   \
+#    2     3
+#   / \     \
+#  4   5     6
+#  |
+#  7
+CATEGORIES = [(1, None), (2, 1), (3, 1), (4, 2), (5, 2), (6, 3), (7, 4)]
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(
+        f"sqlite:///{tmp_path}/trees.db", connect_args={"check_same_thread": False}
+    )
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.execute(
+            insert(Category),
+            [
+                {"id": id_, "name": f"c{id_}", "parent_id": parent_id}
+                for id_, parent_id in CATEGORIES
+            ],
+        )
+        session.commit()
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def categories(engine):
+    return CRUDHandler(model=Category, engine=engine)
+
+
+async def tree(crud: CRUDHandler, row_id, ancestors=False, **query_params):
+    action = crud.ancestors if ancestors else crud.descendants
+    response = await action(row_id=row_id, query_params=query_params)
+    assert response.status_code == 200, response.content
+    return json.loads(response.content)
+
+
+def ids(records):
+    return [(record["id"], record["depth"]) for record in records]
+
+
+def nested_ids(records):
+    return {
+        record["id"]: nested_ids(record["children"]) if record["children"] else None
+        for record in records
+    }
+
+
+class TestTrees:
+    @pytest.mark.asyncio
+    async def test_descendants(self, categories):
+        content = await tree(categories, 2)
+        assert ids(content["records"]) == [(2, 0), (4, 1), (5, 1), (7, 2)]
+        assert content["records"][1] == {
+            "id": 4,
+            "name": "c4",
+            "parent_id": 2,
+            "depth": 1,
+        }
+        assert content["truncated"] is False
+        content = await tree(categories, 1, depth="1")
+        assert ids(content["records"]) == [(1, 0), (2, 1), (3, 1)]
+        content = await tree(categories, 1, nested="true")
+        assert nested_ids(content["records"]) == {
+            1: {2: {4: {7: None}, 5: None}, 3: {6: None}}
+        }
+
+    @pytest.mark.asyncio
+    async def test_ancestors(self, categories):
+        content = await tree(categories, 7, ancestors=True)
+        assert ids(content["records"]) == [(7, 0), (4, 1), (2, 2), (1, 3)]
+        content = await tree(categories, 7, ancestors=True, depth=1, nested=True)
+        assert nested_ids(content["records"]) == {4: {7: None}}
+
+    @pytest.mark.asyncio
+    async def test_single_statement(self, categories, engine):
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(engine, "before_cursor_execute", before_cursor_execute)
+        try:
+            await tree(categories, 1, nested=True)
+        finally:
+            event.remove(engine, "before_cursor_execute", before_cursor_execute)
+        assert len(statements) == 1
+        assert "WITH RECURSIVE" in statements[0]
+
+    @pytest.mark.asyncio
+    async def test_cycle(self, categories, engine):
+        with Session(engine) as session:
+            session.execute(
+                update(Category).where(Category.id == 1).values(parent_id=7)
+            )
+            session.commit()
+        content = await tree(categories, 2, depth=10)
+        assert ids(content["records"]) == [
+            (2, 0),
+            (4, 1),
+            (5, 1),
+            (7, 2),
+            (1, 3),
+            (3, 4),
+            (6, 5),
+        ]
+        content = await tree(categories, 2, depth=10, nested=True)
+        assert nested_ids(content["records"]) == {
+            2: {4: {7: {1: {3: {6: None}}}}, 5: None}
+        }
+        content = await tree(categories, 4, ancestors=True, depth=10, nested=True)
+        assert nested_ids(content["records"]) == {7: {1: {2: {4: None}}}}
+
+    @pytest.mark.asyncio
+    async def test_limits(self, engine):
+        categories = CRUDHandler(
+            model=Category, engine=engine, page_size_max=3, max_tree_depth=2
+        )
+        content = await tree(categories, 1)
+        assert ids(content["records"]) == [(1, 0), (2, 1), (3, 1)]
+        assert content["truncated"] is True
+        for depth in ["3", "-1", "a"]:
+            response = await categories.descendants(
+                row_id=1, query_params={"depth": depth}
+            )
+            assert response.status_code == 422
+            assert json.loads(response.content)["detail"][0]["loc"] == [
+                "query",
+                "depth",
+            ]
+        response = await categories.descendants(row_id=100, query_params={})
+        assert response.status_code == 404
+
+    def test_parent_column(self, engine):
+        assert parent_column(Category.__table__) == "parent_id"
+        assert parent_column(User.__table__) is None
+        with pytest.raises(ValueError):
+            CRUDHandler(model=Category, engine=engine, parent_column="unknown")
+        stmt = tree_statement(
+            Category, Category.__table__.c.id, Category.__table__.c.parent_id, 1, 3
+        )
+        sql = str(stmt.compile(dialect=postgresql.dialect()))
+        assert "WITH RECURSIVE tree" in sql
+        assert "UNION ALL" in sql
+
+    def test_api(self, engine):
+        app = FastAPI()
+        app.include_router(APICrud(Category, engine), prefix="/category")
+        app.mount("/starlette", StarletteCrud(Category, engine))
+        client = TestClient(app)
+        response = client.get("/category/2/descendants", params={"depth": 1})
+        assert response.status_code == 200, response.text
+        assert ids(response.json()["records"]) == [(2, 0), (4, 1), (5, 1)]
+        response = client.get("/category/7/ancestors", params={"nested": True})
+        assert response.status_code == 200, response.text
+        assert nested_ids(response.json()["records"]) == {1: {2: {4: {7: None}}}}
+        assert client.get("/category/2/descendants?depth=100").status_code == 422
+        response = client.get("/starlette/4/ancestors?depth=1")
+        assert ids(response.json()["records"]) == [(4, 0), (2, 1)]
+
+    def test_no_parent_column(self, db_session):
+        app = Starlette(
+            routes=[Mount("/user", StarletteCrud(User, db_session.get_bind()))]
+        )
+        client = TestClient(app)
+        assert client.get("/user/1/descendants").status_code == 404
@@ -0,0 +1,183 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from starlette.testclient import TestClient as StarletteTestClient
+from starlette.applications import Starlette
+from sqlalchemy import Column, Integer, MetaData, String, Table, create_engine, insert
+from sqlalchemy_api.adapters.fastapi_crud import (
+    APICrud as FastAPIAPICrud,
+    APICrudAutomount as FastAPIAPICrudAutomount,
+)
+from sqlalchemy_api.adapters.starlette_crud import (
+    APICrud as StarletteAPICrud,
+    APICrudAutomount as StarletteAPICrudAutomount,
+)
+from sqlalchemy_api.crud import CRUDHandler
+from sqlalchemy_api.metrics import Metric, MetricsRegistry
+from tests.database.session import Base, User, engine
+from datetime import date
+import pytest
+
+example_user = {"name": "John", "birthday": date(1990, 1, 1)}
+
+
+class TestMetricsRegistry:
+    def test_render_counter(self):
+        registry = MetricsRegistry()
+        counter = registry.counter("requests_total", "Requests", ["action"])
+        counter.inc(action="get")
+        counter.inc(2, action="get")
+        assert registry.counter("requests_total", "Requests", ["action"]) is counter
+        assert registry.render() == (
+            "# HELP requests_total Requests\n"
+            "# TYPE requests_total counter\n"
+            'requests_total{action="get"} 3\n'
+        )
+
+    def test_render_histogram(self):
+        registry = MetricsRegistry()
+        histogram = registry.histogram("latency_seconds", "Latency", buckets=[0.1, 1])
+        histogram.observe(0.05)
+        histogram.observe(0.5)
+        histogram.observe(5)
+        assert histogram.count() == 3
+        assert registry.render().splitlines()[2:] == [
+            'latency_seconds_bucket{le="0.1"} 1',
+            'latency_seconds_bucket{le="1"} 2',
+            'latency_seconds_bucket{le="+Inf"} 3',
+            "latency_seconds_sum 5.55",
+            "latency_seconds_count 3",
+        ]
+
+    def test_wrong_labels(self):
+        registry = MetricsRegistry()
+        counter = registry.counter("requests_total", "Requests", ["action"])
+        with pytest.raises(ValueError):
+            counter.inc(model="User")
+
+    def test_metric_is_abstract(self):
+        with pytest.raises(TypeError):
+            Metric("requests_total", "Requests")  # type: ignore[abstract]
+
+
+class TestCRUDHandlerMetrics:
+    @pytest.mark.asyncio
+    async def test_get_many_phases(self, db_session):
+        db_session.execute(insert(User), [example_user, example_user])
+        db_session.commit()
+        registry = MetricsRegistry()
+        crud = CRUDHandler(model=User, engine=engine, metrics=registry)
+        await crud.get_many(query_params={})
+        res = await crud.get_many(query_params={})
+        assert res.status_code == 200
+
+        metrics = crud.metrics
+        labels = {"model": "User", "action": "get_many"}
+        assert metrics.requests.get(status="200", **labels) == 2
+        assert metrics.request_duration.count(**labels) == 2
+        for phase in ["validation", "sql_page", "sql_count", "serialization"]:
+            assert metrics.phase_duration.count(phase=phase, **labels) == 2
+        assert metrics.pool_checkout.count(**labels) == 2
+        assert metrics.rows_returned.sum(**labels) == 4
+        assert metrics.response_bytes.sum(**labels) == 2 * len(res.content)
+        assert metrics.statement_cache.get(model="User", result="hit") >= 2
+
+    @pytest.mark.asyncio
+    async def test_errors_are_counted(self, db_session):
+        registry = MetricsRegistry()
+        crud = CRUDHandler(model=User, engine=engine, metrics=registry)
+        await crud.get(row_id=1)
+        await crud.get(row_id="foo")
+        labels = {"model": "User", "action": "get"}
+        assert crud.metrics.requests.get(status="404", **labels) == 1
+        assert crud.metrics.requests.get(status="422", **labels) == 1
+
+    def test_disabled_by_default(self, db_session):
+        assert CRUDHandler(model=User, engine=engine).metrics is None
+
+
+@pytest.mark.parametrize("adapter", ["Starlette", "FastAPI"])
+def test_metrics_endpoint(adapter, db_session):
+    registry = MetricsRegistry()
+    if adapter == "Starlette":
+        app = StarletteAPICrudAutomount(Base, engine, metrics=registry)
+        test_client = StarletteTestClient
+    else:
+        app = FastAPI()
+        app.include_router(FastAPIAPICrudAutomount(Base, engine, metrics=registry))
+        test_client = TestClient
+    with test_client(app) as client:
+        client.post("/users/", json={"name": "John", "birthday": "1990-01-01"})
+        client.get("/users/")
+        response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert (
+        'sqlalchemy_api_requests_total{model="User",action="post",status="201"} 1'
+        in response.text
+    )
+    assert (
+        'sqlalchemy_api_phase_duration_seconds_count{model="User",action="get_many",'
+        'phase="sql_count"} 1' in response.text
+    )
+    assert 'sqlalchemy_api_schema_cache_lookups{result="hit"}' in response.text
+
+
+@pytest.mark.parametrize("adapter", ["Starlette", "FastAPI"])
+def test_crud_metrics_endpoint(adapter, db_session):
+    registry = MetricsRegistry()
+    if adapter == "Starlette":
+        app = Starlette()
+        app.mount(
+            "/user",
+            StarletteAPICrud(User, engine, metrics=registry, expose_metrics=True),
+        )
+        test_client = StarletteTestClient
+    else:
+        app = FastAPI()
+        app.include_router(
+            FastAPIAPICrud(User, engine, metrics=registry, expose_metrics=True),
+            prefix="/user",
+        )
+        test_client = TestClient
+    with test_client(app) as client:
+        client.get("/user/")
+        response = client.get("/user/_metrics")
+    assert response.status_code == 200
+    assert (
+        'sqlalchemy_api_requests_total{model="User",action="get_many",status="200"} 1'
+        in response.text
+    )
+    with pytest.raises(ValueError, match="metrics"):
+        StarletteAPICrud(User, engine, expose_metrics=True)
+    with pytest.raises(ValueError, match="metrics"):
+        FastAPIAPICrud(User, engine, expose_metrics=True)
+
+
+@pytest.mark.parametrize("adapter", ["Starlette", "FastAPI"])
+def test_table_named_metrics(adapter, tmp_path):
+    metadata = MetaData()
+    Table(
+        "metrics",
+        metadata,
+        Column("id", Integer, primary_key=True),
+        Column("name", String),
+    )
+    metrics_engine = create_engine(
+        f"sqlite:///{tmp_path}/metrics.db", connect_args={"check_same_thread": False}
+    )
+    metadata.create_all(metrics_engine)
+    registry = MetricsRegistry()
+    if adapter == "Starlette":
+        app = StarletteAPICrudAutomount(metadata, metrics_engine, metrics=registry)
+        test_client = StarletteTestClient
+    else:
+        app = FastAPI()
+        app.include_router(
+            FastAPIAPICrudAutomount(metadata, metrics_engine, metrics=registry)
+        )
+        test_client = TestClient
+    with test_client(app) as client:
+        response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.json()["records"] == []
+    metrics_engine.dispose()
@@ -0,0 +1,108 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from starlette.testclient import TestClient as StarletteTestClient
+from sqlalchemy import insert
+from sqlalchemy_api.adapters.fastapi_crud import (
+    APICrudAutomount as FastAPIAPICrudAutomount,
+)
+from sqlalchemy_api.adapters.starlette_crud import (
+    APICrudAutomount as StarletteAPICrudAutomount,
+)
+from sqlalchemy_api.crud import CRUDHandler
+from sqlalchemy_api.slow_queries import SlowQuery, SlowQueryLog
+from tests.database.session import Base, User, engine
+from datetime import date
+import pytest
+
+example_user = {"name": "John", "birthday": date(1990, 1, 1)}
+
+
+class TestSlowQueryLog:
+    def test_ring_buffer(self):
+        log = SlowQueryLog(size=2)
+        for action in ["get", "get_many", "put"]:
+            log.record(SlowQuery(model="User", action=action, sql_time=1, total_time=1))
+        assert [entry.action for entry in log.entries()] == ["put", "get_many"]
+        log.clear()
+        assert log.entries() == []
+
+    def test_shapes(self):
+        log = SlowQueryLog()
+        for sql_time in [1, 2]:
+            log.record(
+                SlowQuery(
+                    model="User",
+                    action="get_many",
+                    filters=[("name", "contains")],
+                    sql_time=sql_time,
+                    total_time=sql_time,
+                )
+            )
+        log.record(SlowQuery(model="Post", action="get", sql_time=1, total_time=1))
+        shapes = log.shapes()
+        assert [(shape.model, shape.count) for shape in shapes] == [
+            ("User", 2),
+            ("Post", 1),
+        ]
+        assert shapes[0].sql_time == 3
+        assert shapes[0].max_sql_time == 2
+        assert [shape.model for shape in log.shapes(model="Post")] == ["Post"]
+
+
+class TestCRUDHandlerSlowQueries:
+    @pytest.mark.asyncio
+    async def test_filter_values_are_redacted(self, db_session):
+        db_session.execute(insert(User), [example_user])
+        db_session.commit()
+        log = SlowQueryLog(threshold=0)
+        crud = CRUDHandler(model=User, engine=engine, slow_query_log=log)
+        res = await crud.get_many(
+            query_params={
+                "name": "John",
+                "name__op": "contains",
+                "birthday__op": "is_null",
+                "page_size": "10",
+            }
+        )
+        assert res.status_code == 200
+        [entry] = log.entries()
+        assert entry.model == "User"
+        assert entry.action == "get_many"
+        assert entry.filters == [("name", "contains"), ("birthday", "is_null")]
+        assert entry.page_size == 10
+        assert [statement.sql.split()[0] for statement in entry.statements] == [
+            "SELECT",
+            "SELECT",
+        ]
+        assert "John" not in entry.model_dump_json()
+        assert entry.sql_time == sum(s.duration for s in entry.statements)
+        assert {"sql_page", "sql_count"} <= set(entry.timings)
+
+    @pytest.mark.asyncio
+    async def test_fast_requests_are_not_logged(self, db_session):
+        log = SlowQueryLog(threshold=60)
+        crud = CRUDHandler(model=User, engine=engine, slow_query_log=log)
+        await crud.get_many(query_params={})
+        assert log.entries() == []
+
+
+@pytest.mark.parametrize("adapter", ["Starlette", "FastAPI"])
+def test_slow_queries_endpoint(adapter, db_session):
+    log = SlowQueryLog(threshold=0)
+    if adapter == "Starlette":
+        app = StarletteAPICrudAutomount(Base, engine, slow_query_log=log)
+        test_client = StarletteTestClient
+    else:
+        app = FastAPI()
+        app.include_router(FastAPIAPICrudAutomount(Base, engine, slow_query_log=log))
+        test_client = TestClient
+    with test_client(app) as client:
+        client.get("/users/", params={"name": "John"})
+        client.get("/posts/")
+        response = client.get("/_slow_queries", params={"model": "User"})
+    assert response.status_code == 200
+    content = response.json()
+    assert content["threshold"] == 0
+    [entry] = content["entries"]
+    assert entry["filters"] == [["name", "equal"]]
+    assert content["shapes"][0]["count"] == 1
@@ -0,0 +1,89 @@
+from starlette.applications import Starlette
+from starlette.testclient import TestClient as StarletteTestClient
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import insert
+from sqlalchemy_api.adapters.fastapi_crud import APICrud as FastAPIAPICrud
+from sqlalchemy_api.adapters.starlette_crud import APICrud as StarletteAPICrud
+from sqlalchemy_api.crud import CRUDHandler
+from sqlalchemy_api.tracing import InMemoryTracer
+from tests.database.session import User, engine
+from datetime import date
+import pytest
+
+example_user = {"name": "John", "birthday": date(1990, 1, 1)}
+
+
+class TestTracing:
+    @pytest.mark.asyncio
+    async def test_get_many_spans(self, db_session):
+        db_session.execute(insert(User), [example_user, example_user])
+        db_session.commit()
+        tracer = InMemoryTracer()
+        crud = CRUDHandler(model=User, engine=engine, tracer=tracer)
+        res = await crud.get_many(query_params={"name": "John"})
+        assert res.status_code == 200
+
+        spans = {span.name: span for span in tracer.exporter.get_finished_spans()}
+        root = spans["User.get_many"]
+        assert root.parent is None
+        assert root.attributes["http.status_code"] == 200
+        for phase in ["validation", "sql_page", "sql_count", "serialization"]:
+            assert spans[phase].parent is root
+            assert spans[phase].duration >= 0
+
+        sql_spans = [
+            span
+            for span in tracer.exporter.get_finished_spans()
+            if span.name == "sql" and span.parent.name in ["sql_page", "sql_count"]
+        ]
+        assert len(sql_spans) == 2
+        assert all("SELECT" in span.attributes["db.statement"] for span in sql_spans)
+
+    @pytest.mark.asyncio
+    async def test_exception_is_recorded(self, db_session):
+        tracer = InMemoryTracer()
+        crud = CRUDHandler(model=User, engine=engine, tracer=tracer)
+        res = await crud.get(row_id=1)
+        assert res.status_code == 404
+        root = tracer.exporter.get_finished_spans()[-1]
+        assert root.name == "User.get"
+        assert root.events[0]["exception.type"] == "NotFoundException"
+
+    @pytest.mark.asyncio
+    async def test_opentelemetry_tracer(self, db_session):
+        trace = pytest.importorskip("opentelemetry.trace")
+        crud = CRUDHandler(
+            model=User, engine=engine, tracer=trace.get_tracer("sqlalchemy_api")
+        )
+        res = await crud.get_many(query_params={})
+        assert res.status_code == 200
+
+
+@pytest.mark.parametrize("adapter", ["Starlette", "FastAPI"])
+def test_server_timing_header(adapter, db_session):
+    if adapter == "Starlette":
+        app = Starlette()
+        app.mount("/user", StarletteAPICrud(User, engine, server_timing=True))
+        test_client = StarletteTestClient
+    else:
+        app = FastAPI()
+        app.include_router(
+            FastAPIAPICrud(User, engine, server_timing=True), prefix="/user"
+        )
+        test_client = TestClient
+    with test_client(app) as client:
+        response = client.get("/user/")
+    assert response.status_code == 200
+    metrics = [
+        metric.split(";")[0] for metric in response.headers["server-timing"].split(", ")
+    ]
+    assert metrics == [
+        "validation",
+        "pool_checkout",
+        "sql_page",
+        "sql_count",
+        "serialization",
+        "db",
+        "total",
+    ]
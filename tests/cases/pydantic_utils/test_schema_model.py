@@ -0,0 +1,150 @@
+from typing import List, Optional
+from sqlalchemy import Column, ForeignKey, Integer, String
+from sqlalchemy.orm import DeclarativeBase, relationship
+from sqlalchemy_api.pydantic_utils import (
+    SchemaModel,
+    SchemaRegistry,
+    _model_fingerprint,
+)
+from unittest.mock import patch
+import gc
+import json
+import weakref
+
+
+class Base(DeclarativeBase):
+    ...
+
+
+class Author(Base):
+    __tablename__ = "authors"
+    id = Column(Integer, primary_key=True)
+    name = Column(String, nullable=False)
+    books = relationship("Book", back_populates="author")
+
+
+class Publisher(Base):
+    __tablename__ = "publishers"
+    id = Column(Integer, primary_key=True)
+    name = Column(String)
+    books = relationship("Book", back_populates="publisher")
+
+
+class Book(Base):
+    __tablename__ = "books"
+    id = Column(Integer, primary_key=True)
+    title = Column(String, nullable=False)
+    author_id = Column(Integer, ForeignKey("authors.id"))
+    publisher_id = Column(Integer, ForeignKey("publishers.id"))
+    author = relationship("Author", back_populates="books")
+    publisher = relationship("Publisher", back_populates="books")
+
+
+def test_related_schemas_are_shared() -> None:
+    registry = SchemaRegistry()
+    author = registry.get(Author, "relations")
+    publisher = registry.get(Publisher, "relations")
+    book = registry.get(Book, "base")
+    assert author.model_fields["books"].annotation == Optional[List[book]]
+    assert publisher.model_fields["books"].annotation == Optional[List[book]]
+    assert registry.misses == 3
+    assert registry.hits == 2
+
+
+def test_schema_model_variants() -> None:
+    registry = SchemaRegistry()
+    schema_model = SchemaModel(Book, registry=registry)
+    assert schema_model.base() is schema_model.base()
+    assert schema_model.relations() is schema_model.relations()
+    assert (
+        schema_model.paginated().model_fields["records"].annotation
+        == List[schema_model.relations()]
+    )
+    assert "id" not in schema_model.post().model_fields
+    assert not schema_model.put().model_fields["title"].is_required()
+    assert SchemaModel(Book, registry=registry).post() is schema_model.post()
+
+
+def test_snapshot_round_trip(tmp_path) -> None:
+    snapshot = str(tmp_path / "schemas.json")
+    registry = SchemaRegistry()
+    schema_model = SchemaModel(Author, registry=registry)
+    expected = {
+        "relations": schema_model.relations().model_json_schema(),
+        "paginated": schema_model.paginated().model_json_schema(),
+        "put": schema_model.put().model_json_schema(),
+    }
+    registry.dump(snapshot)
+
+    loaded_registry = SchemaRegistry()
+    loaded_registry.load(snapshot)
+    loaded_model = SchemaModel(Author, registry=loaded_registry)
+    with patch(
+        "sqlalchemy_api.pydantic_utils.sqlalchemy_to_pydantic",
+        side_effect=AssertionError("mappers should not be introspected"),
+    ):
+        assert loaded_model.relations().model_json_schema() == expected["relations"]
+        assert loaded_model.paginated().model_json_schema() == expected["paginated"]
+        assert loaded_model.put().model_json_schema() == expected["put"]
+
+
+def test_snapshot_with_changed_columns_is_ignored(tmp_path) -> None:
+    snapshot = tmp_path / "schemas.json"
+    registry = SchemaRegistry()
+    registry.get(Publisher, "base")
+    registry.dump(str(snapshot))
+    data = json.loads(snapshot.read_text())
+    for definition in data["schemas"].values():
+        definition["fingerprint"] = "stale"
+        definition["fields"] = {}
+    snapshot.write_text(json.dumps(data))
+
+    loaded_registry = SchemaRegistry()
+    loaded_registry.load(str(snapshot))
+    assert "name" in loaded_registry.get(Publisher, "base").model_fields
+
+
+def make_publisher(**name_options):
+    class DynamicBase(DeclarativeBase):
+        ...
+
+    class Publisher(DynamicBase):
+        __tablename__ = "publishers"
+        id = Column(Integer, primary_key=True)
+        name = Column(**{"type_": String, **name_options})
+
+    return Publisher
+
+
+def test_fingerprint_covers_columns() -> None:
+    fingerprint = _model_fingerprint((make_publisher(), "base", ()))
+    assert fingerprint == _model_fingerprint((make_publisher(), "base", ()))
+    for changed in [
+        (make_publisher(type_=Integer), "base", ()),
+        (make_publisher(nullable=False), "base", ()),
+        (make_publisher(default="x"), "base", ()),
+        (make_publisher(), "put", ()),
+        (make_publisher(), "base", ("name",)),
+    ]:
+        assert _model_fingerprint(changed) != fingerprint
+
+
+def test_clear() -> None:
+    registry = SchemaRegistry()
+    registry.get(Publisher, "base")
+    registry.get(Publisher, "base")
+    registry.clear()
+    assert (registry.hits, registry.misses) == (0, 0)
+    assert Publisher not in registry.schemas
+
+
+def test_models_are_held_weakly() -> None:
+    registry = SchemaRegistry()
+    model = make_publisher()
+    registry.get(model, "relations")
+    registry.get(model, "paginated")
+    reference = weakref.ref(model)
+    del model
+    gc.collect()
+    assert reference() is None
+    assert len(registry.schemas) == 0